@@ -0,0 +1,51 @@
+"""Keeping sync helpers off the event loop inside `AsyncSession.run_sync`.
+
+With ASYNC_DB, `database.run_db` runs crud functions through `run_sync`:
+their queries go over the async driver, but the function itself executes
+on the event-loop thread (in a greenlet that hands each driver call back
+to the loop). Anything else it does synchronously stalls every request.
+
+The cache, version and index helpers the crud code calls check `on_loop()`
+and route their blocking parts through here instead: Redis round trips
+await the async client, CPU-heavy index construction goes to the
+threadpool, and build locks are waited for without blocking the loop.
+Outside `run_sync` (threadpool sessions, ingest, scripts) all of these are
+plain sync calls.
+"""
+import asyncio
+import threading
+from typing import Awaitable, Callable, TypeVar
+
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+from starlette.concurrency import run_in_threadpool
+
+T = TypeVar("T")
+
+LOCK_POLL_SECONDS = 0.005
+
+
+def on_loop() -> bool:
+    """True when called from sync code inside `run_sync` on the event loop."""
+    return bool(in_greenlet())
+
+
+def wait(awaitable: Awaitable[T]) -> T:
+    """Await `awaitable` from inside `run_sync` (only valid when `on_loop()`)."""
+    return await_only(awaitable)
+
+
+def offload(fn: Callable[..., T], *args) -> T:
+    """Call `fn(*args)`, in the threadpool when on the event loop."""
+    if on_loop():
+        return await_only(run_in_threadpool(fn, *args))
+    return fn(*args)
+
+
+def acquire(lock: threading.Lock, blocking: bool = True) -> bool:
+    """`lock.acquire(blocking)`, polled on the event loop so that another
+    coroutine holding the lock (e.g. mid index build) can finish."""
+    if not blocking or not on_loop():
+        return lock.acquire(blocking)
+    while not lock.acquire(blocking=False):
+        await_only(asyncio.sleep(LOCK_POLL_SECONDS))
+    return True
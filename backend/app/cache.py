@@ -1,10 +1,129 @@
+import asyncio
 import os
+import threading
+import uuid
+import time
 import redis
+import redis.asyncio as aioredis
 import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
+from starlette.concurrency import run_in_threadpool
 
-# Global Redis client
+from . import aio, timing
+from .settings import settings
+
+# Global Redis clients
 redis_client = None
-cache_store = {}  # fallback in-memory cache
+async_redis_client = None  # only with ASYNC_DB=1
+_invalidation_thread = None
+
+# Every worker's local tier listens here so prefix clears reach all processes.
+INVALIDATION_CHANNEL = "coursequest:cache:invalidate"
+
+CacheValue = Union[str, bytes]
+
+
+class LocalCache:
+    """In-process LRU bounded by entry count and total bytes, with per-entry TTL.
+
+    Values are stored as bytes; expired entries are dropped lazily on access
+    and evicted first when the cache is over budget.
+    """
+
+    ENTRY_OVERHEAD = 96  # rough per-entry bookkeeping cost, in bytes
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (value, local deadline, logical deadline). The logical deadline is
+        # when the entry expires in Redis; the local copy may be dropped earlier.
+        self._data: "OrderedDict[str, Tuple[bytes, float, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _size(self, key: str, value: bytes) -> int:
+        return len(key) + len(value) + self.ENTRY_OVERHEAD
+
+    def _pop(self, key: str):
+        value = self._data.pop(key)[0]
+        self._bytes -= self._size(key, value)
+
+    def get_entry(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Return (value, seconds left until logical expiry) or None if missing/expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            now = time.monotonic()
+            if entry[1] <= now:
+                self._pop(key)
+                return None
+            self._data.move_to_end(key)
+            return entry[0], entry[2] - now
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def set(self, key: str, value: bytes, ttl: float, logical_ttl: Optional[float] = None):
+        size = self._size(key, value)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            now = time.monotonic()
+            self._data[key] = (value, now + ttl, now + (logical_ttl or ttl))
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+                return True
+            return False
+
+    def clear_prefix(self, prefix: str) -> int:
+        with self._lock:
+            keys = [k for k in self._data if k.startswith(prefix)]
+            for k in keys:
+                self._pop(k)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: str):
+        return self.get_entry(key) is not None
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+
+# Local tier. Without Redis it is the whole cache.
+cache_store = LocalCache(settings.LOCAL_CACHE_MAX_ENTRIES, settings.LOCAL_CACHE_MAX_BYTES)
+
+
+def _to_bytes(value: CacheValue) -> bytes:
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
+def _local_ttl(ttl: float) -> float:
+    # With Redis behind it, keep local copies short-lived in case an
+    # invalidation message is missed; alone it honours the full TTL.
+    if redis_client or async_redis_client:
+        return min(ttl, settings.LOCAL_CACHE_MAX_TTL)
+    return ttl
+
 
 def init_cache():
     """Initialize Redis client if available."""
@@ -15,31 +134,334 @@ def init_cache():
             redis_client = redis.Redis.from_url(redis_url, decode_responses=False)
             redis_client.ping()
             logging.info("✅ Connected to Redis")
+            _start_invalidation_listener()
         except Exception as e:
             redis_client = None
             logging.warning(f"⚠️ Could not connect to Redis, using in-memory cache. Error: {e}")
 
-def get_cache(key: str):
+async def init_async_cache():
+    """Create the redis.asyncio client used by async handlers (ASYNC_DB=1)."""
+    global async_redis_client
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url and settings.ASYNC_DB:
+        try:
+            async_redis_client = aioredis.from_url(redis_url, decode_responses=False)
+            await async_redis_client.ping()
+            logging.info("✅ Connected to Redis (asyncio)")
+        except Exception as e:
+            async_redis_client = None
+            logging.warning(f"⚠️ Could not connect to async Redis. Error: {e}")
+
+
+# ---------------------------
+# Cross-worker invalidation (Redis pub/sub)
+# ---------------------------
+# Messages are a key prefix, or KEYS_MESSAGE + comma-separated exact keys.
+KEYS_MESSAGE = "="
+
+def _on_invalidate(message):
+    prefix = message["data"].decode("utf-8")
+    if prefix.startswith(KEYS_MESSAGE):
+        for key in prefix[len(KEYS_MESSAGE):].split(","):
+            cache_store.delete(key)
+        return
+    if prefix == CATALOG_VERSION_KEY:
+        _forget_version()
+        return
+    if prefix == SCOPE_KEY_PREFIX:
+        _forget_scopes()
+        return
+    cache_store.clear_prefix(prefix)
+
+def _on_listener_error(e, pubsub, thread):
+    # We may have missed messages while disconnected: drop the whole local tier.
+    logging.warning(f"Redis pub/sub error, flushing local cache: {e}")
+    cache_store.clear()
+    _forget_version()
+    _forget_scopes()
+    time.sleep(1)
+
+def _start_invalidation_listener():
+    global _invalidation_thread
+    if _invalidation_thread is not None:
+        return
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(**{INVALIDATION_CHANNEL: _on_invalidate})
+    _invalidation_thread = pubsub.run_in_thread(
+        sleep_time=1, daemon=True, exception_handler=_on_listener_error
+    )
+
+
+# ---------------------------
+# Two-tier get/set
+# ---------------------------
+def _store_local(key: str, value: bytes, ttl: float):
+    cache_store.set(key, value, _local_ttl(ttl), logical_ttl=ttl)
+
+def get_cache_entry(key: str) -> Optional[Tuple[bytes, float]]:
+    """Return (value, seconds until it expires) from the nearest tier, or None."""
+    entry = cache_store.get_entry(key)
+    if entry is not None:
+        return entry
+    if aio.on_loop():
+        return aio.wait(aget_cache_entry(key))
     if redis_client:
         try:
-            val = redis_client.get(key)
-            if val:
-                return val.decode("utf-8")
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.pttl(key)
+            val, pttl = pipe.execute()
+            if val and pttl and pttl > 0:
+                _store_local(key, val, pttl / 1000)
+                return val, pttl / 1000
         except Exception as e:
             logging.warning(f"Redis error: {e}")
-    return cache_store.get(key)
+    return None
+
+def get_cache_bytes(key: str) -> Optional[bytes]:
+    entry = get_cache_entry(key)
+    return entry[0] if entry else None
 
-def set_cache(key: str, value: str, ttl: int = 60):
+def get_cache(key: str):
+    val = get_cache_bytes(key)
+    return val.decode("utf-8") if val is not None else None
+
+def set_cache(key: str, value: CacheValue, ttl: int = 60):
+    """Store `value` (str, or already-serialized bytes) in both tiers for `ttl` seconds."""
+    if aio.on_loop():
+        return aio.wait(aset_cache(key, value, ttl))
+    value = _to_bytes(value)
+    _store_local(key, value, ttl)
     if redis_client:
         try:
             redis_client.setex(key, ttl, value)
-            return
         except Exception as e:
             logging.warning(f"Redis error: {e}")
-    cache_store[key] = value
 
-def clear_cache_prefix(prefix: str):
-    """Delete all cache keys with the given prefix (Redis + fallback)."""
+def get_many_bytes(keys: Sequence[str], local_ttl: float = 60) -> Dict[str, bytes]:
+    """Multi-get: local tier first, then one Redis MGET for the rest.
+
+    Returns only the keys that were found. Values fetched from Redis are kept
+    locally for at most `local_ttl` seconds (MGET does not return TTLs).
+    """
+    found: Dict[str, bytes] = {}
+    missing = []
+    for key in keys:
+        val = cache_store.get(key)
+        if val is not None:
+            found[key] = val
+        else:
+            missing.append(key)
+    if missing and redis_client:
+        try:
+            for key, val in zip(missing, redis_client.mget(missing)):
+                if val is not None:
+                    _store_local(key, val, local_ttl)
+                    found[key] = val
+        except Exception as e:
+            logging.warning(f"Redis error: {e}")
+    return found
+
+def set_many(items: Dict[str, CacheValue], ttl: int = 60):
+    """Store several entries; Redis writes go out in one pipeline."""
+    items = {k: _to_bytes(v) for k, v in items.items()}
+    for key, value in items.items():
+        _store_local(key, value, ttl)
+    if redis_client and items:
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.setex(key, ttl, value)
+            pipe.execute()
+        except Exception as e:
+            logging.warning(f"Redis error: {e}")
+
+def delete_keys(keys: Sequence[str]) -> int:
+    """Delete exact keys from Redis and from every worker's local tier."""
+    if not keys:
+        return 0
+    deleted = sum(cache_store.delete(k) for k in keys)
+    if redis_client:
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.delete(*keys)
+            pipe.publish(INVALIDATION_CHANNEL, KEYS_MESSAGE + ",".join(keys))
+            deleted += pipe.execute()[0]
+        except Exception as e:
+            logging.warning(f"Redis error on delete_keys: {e}")
+    return deleted
+
+# ---------------------------
+# Catalog generations
+# ---------------------------
+# Catalog-derived keys embed the current generation (see `vkey`). An ingest
+# bumps it with one atomic INCR, which orphans every older entry at once;
+# those simply age out via their TTL instead of being scanned and deleted.
+CATALOG_VERSION_KEY = "catalog:version"
+VERSION_MEMO_TTL = 1.0  # seconds a worker trusts its copy (bumps are also pushed via pub/sub)
+
+_local_version = 0  # authoritative when Redis is not configured
+_version_memo: Optional[Tuple[int, float]] = None  # (version, read at)
+
+def _forget_version():
+    global _version_memo
+    _version_memo = None
+
+def _memo_version() -> Optional[int]:
+    memo = _version_memo
+    if memo is not None and time.monotonic() - memo[1] < VERSION_MEMO_TTL:
+        return memo[0]
+    return None
+
+def _remember_version(raw) -> int:
+    global _version_memo
+    version = int(raw or 0)
+    _version_memo = (version, time.monotonic())
+    return version
+
+def catalog_version() -> int:
+    """Current catalog generation."""
+    memo = _memo_version()
+    if memo is not None:
+        return memo
+    if aio.on_loop():
+        return aio.wait(acatalog_version())
+    if redis_client:
+        try:
+            return _remember_version(redis_client.get(CATALOG_VERSION_KEY))
+        except Exception as e:
+            logging.warning(f"Redis error reading catalog version: {e}")
+    return _local_version
+
+async def acatalog_version() -> int:
+    memo = _memo_version()
+    if memo is not None:
+        return memo
+    if async_redis_client:
+        try:
+            return _remember_version(await async_redis_client.get(CATALOG_VERSION_KEY))
+        except Exception as e:
+            logging.warning(f"Redis error reading catalog version: {e}")
+            return _local_version
+    if redis_client:
+        return await run_in_threadpool(catalog_version)
+    return _local_version
+
+def bump_catalog_version() -> Tuple[int, int]:
+    """Atomically start a new catalog generation; returns (previous, current)."""
+    global _local_version
+    current = None
+    if redis_client:
+        try:
+            current = int(redis_client.incr(CATALOG_VERSION_KEY))
+            redis_client.publish(INVALIDATION_CHANNEL, CATALOG_VERSION_KEY)
+        except Exception as e:
+            logging.warning(f"Redis error bumping catalog version: {e}")
+    if current is None:
+        current = _local_version + 1
+    _local_version = current
+    _remember_version(current)
+    logging.info(f"[Cache] Catalog generation {current - 1} -> {current}")
+    return current - 1, current
+
+# ---------------------------
+# Scoped generations
+# ---------------------------
+# A delta ingest touches a few departments/levels/modes, not the catalog. Each
+# scope (e.g. `department=CS`) has its own counter, and ANY_SCOPE counts every
+# data change. Cached queries embed the catalog generation plus the counter of
+# one scope they are restricted to (see `query.scope`), so `bump_scopes` leaves
+# entries for unaffected scopes valid. Unrestricted queries use ANY_SCOPE.
+SCOPE_KEY_PREFIX = "catalog:scope:"
+ANY_SCOPE = "*"
+
+_local_scopes: Dict[str, int] = {}  # authoritative when Redis is not configured
+_scope_memo: Dict[str, Tuple[int, float]] = {}
+
+def _forget_scopes():
+    _scope_memo.clear()
+
+def _memo_scope(scope: str) -> Optional[int]:
+    memo = _scope_memo.get(scope)
+    if memo is not None and time.monotonic() - memo[1] < VERSION_MEMO_TTL:
+        return memo[0]
+    return None
+
+def _remember_scope(scope: str, raw) -> int:
+    version = int(raw or 0)
+    _scope_memo[scope] = (version, time.monotonic())
+    return version
+
+def _format_scoped(version: int, scope: str, counter: int) -> str:
+    return f"{version}.{scope}.{counter}"
+
+def scoped_version(scope: str = ANY_SCOPE) -> str:
+    """Generation for keys restricted to `scope`, e.g. `3.department=CS.2`."""
+    if aio.on_loop():
+        return aio.wait(ascoped_version(scope))
+    version = catalog_version()
+    counter = _memo_scope(scope)
+    if counter is None:
+        counter = _local_scopes.get(scope, 0)
+        if redis_client:
+            try:
+                counter = _remember_scope(scope, redis_client.get(SCOPE_KEY_PREFIX + scope))
+            except Exception as e:
+                logging.warning(f"Redis error reading scope version: {e}")
+    return _format_scoped(version, scope, counter)
+
+async def ascoped_version(scope: str = ANY_SCOPE) -> str:
+    version = await acatalog_version()
+    counter = _memo_scope(scope)
+    if counter is not None:
+        return _format_scoped(version, scope, counter)
+    if async_redis_client:
+        try:
+            raw = await async_redis_client.get(SCOPE_KEY_PREFIX + scope)
+            return _format_scoped(version, scope, _remember_scope(scope, raw))
+        except Exception as e:
+            logging.warning(f"Redis error reading scope version: {e}")
+            return _format_scoped(version, scope, _local_scopes.get(scope, 0))
+    if redis_client:
+        return await run_in_threadpool(scoped_version, scope)
+    return _format_scoped(version, scope, _local_scopes.get(scope, 0))
+
+def bump_scopes(scopes: Sequence[str]) -> List[str]:
+    """Invalidate entries restricted to any of `scopes` (ANY_SCOPE is always included)."""
+    scopes = sorted(set(scopes) | {ANY_SCOPE})
+    counters = None
+    if redis_client:
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for scope in scopes:
+                pipe.incr(SCOPE_KEY_PREFIX + scope)
+            counters = pipe.execute()
+            redis_client.publish(INVALIDATION_CHANNEL, SCOPE_KEY_PREFIX)
+        except Exception as e:
+            logging.warning(f"Redis error bumping scopes: {e}")
+    for i, scope in enumerate(scopes):
+        _local_scopes[scope] = int(counters[i]) if counters else _local_scopes.get(scope, 0) + 1
+        _remember_scope(scope, _local_scopes[scope])
+    logging.info(f"[Cache] Bumped {len(scopes)} scopes: {', '.join(scopes[:10])}")
+    return scopes
+
+def data_version() -> str:
+    """Changes with every catalog generation and every data change (ETags, in-process indexes)."""
+    return scoped_version(ANY_SCOPE)
+
+async def adata_version() -> str:
+    return await ascoped_version(ANY_SCOPE)
+
+def vkey(namespace: str, version: Union[int, str], rest: str = "") -> str:
+    """Build a generation-scoped key, e.g. `courses:v3:<rest>`."""
+    return f"{namespace}:v{version}:{rest}" if rest else f"{namespace}:v{version}"
+
+def row_key(course_id: int) -> str:
+    """Per-course row key. Not generation-scoped: ingest deletes changed rows."""
+    return f"row:{course_id}"
+
+def clear_cache_prefix(prefix: str) -> int:
+    """Delete all cache keys with the given prefix (Redis + every worker's local tier)."""
     pattern = f"{prefix}*"
     cleared = 0
 
@@ -49,14 +471,216 @@ def clear_cache_prefix(prefix: str):
             for key in redis_client.scan_iter(pattern):
                 redis_client.delete(key)
                 cleared += 1
+            redis_client.publish(INVALIDATION_CHANNEL, prefix)
             logging.info(f"[Cache] Cleared {cleared} Redis keys for prefix '{prefix}'")
         except Exception as e:
             logging.warning(f"Redis error on clear_cache_prefix: {e}")
 
-    # Fallback (in-memory)
-    to_delete = [k for k in cache_store.keys() if k.startswith(prefix)]
-    for k in to_delete:
-        del cache_store[k]
-        cleared += 1
+    # Local tier (this worker; others get the pub/sub message)
+    cleared += cache_store.clear_prefix(prefix)
 
     logging.info(f"[Cache] Cleared {cleared} total keys (Redis + memory) for prefix '{prefix}'")
+    return cleared
+
+
+# ---------------------------
+# Async variants for `async def` handlers
+# ---------------------------
+async def aget_cache_entry(key: str) -> Optional[Tuple[bytes, float]]:
+    entry = cache_store.get_entry(key)
+    if entry is not None:
+        return entry
+    if async_redis_client:
+        try:
+            async with async_redis_client.pipeline(transaction=False) as pipe:
+                val, pttl = await pipe.get(key).pttl(key).execute()
+            if val and pttl and pttl > 0:
+                _store_local(key, val, pttl / 1000)
+                return val, pttl / 1000
+        except Exception as e:
+            logging.warning(f"Redis error: {e}")
+    elif redis_client:
+        # Blocking client: keep the round trip off the event loop.
+        return await run_in_threadpool(get_cache_entry, key)
+    return None
+
+async def aget_cache_bytes(key: str) -> Optional[bytes]:
+    entry = await aget_cache_entry(key)
+    return entry[0] if entry else None
+
+async def aget_cache(key: str):
+    val = await aget_cache_bytes(key)
+    return val.decode("utf-8") if val is not None else None
+
+async def aset_cache(key: str, value: CacheValue, ttl: int = 60):
+    value = _to_bytes(value)
+    _store_local(key, value, ttl)
+    if async_redis_client:
+        try:
+            await async_redis_client.setex(key, ttl, value)
+        except Exception as e:
+            logging.warning(f"Redis error: {e}")
+    elif redis_client:
+        await run_in_threadpool(_redis_setex, key, ttl, value)
+
+async def aget_many_bytes(keys: Sequence[str], local_ttl: float = 60) -> Dict[str, bytes]:
+    if not async_redis_client:
+        if redis_client:
+            return await run_in_threadpool(get_many_bytes, keys, local_ttl)
+        return get_many_bytes(keys, local_ttl)
+    found: Dict[str, bytes] = {}
+    missing = []
+    for key in keys:
+        val = cache_store.get(key)
+        if val is not None:
+            found[key] = val
+        else:
+            missing.append(key)
+    if missing:
+        try:
+            for key, val in zip(missing, await async_redis_client.mget(missing)):
+                if val is not None:
+                    _store_local(key, val, local_ttl)
+                    found[key] = val
+        except Exception as e:
+            logging.warning(f"Redis error: {e}")
+    return found
+
+async def aset_many(items: Dict[str, CacheValue], ttl: int = 60):
+    if not async_redis_client:
+        if redis_client:
+            return await run_in_threadpool(set_many, items, ttl)
+        return set_many(items, ttl)
+    items = {k: _to_bytes(v) for k, v in items.items()}
+    for key, value in items.items():
+        _store_local(key, value, ttl)
+    if items:
+        try:
+            async with async_redis_client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.setex(key, ttl, value)
+                await pipe.execute()
+        except Exception as e:
+            logging.warning(f"Redis error: {e}")
+
+def _redis_setex(key: str, ttl: int, value: bytes):
+    try:
+        redis_client.setex(key, ttl, value)
+    except Exception as e:
+        logging.warning(f"Redis error: {e}")
+
+
+# ---------------------------
+# Single-flight + stale-while-revalidate
+# ---------------------------
+_inflight: Dict[str, "asyncio.Task"] = {}
+
+# Compare-and-delete so a worker only releases a lock it still owns.
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+async def _redis(method: str, *args, **kwargs):
+    if async_redis_client:
+        return await getattr(async_redis_client, method)(*args, **kwargs)
+    return await run_in_threadpool(getattr(redis_client, method), *args, **kwargs)
+
+async def _acquire_lock(key: str) -> Optional[str]:
+    """Try to take the cross-worker compute lock; returns the token or None."""
+    token = uuid.uuid4().hex
+    try:
+        ok = await _redis("set", f"lock:{key}", token, nx=True, px=settings.CACHE_LOCK_TIMEOUT_MS)
+        return token if ok else None
+    except Exception as e:
+        logging.warning(f"Redis error on lock: {e}")
+        return token  # Redis trouble: fall back to per-process protection only
+
+async def _release_lock(key: str, token: str):
+    try:
+        await _redis("eval", _RELEASE_LOCK, 1, f"lock:{key}", token)
+    except Exception as e:
+        logging.warning(f"Redis error on unlock: {e}")
+
+async def _wait_for_value(key: str) -> Optional[bytes]:
+    """Poll for another worker's result until the lock timeout elapses."""
+    deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT_MS / 1000
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.02)
+        val = await aget_cache_bytes(key)
+        if val is not None:
+            return val
+    return None
+
+async def _compute_and_store(
+    key: str, compute: Callable[[], Awaitable[CacheValue]], ttl: int, stale_ttl: int, refresh: bool
+) -> Optional[bytes]:
+    token = None
+    if settings.CACHE_LOCK and (redis_client or async_redis_client):
+        token = await _acquire_lock(key)
+        if token is None:
+            if refresh:
+                return None  # another worker is already revalidating this key
+            val = await _wait_for_value(key)
+            if val is not None:
+                return val
+    try:
+        value = _to_bytes(await compute())
+        await aset_cache(key, value, ttl + stale_ttl)
+        return value
+    finally:
+        if token is not None:
+            await _release_lock(key, token)
+
+def _flight(key: str, compute, ttl: int, stale_ttl: int, refresh: bool = False) -> "asyncio.Task":
+    """Return the in-flight computation for `key`, starting one if needed."""
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_compute_and_store(key, compute, ttl, stale_ttl, refresh))
+        _inflight[key] = task
+
+        def _done(t, key=key):
+            if _inflight.get(key) is t:
+                del _inflight[key]
+            if t.cancelled():
+                return
+            # Always retrieved, so a failure nobody is waiting for any more
+            # never triggers asyncio's "Task exception was never retrieved".
+            exc = t.exception()
+            if exc is not None and refresh:
+                logging.warning(f"[Cache] Background refresh of '{key}' failed: {exc}")
+
+        task.add_done_callback(_done)
+    return task
+
+async def get_or_compute(
+    key: str,
+    compute: Callable[[], Awaitable[CacheValue]],
+    ttl: int = 60,
+    stale_ttl: Optional[int] = None,
+) -> bytes:
+    """Cached value for `key`, computing it at most once per process on a miss.
+
+    Concurrent callers for the same key share one `compute()`; with
+    CACHE_LOCK=1 workers also coordinate through a Redis lock. Entries are kept
+    for `ttl + stale_ttl` seconds: during the last `stale_ttl` seconds the
+    stale value is returned immediately while one background refresh runs.
+    """
+    if stale_ttl is None:
+        stale_ttl = settings.CACHE_STALE_TTL
+    with timing.span("cache"):
+        entry = await aget_cache_entry(key)
+    timing.cache_result(key, entry is not None)
+    if entry is not None:
+        value, left = entry
+        if stale_ttl and left <= stale_ttl:
+            _flight(key, compute, ttl, stale_ttl, refresh=True)
+        return value
+    # shield: a disconnecting client must not cancel the computation others wait on.
+    with timing.span("compute"):
+        value = await asyncio.shield(_flight(key, compute, ttl, stale_ttl))
+    if value is None:  # lost a refresh race with no value to show; compute directly
+        value = _to_bytes(await compute())
+    return value
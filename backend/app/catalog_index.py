@@ -0,0 +1,247 @@
+"""Optional in-process columnar index over the `courses` table.
+
+When `settings.CATALOG_INDEX` is on, `crud.list_courses` answers filter +
+sort + pagination from NumPy column arrays instead of issuing SQL. The
+index mirrors `crud.apply_filters` predicate-for-predicate and the SQL sort
+order (rating desc, fee asc, id asc), so both paths return identical pages.
+
+The first build in a worker can come from a columnar snapshot
+(`CATALOG_SNAPSHOT_PATH`, see `app/snapshot.py`) taken at the current data
+version. The index is rebuilt from the database after every ingest, when another
+worker changes the data version (`cache.data_version`), and (as a fallback without Redis) when it
+is older than `CATALOG_INDEX_MAX_AGE` seconds. A rebuild creates a fresh `CatalogIndex` and swaps the module
+reference, so readers always see either the old or the new snapshot.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import aio, search, snapshot
+from .cache import data_version
+from .models import Course
+from .settings import settings
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+if settings.CATALOG_INDEX and np is None:
+    logging.warning("CATALOG_INDEX is enabled but numpy is not installed; using SQL path")
+
+COLUMNS = (
+    "id", "course_id", "course_name", "department", "level", "delivery_mode",
+    "credits", "duration_weeks", "rating", "tuition_fee_inr", "year_offered",
+)
+INT_COLUMNS = ("id", "course_id", "credits", "duration_weeks", "tuition_fee_inr", "year_offered")
+STR_COLUMNS = ("course_name", "department", "level", "delivery_mode")
+
+# Characters that make `ilike` behave differently from a plain substring match.
+_LIKE_SPECIAL = ("%", "_", "\\")
+
+
+class CatalogIndex:
+    """Immutable column-array snapshot of the catalog."""
+
+    def __init__(self, rows: Sequence[Sequence[Any]], version: str = ""):
+        cols = list(zip(*rows)) if rows else [()] * len(COLUMNS)
+        data = dict(zip(COLUMNS, cols))
+        self.size = len(rows)
+        self.built_at = time.time()
+        self.version = version  # data version the rows were read at
+
+        self.ints = {c: np.asarray(data[c], dtype=np.int64) for c in INT_COLUMNS}
+        self.rating = np.asarray(data["rating"], dtype=np.float64)
+
+        # Dictionary-encode strings: `values[codes[i]]` is row i's value.
+        self.str_values: Dict[str, List[str]] = {}
+        self.str_codes: Dict[str, Any] = {}
+        self.str_lookup: Dict[str, Dict[str, int]] = {}
+        for c in STR_COLUMNS:
+            lookup: Dict[str, int] = {}
+            codes = np.fromiter(
+                (lookup.setdefault(v, len(lookup)) for v in data[c]), dtype=np.int32, count=self.size
+            )
+            self.str_values[c] = list(lookup)
+            self.str_codes[c] = codes
+            self.str_lookup[c] = lookup
+        self._derive()
+
+    @classmethod
+    def from_snapshot(cls, snap: "snapshot.Snapshot", version: str = "") -> "CatalogIndex":
+        """Index over a database snapshot's columns, without going through Python rows."""
+        idx = cls.__new__(cls)
+        idx.size = snap.rows
+        idx.built_at = time.time()
+        idx.version = version
+        idx.ints = {c: np.array(snap.column(c), dtype=np.int64) for c in INT_COLUMNS}
+        idx.rating = np.array(snap.column("rating"), dtype=np.float64)
+        idx.str_values = {c: snap.strings(c) for c in STR_COLUMNS}
+        idx.str_codes = {c: np.array(snap.column(c), dtype=np.int32) for c in STR_COLUMNS}
+        idx.str_lookup = {c: {v: i for i, v in enumerate(values)} for c, values in idx.str_values.items()}
+        idx._derive()
+        return idx
+
+    def _derive(self):
+        self.name_lower = np.asarray([v.lower() for v in self.str_values["course_name"]], dtype=str)
+
+        # Default order: rating desc, tuition fee asc, id asc (lexsort keys are last-major).
+        self.order = np.lexsort((self.ints["id"], self.ints["tuition_fee_inr"], -self.rating))
+
+    # -----------------------
+    # Predicates
+    # -----------------------
+    @staticmethod
+    def supports(params: Dict[str, Any]) -> bool:
+        """Whether this index can answer `params` exactly like the SQL path."""
+        if params.get("sort") == "relevance":
+            return False
+        q = params.get("q")
+        return not (q and (search.fulltext_enabled() or any(ch in q for ch in _LIKE_SPECIAL)))
+
+    def _eq_str(self, col: str, value: Any):
+        code = self.str_lookup[col].get(value)
+        if code is None:
+            return np.zeros(self.size, dtype=bool)
+        return self.str_codes[col] == code
+
+    def mask(self, params: Dict[str, Any]):
+        """Boolean row mask equivalent to `crud.apply_filters(params)`."""
+        m = np.ones(self.size, dtype=bool)
+        if dept := params.get("department"):
+            m &= self._eq_str("department", dept)
+        if level := params.get("level"):
+            m &= self._eq_str("level", level)
+        if mode := params.get("delivery_mode"):
+            m &= self._eq_str("delivery_mode", mode)
+        if q := params.get("q"):
+            hits = np.char.find(self.name_lower, q.lower()) >= 0
+            m &= hits[self.str_codes["course_name"]]
+        if min_rating := params.get("min_rating"):
+            m &= self.rating >= float(min_rating)
+        if max_fee := params.get("max_fee"):
+            m &= self.ints["tuition_fee_inr"] <= int(max_fee)
+        if min_credits := params.get("min_credits"):
+            m &= self.ints["credits"] >= int(min_credits)
+        if max_credits := params.get("max_credits"):
+            m &= self.ints["credits"] <= int(max_credits)
+        if min_dur := params.get("min_duration_weeks"):
+            m &= self.ints["duration_weeks"] >= int(min_dur)
+        if max_dur := params.get("max_duration_weeks"):
+            m &= self.ints["duration_weeks"] <= int(max_dur)
+        if year := params.get("year"):
+            m &= self.ints["year_offered"] == int(year)
+        return m
+
+    # -----------------------
+    # Query
+    # -----------------------
+    def row(self, i: int) -> Dict[str, Any]:
+        out: Dict[str, Any] = {c: int(self.ints[c][i]) for c in INT_COLUMNS}
+        out["rating"] = float(self.rating[i])
+        for c in STR_COLUMNS:
+            out[c] = self.str_values[c][self.str_codes[c][i]]
+        return {c: out[c] for c in COLUMNS}
+
+    def query(self, params: Dict[str, Any], page: int, page_size: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Filter, sort and paginate; returns (serialized rows, total)."""
+        m = self.mask(params)
+        matched = self.order[m[self.order]]
+        start = (page - 1) * page_size
+        return [self.row(i) for i in matched[start:start + page_size]], int(matched.size)
+
+    def query_after(self, params: Dict[str, Any], after: Optional[Tuple[float, int, int]], limit: int) -> List[Dict[str, Any]]:
+        """Keyset variant of `query`: first `limit` matches after the cursor tuple."""
+        m = self.mask(params)
+        if after is not None:
+            rating, fee, cid = after
+            fees, ids = self.ints["tuition_fee_inr"], self.ints["id"]
+            m &= (self.rating < rating) | (
+                (self.rating == rating) & ((fees > fee) | ((fees == fee) & (ids > cid)))
+            )
+        matched = self.order[m[self.order]]
+        return [self.row(i) for i in matched[:limit]]
+
+
+# -----------------------
+# Module-level snapshot
+# -----------------------
+_index: Optional[CatalogIndex] = None
+_build_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(settings.CATALOG_INDEX) and np is not None
+
+
+def _from_snapshot(db: Session, version: str) -> Optional[CatalogIndex]:
+    path = settings.CATALOG_SNAPSHOT_PATH
+    if not path or not snapshot.is_snapshot(path):
+        return None
+    try:
+        with snapshot.Snapshot(path) as snap:
+            if snapshot.is_current(db, snap):
+                return aio.offload(CatalogIndex.from_snapshot, snap, version)
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"[CatalogIndex] Ignoring snapshot {path}: {e}")
+    return None
+
+
+def build(db: Session, warm: bool = False) -> CatalogIndex:
+    """Load the whole catalog and swap it in as the current index.
+
+    With `warm`, a current `CATALOG_SNAPSHOT_PATH` snapshot is used instead
+    of reading every row from the database.
+    """
+    global _index
+    started = time.perf_counter()
+    version = data_version()
+    idx = _from_snapshot(db, version) if warm else None
+    source = "snapshot"
+    if idx is None:
+        rows = db.execute(select(*(getattr(Course, c) for c in COLUMNS))).all()
+        idx, source = aio.offload(CatalogIndex, rows, version), "database"
+    _index = idx
+    logging.info(
+        f"[CatalogIndex] Built {idx.size} rows from the {source} in {(time.perf_counter() - started) * 1000:.1f} ms"
+    )
+    return idx
+
+
+def _is_current(idx: CatalogIndex) -> bool:
+    return idx.version == data_version() and time.time() - idx.built_at < settings.CATALOG_INDEX_MAX_AGE
+
+
+def get_index(db: Session) -> Optional[CatalogIndex]:
+    """Return a current index, building it on first use, after the data
+    version changes, or when it is too old."""
+    if not enabled():
+        return None
+    idx = _index
+    if idx is not None and _is_current(idx):
+        return idx
+    # Only one thread rebuilds; the others keep serving the previous snapshot.
+    if not aio.acquire(_build_lock, blocking=idx is None):
+        return idx
+    try:
+        if _index is not idx:
+            return _index
+        return build(db, warm=idx is None)
+    finally:
+        _build_lock.release()
+
+
+def refresh(db: Session):
+    """Rebuild after an ingest (no-op when the index is disabled)."""
+    if enabled():
+        with _build_lock:
+            build(db)
+
+
+def reset():
+    global _index
+    _index = None
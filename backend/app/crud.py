@@ -1,15 +1,30 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
-from typing import List, Dict, Any, Tuple
+from sqlalchemy import select, func, or_, and_, literal, union_all
+from typing import List, Dict, Any, Iterator, Tuple, Sequence, Optional
+import base64
 import json
+import logging
 
-from .cache import get_cache, set_cache
-from .models import Course
+from . import catalog_index, facets, index_advisor, query, search, timing
+from .cache import get_cache, set_cache, scoped_version, vkey
+from .models import CatalogRevision, Course
+from .settings import settings
+
+plan_logger = logging.getLogger("coursequest.explain")
 
 
 # -----------------------
 # Helpers
 # -----------------------
+# Columns selected for API rows. Querying these instead of `Course` entities
+# yields plain dicts (same shape as `serialize_course`) without ORM overhead.
+COURSE_COLUMNS = tuple(c for c in Course.__table__.columns if c.name != "row_hash")
+
+
+def _rows(db: Session, stmt) -> List[Dict[str, Any]]:
+    return [dict(r) for r in db.execute(stmt).mappings()]
+
+
 def serialize_course(c: Course) -> Dict[str, Any]:
     """Convert SQLAlchemy Course object → dict (safe for cache)."""
     return {
@@ -27,7 +42,8 @@ def serialize_course(c: Course) -> Dict[str, Any]:
     }
 
 
-def apply_filters(stmt, params: Dict[str, Any]):
+def apply_filters(stmt, params: Dict[str, Any], db: Optional[Session] = None):
+    """Add WHERE clauses for `params`. `db` selects the search backend for `q`."""
     if dept := params.get("department"):
         stmt = stmt.where(Course.department == dept)
     if level := params.get("level"):
@@ -35,8 +51,7 @@ def apply_filters(stmt, params: Dict[str, Any]):
     if mode := params.get("delivery_mode"):
         stmt = stmt.where(Course.delivery_mode == mode)
     if q := params.get("q"):
-        like = f"%{q}%"
-        stmt = stmt.where(Course.course_name.ilike(like))
+        stmt = stmt.where(search.match_clause(db, q))
     if min_rating := params.get("min_rating"):
         stmt = stmt.where(Course.rating >= float(min_rating))
     if max_fee := params.get("max_fee"):
@@ -54,59 +69,337 @@ def apply_filters(stmt, params: Dict[str, Any]):
     return stmt
 
 
+# Listing order. `id` breaks rating/fee ties so pages are deterministic, which
+# keyset pagination and the catalog index both rely on.
+DEFAULT_ORDER = (Course.rating.desc(), Course.tuition_fee_inr.asc(), Course.id.asc())
+
+
+
+def order_by(db: Session, params: Dict[str, Any]):
+    """ORDER BY clauses: `DEFAULT_ORDER`, optionally led by search relevance."""
+    if params.get("sort") == "relevance":
+        rel = search.relevance_order(db, params.get("q"))
+        if rel is not None:
+            return (rel, *DEFAULT_ORDER)
+    return DEFAULT_ORDER
+
+
+Cursor = Tuple[float, int, int]  # (rating, tuition_fee_inr, id) of the last row seen
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Opaque keyset cursor pointing just after `row` in `DEFAULT_ORDER`."""
+    raw = json.dumps([row["rating"], row["tuition_fee_inr"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Inverse of `encode_cursor`; raises ValueError on anything malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        rating, fee, cid = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(rating), int(fee), int(cid)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def apply_after(stmt, after: Cursor):
+    """Seek past `after` in `DEFAULT_ORDER` (served by ix_courses_rating_fee_id)."""
+    rating, fee, cid = after
+    return stmt.where(or_(
+        Course.rating < rating,
+        and_(
+            Course.rating == rating,
+            or_(
+                Course.tuition_fee_inr > fee,
+                and_(Course.tuition_fee_inr == fee, Course.id > cid),
+            ),
+        ),
+    ))
+
+
+def _dialect_insert(db: Session):
+    """Return the dialect-specific `insert()` that supports ON CONFLICT."""
+    name = db.get_bind().dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Bulk upsert not supported on dialect '{name}'")
+    return insert
+
+
 # -----------------------
 # Core CRUD
 # -----------------------
-def list_courses(db: Session, params: Dict[str, Any], page: int, page_size: int) -> Tuple[List[Course], int]:
-    """List courses with filters + pagination (cached)."""
-    cache_key = f"courses:{json.dumps(params, sort_keys=True)}:p{page}:s{page_size}"
-    cached = get_cache(cache_key)
-    if cached:
-        data = json.loads(cached)
-        return [Course(**item) for item in data["items"]], data["total"]
+def list_courses(db: Session, params: Dict[str, Any], page: int, page_size: int) -> Tuple[List[Dict[str, Any]], int]:
+    """List courses with filters + pagination, as serialized rows.
+
+    Uncached: callers cache the finished response (see `query_service`).
+    """
+    items, total, _ = list_courses_counted(db, params, page, page_size)
+    return items, total
 
-    stmt = select(Course)
-    stmt = apply_filters(stmt, params)
 
-    total = db.scalar(
-        select(func.count()).select_from(apply_filters(select(Course), params).subquery())
-    )
-    stmt = stmt.order_by(Course.rating.desc(), Course.tuition_fee_inr.asc())
+def list_courses_counted(
+    db: Session, params: Dict[str, Any], page: int, page_size: int
+) -> Tuple[List[Dict[str, Any]], int, bool]:
+    """`list_courses` plus whether `total` is exact, per `COUNT_STRATEGY`:
+
+    - `cached`: one exact count per filter set, cached and shared by every page
+    - `exact`: `count(*) OVER ()` on the page query itself (one round trip)
+    - `estimate`: planner/histogram estimate for large results (see `total_courses`)
+    """
+    idx = catalog_index.get_index(db)
+    if idx is not None and idx.supports(params):
+        with timing.span("index"):
+            return (*idx.query(params, page, page_size), True)
+
+    stmt = apply_filters(select(*COURSE_COLUMNS), params, db)
+    stmt = stmt.order_by(*order_by(db, params))
     stmt = stmt.offset((page - 1) * page_size).limit(page_size)
-    items = list(db.execute(stmt).scalars())
 
-    set_cache(
-        cache_key,
-        json.dumps({
-            "items": [serialize_course(i) for i in items],
-            "total": int(total or 0),
-        }),
-        ttl=60,
-    )
+    index_advisor.record(params)
+    if settings.EXPLAIN_COURSES:
+        _capture_plan(db, stmt, params)
 
-    return items, int(total or 0)
+    if settings.COUNT_STRATEGY == "exact":
+        with timing.span("page"):
+            rows = _rows(db, stmt.add_columns(func.count().over().label("_total")))
+        if not rows:
+            # Past the last page the window has nothing to report.
+            return [], count_courses(db, params), True
+        total = rows[0]["_total"]
+        for r in rows:
+            del r["_total"]
+        return rows, total, True
 
+    total, exact = total_courses(db, params)
+    with timing.span("page"):
+        return _rows(db, stmt), total, exact
 
-def compare_courses(db: Session, ids: List[int]) -> List[Course]:
-    """Compare courses by ID (no cache)."""
-    if not ids:
-        return []
-    stmt = select(Course).where(Course.id.in_(ids))
-    return list(db.execute(stmt).scalars())
 
+def _count_key(params: Dict[str, Any]) -> str:
+    return vkey("count", scoped_version(query.scope(params)), query.key(params, include_sort=False))
 
-def meta(db: Session) -> Dict[str, List[str]]:
-    """Fetch distinct metadata values (cached)."""
-    cache_key = "meta"
+
+def count_courses(db: Session, params: Dict[str, Any]) -> int:
+    """Total matches for a filter set, cached separately from pages so every
+    page (offset or keyset) of the same query reuses one count."""
+    cache_key = _count_key(params)
     cached = get_cache(cache_key)
+    timing.cache_result(cache_key, bool(cached))
     if cached:
-        return json.loads(cached)
+        return int(cached)
+
+    idx = catalog_index.get_index(db)
+    with timing.span("count"):
+        if idx is not None and idx.supports(params):
+            total = int(idx.mask(params).sum())
+        else:
+            total = int(db.scalar(
+                select(func.count()).select_from(apply_filters(select(Course), params, db).subquery())
+            ) or 0)
+    set_cache(cache_key, str(total), ttl=60)
+    return total
+
+
+def _explain(db: Session, stmt, options: str = "") -> Any:
+    """Plan for `stmt`: Postgres `EXPLAIN (FORMAT JSON ...)` output, elsewhere
+    the `EXPLAIN QUERY PLAN` detail lines (SQLite)."""
+    bind = db.get_bind()
+    compiled = stmt.compile(dialect=bind.dialect)
+    args = compiled.params
+    if compiled.positional:
+        args = tuple(args[name] for name in compiled.positiontup)
+    if bind.dialect.name != "postgresql":
+        return [row[-1] for row in db.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), args)]
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON{options}) {compiled}", args).scalar()
+    return json.loads(plan) if isinstance(plan, str) else plan
+
+
+def _capture_plan(db: Session, stmt, params: Dict[str, Any]):
+    """`EXPLAIN_COURSES` mode: log the plan of a courses query about to run."""
+    options = ", ANALYZE, BUFFERS" if settings.EXPLAIN_COURSES > 1 else ""
+    plan_logger.info(json.dumps({"params": params, "plan": _explain(db, stmt, options)}, default=str))
+
+
+def explain_courses(db: Session, params: Dict[str, Any], page: int = 1, page_size: int = 10) -> Any:
+    """Plan of the page query `list_courses` would run for `params`."""
+    stmt = apply_filters(select(*COURSE_COLUMNS), params, db).order_by(*order_by(db, params))
+    return _explain(db, stmt.offset((page - 1) * page_size).limit(page_size))
 
-    deps = [r[0] for r in db.execute(select(Course.department).distinct()).all()]
-    levels = [r[0] for r in db.execute(select(Course.level).distinct()).all()]
-    modes = [r[0] for r in db.execute(select(Course.delivery_mode).distinct()).all()]
 
-    result = {"departments": deps, "levels": levels, "delivery_modes": modes}
+def estimate_courses(db: Session, params: Dict[str, Any]) -> Optional[int]:
+    """Estimated matches without counting: the Postgres planner's row estimate,
+    elsewhere the materialized facet histograms. None when neither applies."""
+    if db.get_bind().dialect.name != "postgresql":
+        return facets.estimate(db, params)
+    plan = _explain(db, apply_filters(select(Course.id), params, db))
+    return int(plan[0]["Plan"]["Plan Rows"])
 
-    set_cache(cache_key, json.dumps(result), ttl=3600)  # cache for 1h
-    return result
+
+def total_courses(db: Session, params: Dict[str, Any]) -> Tuple[int, bool]:
+    """Total for a filter set and whether it is exact.
+
+    Exact (`count_courses`) unless `COUNT_STRATEGY=estimate`, no exact count
+    is cached yet and the estimate is at least `COUNT_ESTIMATE_THRESHOLD`;
+    smaller results are cheap to count, so they are always exact.
+    """
+    if settings.COUNT_STRATEGY == "estimate" and get_cache(_count_key(params)) is None:
+        idx = catalog_index.get_index(db)
+        if idx is None or not idx.supports(params):
+            with timing.span("estimate"):
+                estimate = estimate_courses(db, params)
+            if estimate is not None and estimate >= settings.COUNT_ESTIMATE_THRESHOLD:
+                return estimate, False
+    return count_courses(db, params), True
+
+
+def list_courses_after(
+    db: Session, params: Dict[str, Any], after: Optional[Cursor], page_size: int
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Keyset page: up to `page_size` rows after `after`, plus the next cursor.
+
+    Cost is independent of how deep the client has scrolled and no count is
+    run; use `total_courses` when a total is needed.
+    """
+    idx = catalog_index.get_index(db)
+    with timing.span("page"):
+        if idx is not None and idx.supports(params):
+            items = idx.query_after(params, after, page_size + 1)
+        else:
+            stmt = apply_filters(select(*COURSE_COLUMNS), params, db)
+            if after is not None:
+                stmt = apply_after(stmt, after)
+            stmt = stmt.order_by(*DEFAULT_ORDER).limit(page_size + 1)
+            index_advisor.record(params)
+            if settings.EXPLAIN_COURSES:
+                _capture_plan(db, stmt, params)
+            items = _rows(db, stmt)
+
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    return items, encode_cursor(items[-1]) if has_more else None
+
+
+def list_courses_many(
+    db: Session, filter_sets: Sequence[Dict[str, Any]], page_size: int
+) -> List[Tuple[List[Dict[str, Any]], int]]:
+    """First page and total for each filter set, in one round trip.
+
+    Each set becomes a windowed subquery (`row_number()` for the page,
+    `count(*) over ()` for the total); the sets are glued with UNION ALL.
+    Results come back in the order of `filter_sets`.
+    """
+    if not filter_sets:
+        return []
+    idx = catalog_index.get_index(db)
+    if idx is not None and all(idx.supports(p) for p in filter_sets):
+        return [idx.query(p, 1, page_size) for p in filter_sets]
+
+    parts = []
+    for i, params in enumerate(filter_sets):
+        index_advisor.record(params)
+        ranked = apply_filters(
+            select(
+                *COURSE_COLUMNS,
+                literal(i).label("_set"),
+                func.count().over().label("_total"),
+                func.row_number().over(order_by=order_by(db, params)).label("_rn"),
+            ),
+            params,
+            db,
+        ).subquery()
+        parts.append(select(ranked).where(ranked.c._rn <= page_size))
+    combined = union_all(*parts).subquery() if len(parts) > 1 else parts[0].subquery()
+    stmt = select(combined).order_by(combined.c._set, combined.c._rn)
+
+    results: List[Tuple[List[Dict[str, Any]], int]] = [([], 0) for _ in filter_sets]
+    for row in db.execute(stmt).mappings():
+        items, _ = results[row["_set"]]
+        items.append({c.name: row[c.name] for c in COURSE_COLUMNS})
+        results[row["_set"]] = (items, row["_total"])
+    return results
+
+
+def iter_courses(db: Session, params: Dict[str, Any], batch_size: int) -> Iterator[Sequence[Any]]:
+    """Every row matching `params`, in listing order, as batches of `COURSE_COLUMNS` tuples.
+
+    `yield_per` fetches through a server-side cursor on Postgres (buffered
+    `fetchmany` elsewhere), so only one batch is held in memory at a time.
+    """
+    stmt = apply_filters(select(*COURSE_COLUMNS), params, db).order_by(*order_by(db, params))
+    index_advisor.record(params)
+    yield from db.execute(stmt.execution_options(yield_per=batch_size)).partitions()
+
+
+_upsert_statements: Dict[str, Any] = {}  # dialect name -> statement
+
+
+def _upsert_statement(db: Session):
+    """`INSERT ... ON CONFLICT (course_id) DO UPDATE`, built once per dialect.
+
+    Rows are passed as parameters rather than baked in with `.values()`, so
+    SQLAlchemy compiles the statement once and reuses it from its compiled
+    cache for every batch (executemany / insertmanyvalues).
+    """
+    name = db.get_bind().dialect.name
+    stmt = _upsert_statements.get(name)
+    if stmt is None:
+        stmt = _dialect_insert(db)(Course.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Course.course_id],
+            set_={
+                col.name: stmt.excluded[col.name]
+                for col in Course.__table__.columns
+                if col.name not in ("id", "course_id")
+            },
+        )
+        _upsert_statements[name] = stmt
+    return stmt
+
+
+def upsert_courses(db: Session, rows: Sequence[Dict[str, Any]]) -> int:
+    """Upsert a batch of course rows keyed on `course_id`.
+
+    Uses `INSERT ... ON CONFLICT (course_id) DO UPDATE` on Postgres and SQLite.
+    Duplicate course_ids inside the batch are collapsed (last row wins), since
+    Postgres refuses to update the same row twice in one statement.
+    """
+    if not rows:
+        return 0
+    deduped = list({r["course_id"]: r for r in rows}.values())
+    db.execute(_upsert_statement(db), deduped)
+    return len(deduped)
+
+
+def bump_revision(db: Session):
+    """Count one more write to `courses` (caller commits with the write)."""
+    insert = _dialect_insert(db)
+    stmt = insert(CatalogRevision).values(id=1, revision=1)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[CatalogRevision.id], set_={"revision": CatalogRevision.revision + 1},
+    ))
+
+
+def compare_courses(db: Session, ids: List[int]) -> List[Dict[str, Any]]:
+    """Compare courses by their public `course_id` (no cache)."""
+    if not ids:
+        return []
+    stmt = select(*COURSE_COLUMNS).where(Course.course_id.in_(ids))
+    return _rows(db, stmt)
+
+
+def meta(db: Session) -> Dict[str, List[str]]:
+    """Fetch distinct metadata values (uncached; see `query_service.meta`).
+
+    Read from the materialized facet counts in one query.
+    """
+    counts = facets.catalog_counts(db)
+    return {
+        "departments": sorted(counts["department"]),
+        "levels": sorted(counts["level"]),
+        "delivery_modes": sorted(counts["delivery_mode"]),
+    }
@@ -1,45 +1,160 @@
 import time
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.exc import OperationalError
 
+from . import metrics, timing
 from .settings import settings
 
 DATABASE_URL = settings.DATABASE_URL
 
 # ---------------------------
-# Engine init with fallback
+# Engines
 # ---------------------------
+def pool_options() -> dict:
+    """Pool settings for server databases (SQLite keeps SQLAlchemy's defaults)."""
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_pre_ping": True,
+    }
+
+def make_engine(url: str):
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False}, echo=bool(settings.DB_ECHO))
+    return create_engine(url, poolclass=metrics.TimedQueuePool, echo=bool(settings.DB_ECHO), **pool_options())
+
+# Engines connect lazily; `wait_for_db` (run at startup) waits for the server.
+engine = make_engine(DATABASE_URL)
+metrics.instrument_engine(engine, "primary")
 if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False},
-        echo=False,
-    )
     print("✅ Using SQLite database:", DATABASE_URL)
-else:
-    engine = None
-    for attempt in range(10):
+
+# Optional read replica for the GET routers.
+read_engine = engine
+if settings.DATABASE_READ_URL:
+    read_engine = make_engine(settings.DATABASE_READ_URL)
+    metrics.instrument_engine(read_engine, "replica")
+    print("✅ Read replica configured:", read_engine.url.render_as_string(hide_password=True))
+
+def wait_for_db(engine_, attempts: int = None, max_delay: float = 5.0):
+    """Block until `engine_` accepts connections, backing off exponentially."""
+    attempts = attempts or settings.DB_CONNECT_ATTEMPTS
+    delay = 0.25
+    for attempt in range(1, attempts + 1):
         try:
-            engine = create_engine(DATABASE_URL, pool_pre_ping=True, echo=True)
-            connection = engine.connect()
-            connection.close()
+            with engine_.connect() as conn:
+                conn.execute(text("SELECT 1"))
             print("✅ Database connected")
-            break
+            return
         except OperationalError:
-            print(f"❌ Database not ready (attempt {attempt+1}/10). Retrying...")
-            time.sleep(5)
-    else:
-        raise Exception("Database connection failed after 10 attempts")
+            if attempt == attempts:
+                break
+            print(f"❌ Database not ready (attempt {attempt}/{attempts}). Retrying in {delay:.2f}s...")
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
+    raise Exception(f"Database connection failed after {attempts} attempts")
 
 # ORM Session + Base
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
 
-def get_db():
+# Async generators, although the sessions are blocking: FastAPI runs a sync
+# generator dependency's setup and teardown in the threadpool, two thread
+# hops per request even when a cache hit never touches the session. Creating
+# a Session does no I/O; closing one only does when it holds a connection.
+async def _close(db: Session):
+    if db.in_transaction():
+        await run_in_threadpool(db.close)  # rolls back and returns the connection
+    else:
+        db.close()
+
+async def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        await _close(db)
+
+async def _get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        await _close(db)
+
+# Without a replica reads share `get_db` (and any dependency override of it).
+get_read_db = _get_read_db if settings.DATABASE_READ_URL else get_db
+
+# ---------------------------
+# Optional async engine (ASYNC_DB=1)
+# ---------------------------
+def async_database_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto its asyncpg / aiosqlite equivalent."""
+    scheme, rest = url.split("://", 1)
+    if scheme.startswith("sqlite"):
+        return f"sqlite+aiosqlite://{rest}"
+    if scheme.startswith("postgres"):
+        return f"postgresql+asyncpg://{rest}"
+    return url
+
+def make_async_engine(url: str):
+    url = async_database_url(url)
+    options = {} if url.startswith("sqlite") else pool_options()
+    return create_async_engine(url, echo=bool(settings.DB_ECHO), **options)
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.ASYNC_DB:
+    # Reads only (writes go through the sync engine), so this targets the replica when set.
+    async_engine = make_async_engine(settings.DATABASE_READ_URL or DATABASE_URL)
+    metrics.instrument_engine(async_engine.sync_engine, "async")
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    print("✅ Async database engine enabled:", async_engine.url.drivername)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Session dependency used by the read routers; flip with ASYNC_DB to A/B the two stacks.
+get_session = get_async_db if settings.ASYNC_DB else get_read_db
+
+async def run_db(db, fn, *args, **kwargs):
+    """Run a sync-style crud function `fn(session, ...)` without blocking the event loop.
+
+    With an AsyncSession the function runs through `run_sync`, so its queries
+    go over the async driver; the cache, version and index helpers it calls
+    then await the async Redis client and build indexes in the threadpool
+    (see `aio`). A blocking Session is handed to the threadpool.
+    """
+    with timing.span(f"db.{fn.__name__}"):
+        if isinstance(db, AsyncSession):
+            return await db.run_sync(fn, *args, **kwargs)
+        return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+@asynccontextmanager
+async def own_session(db):
+    """A new session on the same engine as the request session `db`.
+
+    Cache computations may be shared by concurrent requests or run as a
+    background refresh after the request has returned and its session has
+    been closed, so they must not use `db` itself. Following `db`'s bind
+    keeps read-replica routing and test dependency overrides.
+    """
+    if isinstance(db, AsyncSession):
+        async with AsyncSession(db.bind, autoflush=False, expire_on_commit=False) as session:
+            yield session
+        return
+    session = Session(bind=db.get_bind(), autoflush=False)
+    try:
+        yield session
+    finally:
+        await run_in_threadpool(session.close)
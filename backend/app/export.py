@@ -0,0 +1,57 @@
+"""Streaming bodies for `/api/courses/export`.
+
+The whole filtered catalog is sent in one response instead of 100-row pages:
+one query through a server-side cursor (`crud.iter_courses`), no count, no
+cache and no Pydantic models. Each fetched batch becomes one chunk of NDJSON
+or CSV, so memory per request stays at one batch however many rows match.
+"""
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, Sequence
+
+from sqlalchemy.orm import Session
+
+from . import crud
+from .settings import settings
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+COLUMNS = [c.name for c in crud.COURSE_COLUMNS]
+
+Batches = Iterable[Sequence[Sequence[Any]]]
+
+
+def ndjson(batches: Batches) -> Iterator[bytes]:
+    for batch in batches:
+        yield "".join(
+            json.dumps(dict(zip(COLUMNS, row)), separators=(",", ":")) + "\n" for row in batch
+        ).encode("utf-8")
+
+
+def csv_rows(batches: Batches) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(COLUMNS)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():  # nothing matched: just the header
+        yield buf.getvalue().encode("utf-8")
+
+
+FORMATS = {"ndjson": ndjson, "csv": csv_rows}
+
+
+def stream(db: Session, params: Dict[str, Any], fmt: str) -> Iterator[bytes]:
+    """Body chunks for every course matching `params`.
+
+    Runs after the request's session dependency has exited; the session
+    reconnects for the export query and is closed again here when the
+    stream ends or the client goes away.
+    """
+    try:
+        yield from FORMATS[fmt](crud.iter_courses(db, params, settings.EXPORT_BATCH_SIZE))
+    finally:
+        db.close()
@@ -0,0 +1,279 @@
+"""Facet counts: courses per department, level, delivery mode and year, plus
+tuition-fee and rating histograms.
+
+Catalog-wide counts are materialized in `course_facets` and kept current by
+the ingest engine, which applies a +/- delta per upserted batch
+(`apply_batch`). Counts scoped to filters are computed in one grouped pass:
+a single GROUP BY over every facet column of the matching rows, folded per
+facet in Python (with the catalog index enabled, one masked pass over its
+column arrays instead).
+
+Counts are conjunctive: every active filter, including one on the facet's own
+column, narrows the counts.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from sqlalchemy import Integer, cast, delete, func, select
+from sqlalchemy.orm import Session
+
+from . import catalog_index, crud
+from .models import Course, CourseFacet
+
+FEE_BUCKET = 25000  # INR per tuition histogram bucket
+RATING_BUCKET = 0.5  # stars per rating histogram bucket
+
+CATEGORICAL = ("department", "level", "delivery_mode", "year_offered")
+HISTOGRAMS = {"tuition_fee_inr": FEE_BUCKET, "rating": RATING_BUCKET}
+FACETS = CATEGORICAL + tuple(HISTOGRAMS)
+
+# facet -> value (as stored in course_facets.value) -> count
+Counts = Dict[str, Counter]
+
+
+def _empty() -> Counts:
+    return {f: Counter() for f in FACETS}
+
+
+def row_facets(row: Mapping[str, Any]) -> List[Tuple[str, str]]:
+    """(facet, value) pairs one course contributes to; buckets are floor indexes."""
+    return [
+        ("department", row["department"]),
+        ("level", row["level"]),
+        ("delivery_mode", row["delivery_mode"]),
+        ("year_offered", str(row["year_offered"])),
+        ("tuition_fee_inr", str(int(row["tuition_fee_inr"]) // FEE_BUCKET)),
+        ("rating", str(int(float(row["rating"]) / RATING_BUCKET))),
+    ]
+
+
+def _rating_bucket_expr(db: Session):
+    # Ratings are non-negative, so truncation is floor; Postgres casts round instead.
+    scaled = Course.rating / RATING_BUCKET
+    if db.get_bind().dialect.name == "postgresql":
+        scaled = func.floor(scaled)
+    return cast(scaled, Integer)
+
+
+def _has_filters(params: Dict[str, Any]) -> bool:
+    return any(v for k, v in params.items() if k != "sort")
+
+
+# -----------------------
+# Counting
+# -----------------------
+def _count_sql(db: Session, params: Dict[str, Any]) -> Counts:
+    columns = (
+        Course.department,
+        Course.level,
+        Course.delivery_mode,
+        Course.year_offered,
+        Course.tuition_fee_inr // FEE_BUCKET,
+        _rating_bucket_expr(db),
+    )
+    stmt = crud.apply_filters(select(*columns, func.count()), params, db).group_by(*columns)
+    counts = _empty()
+    for *values, n in db.execute(stmt):
+        for facet, value in zip(FACETS, values):
+            counts[facet][str(value)] += n
+    return counts
+
+
+def _count_index(idx, params: Dict[str, Any]) -> Counts:
+    np = catalog_index.np
+    m = idx.mask(params)
+    counts = _empty()
+    for facet in ("department", "level", "delivery_mode"):
+        hist = np.bincount(idx.str_codes[facet][m], minlength=len(idx.str_values[facet]))
+        counts[facet].update({idx.str_values[facet][i]: int(n) for i, n in enumerate(hist) if n})
+    buckets = {
+        "year_offered": idx.ints["year_offered"][m],
+        "tuition_fee_inr": idx.ints["tuition_fee_inr"][m] // FEE_BUCKET,
+        "rating": (idx.rating[m] / RATING_BUCKET).astype(np.int64),
+    }
+    for facet, arr in buckets.items():
+        values, ns = np.unique(arr, return_counts=True)
+        counts[facet].update({str(int(v)): int(n) for v, n in zip(values, ns)})
+    return counts
+
+
+def count(db: Session, params: Dict[str, Any]) -> Counts:
+    """Facet counts over the rows matching `params`, in one pass."""
+    idx = catalog_index.get_index(db)
+    if idx is not None and idx.supports(params):
+        return _count_index(idx, params)
+    return _count_sql(db, params)
+
+
+def catalog_counts(db: Session) -> Counts:
+    """Unfiltered counts from `course_facets`; computed live until it is populated."""
+    counts = _empty()
+    rows = db.execute(select(CourseFacet.facet, CourseFacet.value, CourseFacet.count)).all()
+    if not rows:
+        return count(db, {})
+    for facet, value, n in rows:
+        if facet in counts:
+            counts[facet][value] = n
+    return counts
+
+
+# -----------------------
+# Estimation
+# -----------------------
+# Filters with no materialized histogram; `estimate` gives up on these.
+_UNESTIMATED = ("q", "min_credits", "max_credits", "min_duration_weeks", "max_duration_weeks")
+_EQUALITY = {"department": "department", "level": "level", "delivery_mode": "delivery_mode", "year": "year_offered"}
+
+
+def _in_range(counter: Counter, width: float, lo: float = float("-inf"), hi: float = float("inf")) -> float:
+    """Rows of a histogram inside [lo, hi], interpolating linearly within buckets."""
+    rows = 0.0
+    for b, n in counter.items():
+        start = int(b) * width
+        overlap = min(start + width, hi) - max(start, lo)
+        rows += n * min(max(overlap / width, 0.0), 1.0)
+    return rows
+
+
+def estimate(db: Session, params: Dict[str, Any]) -> Optional[int]:
+    """Matching rows estimated from the catalog-wide counts, treating filters
+    as independent. None if a filter has no histogram (`q`, credits, duration)."""
+    if any(params.get(k) for k in _UNESTIMATED):
+        return None
+    counts = catalog_counts(db)
+    total = sum(counts["department"].values())
+    if not total:
+        return 0
+    fraction = 1.0
+    for param, facet in _EQUALITY.items():
+        if value := params.get(param):
+            fraction *= counts[facet].get(str(value), 0) / total
+    if max_fee := params.get("max_fee"):
+        fraction *= _in_range(counts["tuition_fee_inr"], FEE_BUCKET, hi=float(max_fee)) / total
+    if min_rating := params.get("min_rating"):
+        fraction *= _in_range(counts["rating"], RATING_BUCKET, lo=float(min_rating)) / total
+    return round(total * fraction)
+
+
+# -----------------------
+# Materialization
+# -----------------------
+def rebuild(db: Session):
+    """Recompute `course_facets` from `courses` (caller commits)."""
+    db.execute(delete(CourseFacet))
+    values = [
+        {"facet": facet, "value": value, "count": n}
+        for facet, counter in _count_sql(db, {}).items()
+        for value, n in counter.items()
+    ]
+    if values:
+        db.execute(CourseFacet.__table__.insert(), values)
+
+
+def ensure_materialized(db: Session):
+    """Populate `course_facets` if it is empty but the catalog is not."""
+    if db.scalar(select(CourseFacet.facet).limit(1)) is None and db.scalar(select(Course.id).limit(1)) is not None:
+        rebuild(db)
+
+
+# Reported by /api/ready: the startup rebuild is a full GROUP BY over the catalog.
+materialize_status: Dict[str, Any] = {"state": "idle"}
+
+
+def _run_materialize(session_factory, then: Optional[Callable[[], Any]] = None):
+    materialize_status.update(state="running", started_at=time.time())
+    try:
+        with session_factory() as db:
+            ensure_materialized(db)
+            db.commit()
+        materialize_status["state"] = "done"
+    except Exception as e:
+        materialize_status.update(state="failed", error=str(e))
+        logging.exception("[Facets] Materializing course_facets failed")
+    finally:
+        materialize_status["finished_at"] = time.time()
+    if then is not None:
+        then()
+
+
+def start_materialize(session_factory, then: Optional[Callable[[], Any]] = None) -> threading.Thread:
+    """Run `ensure_materialized` on a daemon thread, then `then()` (e.g. the
+    startup auto-ingest, which must not apply facet deltas during a rebuild)."""
+    materialize_status["state"] = "running"
+    t = threading.Thread(
+        target=_run_materialize, args=(session_factory, then), name="facets-materialize", daemon=True
+    )
+    t.start()
+    return t
+
+
+def _apply_delta(db: Session, delta: Counter):
+    changes = [{"facet": f, "value": v, "count": n} for (f, v), n in delta.items() if n]
+    if not changes:
+        return
+    insert = crud._dialect_insert(db)
+    stmt = insert(CourseFacet).values(changes)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[CourseFacet.facet, CourseFacet.value],
+        set_={"count": CourseFacet.count + stmt.excluded["count"]},
+    ))
+    db.execute(delete(CourseFacet).where(CourseFacet.count <= 0))
+
+
+def apply_batch(db: Session, rows: Iterable[Mapping[str, Any]]):
+    """Update `course_facets` for a batch about to be upserted (same transaction).
+
+    New rows add +1 per facet; rows that replace an existing course first
+    subtract that course's current values.
+    """
+    rows = list({r["course_id"]: r for r in rows}.values())
+    if not rows:
+        return
+    delta: Counter = Counter()
+    for row in rows:
+        delta.update(row_facets(row))
+    existing = db.execute(
+        select(
+            Course.department, Course.level, Course.delivery_mode,
+            Course.year_offered, Course.tuition_fee_inr, Course.rating,
+        ).where(Course.course_id.in_([r["course_id"] for r in rows]))
+    ).mappings()
+    for row in existing:
+        delta.subtract(row_facets(row))
+    _apply_delta(db, delta)
+
+
+def remove_rows(db: Session, rows: Iterable[Mapping[str, Any]]):
+    """Subtract courses about to be deleted (same transaction)."""
+    delta: Counter = Counter()
+    for row in rows:
+        delta.subtract(row_facets(row))
+    _apply_delta(db, delta)
+
+
+# -----------------------
+# API shape
+# -----------------------
+def _shape(counts: Counts) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"total": sum(counts["department"].values())}
+    for facet in CATEGORICAL:
+        conv = int if facet == "year_offered" else str
+        out[facet] = [
+            {"value": conv(v), "count": n}
+            for v, n in sorted(counts[facet].items(), key=lambda kv: (-kv[1], kv[0]))
+        ]
+    for facet, width in HISTOGRAMS.items():
+        out[facet] = [
+            {"min": int(b) * width, "max": (int(b) + 1) * width, "count": n}
+            for b, n in sorted(counts[facet].items(), key=lambda kv: int(kv[0]))
+        ]
+    return out
+
+
+def facets(db: Session, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Facet counts for `params` in the `/api/facets` response shape."""
+    params = params or {}
+    return _shape(count(db, params) if _has_filters(params) else catalog_counts(db))
@@ -0,0 +1,161 @@
+"""Conditional GET and compressed bodies for the catalog endpoints.
+
+ETags are weak validators built from the data version (catalog generation
+plus the any-change counter) and the request path and query string. Every
+ingest changes it, so a matching `If-None-Match` is answered with 304 from
+the (memoized) version alone: no query, no cache read.
+
+Bodies are sent as brotli (when the optional `brotli` package is installed)
+or gzip, per `Accept-Encoding`. Compressed variants are kept in an LRU keyed
+by the uncompressed body, so repeated hits on a cached response skip
+compression; bodies served from the local cache tier are the same `bytes`
+object every time, whose hash Python keeps, making the lookup O(1).
+Streamed bodies (`/api/courses/export`) are compressed on the fly instead.
+"""
+import gzip
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, Iterator, Optional, Set, Tuple
+
+from fastapi import Request, Response
+
+from .cache import adata_version
+from .settings import settings
+
+try:
+    import brotli
+except ImportError:  # optional dependency; gzip only
+    brotli = None
+
+CACHE_CONTROL = "no-cache"  # clients may store responses but must revalidate
+
+
+def etag(version: str, request: Request) -> str:
+    target = f"{request.url.path}?{request.url.query}".encode()
+    return f'W/"{version}-{hashlib.blake2b(target, digest_size=8).hexdigest()}"'
+
+
+def _matches(request: Request, tag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # Weak comparison: W/ prefixes are ignored on both sides.
+    candidates = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in candidates or tag.removeprefix("W/") in candidates
+
+
+# -----------------------
+# Compression
+# -----------------------
+def _accepted(header: str) -> Set[str]:
+    accepted = set()
+    for part in header.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip())
+    return accepted
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Preferred content coding for `accept_encoding` ("br", "gzip" or None)."""
+    if not accept_encoding:
+        return None
+    accepted = _accepted(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Compress a streamed body chunk by chunk. Each chunk is flushed, so
+    the client can decode everything sent so far."""
+    if encoding == "br":
+        c = brotli.Compressor(quality=5)
+        for chunk in chunks:
+            yield c.process(chunk) + c.flush()
+        yield c.finish()
+        return
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        yield z.compress(chunk) + z.flush(zlib.Z_SYNC_FLUSH)
+    yield z.flush()
+
+
+class CompressedBodies:
+    """LRU of (encoding, body) -> compressed body, bounded by total bytes held."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Tuple[str, bytes], bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, body: bytes, encoding: str) -> bytes:
+        key = (encoding, body)
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is not None:
+                self._data.move_to_end(key)
+                return hit
+        compressed = compress(body, encoding)
+        size = len(body) + len(compressed)
+        if size <= self.max_bytes:
+            with self._lock:
+                if key not in self._data:
+                    self._data[key] = compressed
+                    self._bytes += size
+                while self._bytes > self.max_bytes:
+                    (_, old), value = self._data.popitem(last=False)
+                    self._bytes -= len(old) + len(value)
+        return compressed
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+compressed_bodies = CompressedBodies(settings.COMPRESSED_CACHE_MAX_BYTES)
+
+
+# -----------------------
+# Responses
+# -----------------------
+def respond(request: Request, body: bytes, tag: Optional[str] = None) -> Response:
+    """JSON response for `body`, compressed when the client accepts it."""
+    headers = {"Vary": "Accept-Encoding"}
+    if tag:
+        headers.update({"ETag": tag, "Cache-Control": CACHE_CONTROL})
+    encoding = negotiate(request.headers.get("accept-encoding")) if len(body) >= settings.COMPRESS_MIN_BYTES else None
+    if encoding:
+        body = compressed_bodies.get(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def cached_json(request: Request, produce: Callable[[], Awaitable[bytes]]) -> Response:
+    """304 if the client's copy is from the current data version,
+    otherwise the body from `produce()` with an ETag."""
+    tag = etag(await adata_version(), request)
+    if _matches(request, tag):
+        return Response(status_code=304, headers={"ETag": tag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"})
+    return respond(request, await produce(), tag)
@@ -0,0 +1,172 @@
+"""Index advisor: composite index recommendations for the filter combinations
+the API actually serves from the database.
+
+With `QUERY_LOG=1` each DB-served course query records its filter shape
+(equality filters, range filters, sort) in an in-process counter and as a JSON
+line on the `coursequest.queries` logger. A recommendation puts the equality
+columns first and then the default sort (`rating DESC, tuition_fee_inr, id`),
+so the page is read in order without a sort node; range-filter columns go in
+`INCLUDE` on Postgres. Shapes an existing index already serves are reported
+with that index instead.
+
+    cd backend && python -m app.index_advisor queries.log [--min-share 0.01] [--create]
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import inspect, text
+
+from .settings import settings
+
+logger = logging.getLogger("coursequest.queries")
+
+# Query param -> column, in the order equality columns lead a recommendation.
+EQUALITY = {"department": "department", "level": "level", "delivery_mode": "delivery_mode", "year": "year_offered"}
+RANGE = {
+    "min_rating": "rating",
+    "max_fee": "tuition_fee_inr",
+    "min_credits": "credits",
+    "max_credits": "credits",
+    "min_duration_weeks": "duration_weeks",
+    "max_duration_weeks": "duration_weeks",
+}
+SORT = ("rating", "tuition_fee_inr", "id")  # crud.DEFAULT_ORDER
+ABBREV = {"department": "dept", "delivery_mode": "mode", "year_offered": "year", "tuition_fee_inr": "fee"}
+
+# (equality columns, range columns, "default" | "relevance")
+Shape = Tuple[Tuple[str, ...], Tuple[str, ...], str]
+
+shapes: Counter = Counter()
+_lock = threading.Lock()
+
+
+def shape(params: Dict[str, Any]) -> Shape:
+    equality = tuple(col for p, col in EQUALITY.items() if params.get(p))
+    ranges = tuple(dict.fromkeys(col for p, col in RANGE.items() if params.get(p)))
+    return equality, ranges, "relevance" if params.get("sort") == "relevance" else "default"
+
+
+def record(params: Dict[str, Any]):
+    """Count one DB-served query (no-op unless `QUERY_LOG` is set)."""
+    if not settings.QUERY_LOG:
+        return
+    s = shape(params)
+    with _lock:
+        shapes[s] += 1
+    logger.info(json.dumps({"equality": s[0], "range": s[1], "sort": s[2], "text": bool(params.get("q"))}))
+
+
+def read_log(lines: Iterable[str]) -> Counter:
+    """Shapes from `coursequest.queries` log lines (any prefix before the JSON is skipped)."""
+    counts: Counter = Counter()
+    for line in lines:
+        start = line.find("{")
+        if start < 0:
+            continue
+        try:
+            entry = json.loads(line[start:])
+            counts[(tuple(entry["equality"]), tuple(entry["range"]), entry["sort"])] += 1
+        except (ValueError, KeyError, TypeError):
+            continue
+    return counts
+
+
+# -----------------------
+# Recommendations
+# -----------------------
+def existing_indexes(engine) -> Dict[str, List[str]]:
+    """Index name -> column names for `courses` (expression columns skipped)."""
+    return {
+        ix["name"]: [c for c in ix["column_names"] if c]
+        for ix in inspect(engine).get_indexes("courses")
+    }
+
+
+def _serves(columns: List[str], equality: Tuple[str, ...], tail: List[str]) -> bool:
+    # Equality columns may come in any order; whatever follows must match exactly.
+    n = len(equality)
+    return set(columns[:n]) == set(equality) and columns[n:n + len(tail)] == tail
+
+
+def ddl(rec: Dict[str, Any], dialect: str) -> str:
+    cols = ", ".join(f"{c} DESC" if c == "rating" and rec["sort"] == "default" else c for c in rec["columns"])
+    include = f" INCLUDE ({', '.join(rec['include'])})" if dialect == "postgresql" and rec["include"] else ""
+    return f"CREATE INDEX IF NOT EXISTS {rec['name']} ON courses ({cols}){include}"
+
+
+def recommend(counts: Counter, existing: Dict[str, List[str]], min_share: float = 0.01,
+              dialect: str = "postgresql") -> List[Dict[str, Any]]:
+    """One entry per distinct index, most-queried first.
+
+    Shapes below `min_share` of all queries, and shapes without an equality
+    filter (the default sort is already an index scan), are skipped.
+    """
+    total = sum(counts.values())
+    recs: Dict[str, Dict[str, Any]] = {}
+    for (equality, ranges, sort), n in counts.most_common():
+        if not equality or n / total < min_share:
+            continue
+        # Relevance order comes from the search backend; lead with a range column instead.
+        tail = list(SORT) if sort == "default" else list(ranges[:1])
+        columns = list(equality) + tail
+        name = "ix_courses_auto_" + "_".join(ABBREV.get(c, c) for c in equality)
+        name += "_sort" if sort == "default" else "".join(f"_{ABBREV.get(c, c)}" for c in tail)
+        rec = recs.setdefault(name, {
+            "name": name,
+            "columns": columns,
+            "include": [],
+            "sort": sort,
+            "queries": 0,
+            "covered_by": next((ix for ix, cols in existing.items() if _serves(cols, equality, tail)), None),
+        })
+        rec["queries"] += n
+        rec["include"] += [c for c in ranges if c not in columns and c not in rec["include"]]
+    out = sorted(recs.values(), key=lambda r: -r["queries"])
+    for rec in out:
+        rec["share"] = round(rec["queries"] / total, 4)
+        rec["ddl"] = ddl(rec, dialect)
+    return out
+
+
+def advise(engine, counts: Optional[Counter] = None, min_share: float = 0.01) -> List[Dict[str, Any]]:
+    """Recommendations for `counts` (default: this process's recorded shapes)."""
+    with _lock:
+        counts = Counter(shapes if counts is None else counts)
+    return recommend(counts, existing_indexes(engine), min_share, engine.dialect.name)
+
+
+def create(engine, recs: List[Dict[str, Any]]) -> List[str]:
+    """Create the recommended indexes no existing index covers; returns their names."""
+    created = []
+    with engine.begin() as conn:
+        for rec in recs:
+            if rec["covered_by"] is None:
+                conn.execute(text(rec["ddl"]))
+                created.append(rec["name"])
+    return created
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("log", nargs="?", default="-", help="query log file (coursequest.queries lines), or - for stdin")
+    ap.add_argument("--min-share", type=float, default=0.01)
+    ap.add_argument("--create", action="store_true", help="create the uncovered recommendations")
+    args = ap.parse_args()
+
+    src = sys.stdin if args.log == "-" else open(args.log, encoding="utf-8")
+    with src:
+        counts = read_log(src)
+    recs = advise(engine, counts, args.min_share)
+    for rec in recs:
+        status = f"covered by {rec['covered_by']}" if rec["covered_by"] else rec["ddl"]
+        print(f"{rec['share']:7.2%}  {rec['queries']:>8}  {status}")
+    if args.create:
+        for name in create(engine, recs):
+            print(f"✅ Created {name}")
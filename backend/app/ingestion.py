@@ -0,0 +1,430 @@
+"""Shared CSV ingest engine.
+
+Used by both the `/api/ingest` endpoint and the startup auto-ingest so the
+row → `courses` mapping lives in exactly one place. Rows are parsed on the
+ingest thread, or for large files across a process pool (`parse_parallel`);
+either way one writer (`ingest_parsed`) does every database write.
+
+Every row is stored with `row_hash`, a digest of its values. In `full` mode
+all rows are written and a new catalog generation starts; in `delta` mode
+only inserted or changed rows (hash differs from the stored one) are written
+and only the cache scopes they touch are invalidated. `sync=True` also
+deletes courses missing from the source.
+"""
+import codecs
+import csv
+import hashlib
+import logging
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import chain
+from typing import Any, BinaryIO, Deque, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple, Union
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from . import catalog_index, facets, query, search, snapshot
+from .cache import bump_catalog_version, bump_scopes, data_version, delete_keys, row_key
+from .models import Course
+from .crud import bump_revision, upsert_courses
+from .parsing import COURSE_FIELDS, RowError, parse_block, parse_row, read_header, split_blocks
+from .settings import settings
+
+MAX_REPORTED_ERRORS = 100
+INGEST_MODES = ("full", "delta")
+
+
+def row_hash(row: Mapping[str, Any]) -> str:
+    """Digest of a parsed row's values; equal rows hash equally across runs."""
+    raw = "\x1f".join(repr(row[field]) for field in COURSE_FIELDS)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def iter_lines(fileobj: BinaryIO, chunk_size: int) -> Iterator[str]:
+    """Yield decoded lines from a binary file, reading `chunk_size` bytes at a time."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def new_progress() -> Dict[str, Any]:
+    return {
+        "rows": 0, "ingested": 0, "failed": 0, "errors": [], "batches": [],
+        "inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0,
+    }
+
+
+# Columns read back for change detection, facet deltas and invalidation scopes.
+_STORED = (
+    Course.course_id, Course.row_hash, Course.department, Course.level, Course.delivery_mode,
+    Course.year_offered, Course.tuition_fee_inr, Course.rating,
+)
+
+
+def _stored_rows(db: Session, course_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    rows = db.execute(select(*_STORED).where(Course.course_id.in_(course_ids))).mappings()
+    return {r["course_id"]: dict(r) for r in rows}
+
+
+def _delete_missing(db: Session, seen: Set[int], batch_size: int, report: Dict[str, Any], scopes: Set[str]):
+    stale = [dict(r) for r in db.execute(select(*_STORED)).mappings() if r["course_id"] not in seen]
+    for i in range(0, len(stale), batch_size):
+        chunk = stale[i:i + batch_size]
+        ids = [r["course_id"] for r in chunk]
+        facets.remove_rows(db, chunk)
+        db.execute(delete(Course).where(Course.course_id.in_(ids)))
+        bump_revision(db)
+        db.commit()
+        delete_keys([row_key(cid) for cid in ids])
+        for r in chunk:
+            scopes.update(query.row_scopes(r))
+        report["deleted"] += len(chunk)
+
+
+# (line number, typed row) or (line number, why it was rejected)
+Parsed = Tuple[int, Union[Dict[str, Any], RowError]]
+
+
+def parse_rows(rows: Iterable[Dict[str, Optional[str]]]) -> Iterator[Parsed]:
+    """Parse raw rows on the calling thread."""
+    # Data rows start on line 2 (line 1 is the header).
+    for line_no, row in enumerate(rows, start=2):
+        try:
+            yield line_no, parse_row(row)
+        except RowError as e:
+            yield line_no, e
+
+
+def ingest_rows(
+    db: Session,
+    rows: Iterable[Dict[str, Optional[str]]],
+    batch_size: Optional[int] = None,
+    progress: Optional[Dict[str, Any]] = None,
+    mode: str = "full",
+    sync: bool = False,
+) -> Dict[str, Any]:
+    """Parse and upsert raw CSV rows (see `ingest_parsed`)."""
+    return ingest_parsed(db, parse_rows(rows), batch_size=batch_size, progress=progress, mode=mode, sync=sync)
+
+
+def ingest_parsed(
+    db: Session,
+    parsed: Iterable[Parsed],
+    batch_size: Optional[int] = None,
+    progress: Optional[Dict[str, Any]] = None,
+    mode: str = "full",
+    sync: bool = False,
+) -> Dict[str, Any]:
+    """Upsert parsed rows in batches; the only writer for both parse paths.
+
+    Bad rows are skipped and reported as `{"line": n, "error": msg}`; at most
+    `MAX_REPORTED_ERRORS` are kept, `failed` always holds the full count.
+    `progress` (see `new_progress`) is updated in place after every batch so
+    callers on other threads can report it.
+
+    `inserted`/`updated`/`unchanged` compare each row's hash with the stored
+    one; `delta` mode writes only the first two. With `sync`, courses absent
+    from the input are deleted afterwards, unless a row failed to parse (its
+    course might be among them) or nothing was ingested. `scopes` lists the
+    invalidation scopes (`query.row_scopes`) of every changed row.
+    """
+    if mode not in INGEST_MODES:
+        raise ValueError(f"Unknown ingest mode {mode!r}")
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    report = progress if progress is not None else new_progress()
+    batch: List[Dict[str, Any]] = []
+    seen: Set[int] = set()
+    scopes: Set[str] = set()
+    facets.ensure_materialized(db)  # deltas below assume counts for the existing rows
+
+    def flush():
+        started = time.perf_counter()
+        unique = list({r["course_id"]: r for r in batch}.values())
+        for r in unique:
+            r["row_hash"] = row_hash(r)
+        stored = _stored_rows(db, [r["course_id"] for r in unique])
+        changed = [r for r in unique if stored.get(r["course_id"], {}).get("row_hash") != r["row_hash"]]
+        write = unique if mode == "full" else changed
+        written = 0
+        if write:
+            facets.apply_batch(db, write)  # reads the rows being replaced, so before the upsert
+            written = upsert_courses(db, write)
+            bump_revision(db)
+            db.commit()
+            delete_keys([row_key(r["course_id"]) for r in write])  # per-row cache (compare)
+        for r in changed:
+            scopes.update(query.row_scopes(r))
+            if r["course_id"] in stored:
+                scopes.update(query.row_scopes(stored[r["course_id"]]))
+        if sync:
+            seen.update(r["course_id"] for r in unique)
+        inserted = sum(1 for r in changed if r["course_id"] not in stored)
+        report["inserted"] += inserted
+        report["updated"] += len(changed) - inserted
+        report["unchanged"] += len(unique) - len(changed)
+        report["batches"].append({
+            "batch": len(report["batches"]) + 1,
+            "rows": len(batch),
+            "written": written,
+            "ms": round((time.perf_counter() - started) * 1000, 2),
+        })
+        report["ingested"] += len(batch)
+        batch.clear()
+
+    for line_no, row in parsed:
+        report["rows"] += 1
+        if isinstance(row, RowError):
+            report["failed"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append({"line": line_no, "error": str(row)})
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    if sync:
+        if report["failed"] or not report["ingested"]:
+            report["sync_skipped"] = "some rows failed to parse" if report["failed"] else "no rows ingested"
+        else:
+            _delete_missing(db, seen, batch_size, report, scopes)
+    report["scopes"] = sorted(scopes)
+    return report
+
+
+def ingest_file(
+    db: Session,
+    fileobj: BinaryIO,
+    batch_size: Optional[int] = None,
+    progress: Optional[Dict[str, Any]] = None,
+    mode: str = "full",
+    sync: bool = False,
+) -> Dict[str, Any]:
+    """Stream a CSV file object into the database.
+
+    Uploads of at least `INGEST_PARALLEL_MIN_BYTES` are parsed across
+    `INGEST_WORKERS` processes when that is above 1; smaller ones (and
+    unseekable streams, whose size is unknown) on the calling thread.
+    """
+    workers = settings.INGEST_WORKERS
+    size = _remaining_bytes(fileobj)
+    if workers > 1 and size is not None and size >= settings.INGEST_PARALLEL_MIN_BYTES:
+        parsed = parse_parallel(fileobj, workers)
+    else:
+        parsed = parse_rows(csv.DictReader(iter_lines(fileobj, settings.INGEST_CHUNK_SIZE)))
+    return ingest_parsed(db, parsed, batch_size=batch_size, progress=progress, mode=mode, sync=sync)
+
+
+# -----------------------
+# Parallel parsing
+# -----------------------
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def parse_pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool for `parse_block`, created on first use and kept warm.
+
+    Workers are spawned rather than forked: the server has threads (Redis
+    listener, thread pool) whose locks a fork could copy mid-use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._max_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_parse_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def _remaining_bytes(fileobj: BinaryIO) -> Optional[int]:
+    try:
+        pos = fileobj.tell()
+        end = fileobj.seek(0, 2)
+        fileobj.seek(pos)
+    except (AttributeError, OSError):
+        return None
+    return end - pos
+
+
+def parse_parallel(fileobj: BinaryIO, workers: int) -> Iterator[Parsed]:
+    """Parse a CSV file across a process pool, yielding rows in file order.
+
+    The file is read in `INGEST_BLOCK_SIZE` blocks cut at record boundaries;
+    at most two blocks per worker are in flight, so memory stays bounded
+    however far parsing runs ahead of the writer.
+    """
+    blocks = split_blocks(fileobj, settings.INGEST_BLOCK_SIZE)
+    header, rest = read_header(next(blocks, b""))
+    pool = parse_pool(workers)
+    pending: Deque[Future] = deque()
+
+    def results() -> Iterator[list]:
+        for block in chain([rest], blocks):
+            if block:
+                pending.append(pool.submit(parse_block, header, block))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    line_no = 2
+    try:
+        for result in results():
+            for item in result:
+                yield line_no, RowError(item) if isinstance(item, str) else item
+                line_no += 1
+    finally:
+        for fut in pending:  # the writer failed; drop the blocks still queued
+            fut.cancel()
+
+
+def invalidate_catalog(db: Session) -> Dict[str, int]:
+    """Start a new catalog generation after a successful ingest.
+
+    Bumping the version orphans every cached courses/count/meta/ask/facets
+    entry in O(1); in-process indexes are rebuilt against the new data.
+    Per-course `row:` entries were already dropped batch by batch.
+    """
+    previous, current = bump_catalog_version()
+    schedule_snapshot(db)
+    catalog_index.refresh(db)
+    search.refresh(db)
+    return {"previous": previous, "current": current}
+
+
+def invalidate_scopes(db: Session, scopes: List[str]) -> List[str]:
+    """After a delta ingest: invalidate only entries restricted to `scopes`
+    (plus unrestricted ones). Nothing changed, nothing is invalidated."""
+    if not scopes:
+        return []
+    bumped = bump_scopes(scopes)
+    schedule_snapshot(db)
+    catalog_index.refresh(db)
+    search.refresh(db)
+    return bumped
+
+
+# -----------------------
+# Catalog snapshot
+# -----------------------
+# Re-exporting is O(catalog), so it is not done inside the ingest request:
+# each data change (re)starts a timer, and one export runs on a background
+# thread once ingests have been quiet for CATALOG_SNAPSHOT_DELAY seconds.
+_snapshot_lock = threading.Lock()  # guards _snapshot_timer
+_snapshot_timer: Optional[threading.Timer] = None
+_snapshot_write_lock = threading.Lock()  # one export at a time
+
+
+def write_snapshot(db: Session):
+    """Re-export `CATALOG_SNAPSHOT_PATH` at the current data version, so workers
+    that start later warm-load the catalog index from it (no-op when unset)."""
+    if settings.CATALOG_SNAPSHOT_PATH:
+        with _snapshot_write_lock:
+            started = time.perf_counter()
+            manifest = snapshot.export_db(db, settings.CATALOG_SNAPSHOT_PATH, data_version())
+        logging.info(
+            f"[Ingest] Wrote snapshot of {manifest['rows']} rows to {settings.CATALOG_SNAPSHOT_PATH} "
+            f"in {(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+
+
+def _write_snapshot_in_background(bind):
+    global _snapshot_timer
+    with _snapshot_lock:
+        if _snapshot_timer is not threading.current_thread():
+            return  # superseded by a later ingest or already flushed
+        _snapshot_timer = None
+    try:
+        with Session(bind=bind) as db:
+            write_snapshot(db)
+    except Exception:
+        logging.exception(f"[Ingest] Writing snapshot {settings.CATALOG_SNAPSHOT_PATH} failed")
+
+
+def schedule_snapshot(db: Session):
+    """Debounced background `write_snapshot` on a new session bound like `db`
+    (no-op when `CATALOG_SNAPSHOT_PATH` is unset)."""
+    global _snapshot_timer
+    if not settings.CATALOG_SNAPSHOT_PATH:
+        return
+    timer = threading.Timer(settings.CATALOG_SNAPSHOT_DELAY, _write_snapshot_in_background, args=(db.get_bind(),))
+    timer.name, timer.daemon = "catalog-snapshot", True
+    with _snapshot_lock:
+        if _snapshot_timer is not None:
+            _snapshot_timer.cancel()
+        _snapshot_timer = timer
+    timer.start()
+
+
+def flush_snapshot():
+    """Write a scheduled snapshot now instead of after the delay (shutdown, tests)."""
+    global _snapshot_timer
+    with _snapshot_lock:
+        timer, _snapshot_timer = _snapshot_timer, None
+    if timer is not None:
+        timer.cancel()
+        with Session(bind=timer.args[0]) as db:
+            write_snapshot(db)
+
+
+# -----------------------
+# Background auto-ingest
+# -----------------------
+auto_ingest_status: Dict[str, Any] = {"state": "idle", "source": None}
+
+
+def _run_auto_ingest(session_factory, path: str):
+    auto_ingest_status.update(new_progress())
+    auto_ingest_status.update(state="running", source=path, started_at=time.time())
+    try:
+        with session_factory() as db:
+            if snapshot.is_snapshot(path):
+                snapshot.load(db, path, progress=auto_ingest_status)
+            else:
+                with open(path, "rb") as f:
+                    ingest_file(db, f, progress=auto_ingest_status)
+            invalidate_catalog(db)
+        auto_ingest_status["state"] = "done"
+        logging.info(
+            f"[Ingest] Auto-ingest of {path} finished: "
+            f"{auto_ingest_status['ingested']} rows, {auto_ingest_status['failed']} failed"
+        )
+    except Exception as e:
+        auto_ingest_status.update(state="failed", error=str(e))
+        logging.exception(f"[Ingest] Auto-ingest of {path} failed")
+    finally:
+        auto_ingest_status["finished_at"] = time.time()
+
+
+def start_auto_ingest(session_factory, path: str) -> threading.Thread:
+    """Run the startup ingest on a daemon thread so the app serves immediately."""
+    auto_ingest_status.update(state="running", source=path)
+    t = threading.Thread(
+        target=_run_auto_ingest, args=(session_factory, path), name="auto-ingest", daemon=True
+    )
+    t.start()
+    return t
@@ -1,12 +1,17 @@
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from .database import Base, engine, SessionLocal
-from .models import Course
-from .routers import courses, ingest, ask, admin
+from .database import Base, engine, read_engine, SessionLocal, wait_for_db
+from .routers import courses, ingest, ask, admin, health, metrics
 from .settings import settings
-from .cache import init_cache 
+from .cache import init_cache, init_async_cache
+from .ingestion import flush_snapshot, shutdown_parse_pool, start_auto_ingest
+from .search import ensure_search_indexes
+from . import facets
+from .migrations import migrate, schema_lock
+from .timing import TimingMiddleware
 import os
-Base.metadata.create_all(bind=engine)
+from functools import partial
 
 app = FastAPI(title="CourseQuest Lite API")
 
@@ -17,41 +22,49 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag"],
 )
 
-# ---- Init Cache ----
-@app.on_event("startup")
-def startup_event():
+# ---- Request timing (Server-Timing header, JSON logs, /metrics) ----
+if settings.REQUEST_TIMING:
+    app.add_middleware(TimingMiddleware)
+
+# ---- Init DB + Cache + Auto Ingest ----
+def prepare_database():
+    """Blocking startup work: connectivity probes, schema and Redis."""
+    wait_for_db(engine)
+    if read_engine is not engine:
+        wait_for_db(read_engine)
+    # Workers start together; only one at a time creates tables and migrates.
+    with schema_lock(engine):
+        Base.metadata.create_all(bind=engine)
+        migrate(engine)
+        ensure_search_indexes(engine)
     init_cache()
 
+
+@app.on_event("startup")
+async def startup_event():
+    await run_in_threadpool(prepare_database)
+    await init_async_cache()
+    # Catalogs loaded before facet counts existed get them materialized once,
+    # then the auto-ingest loads; both run in the background and /api/ready
+    # reports progress until they finish.
+    auto_ingest = None
+    if settings.AUTO_INGEST and os.path.exists(settings.AUTO_INGEST_PATH):
+        auto_ingest = partial(start_auto_ingest, SessionLocal, settings.AUTO_INGEST_PATH)
+    facets.start_materialize(SessionLocal, then=auto_ingest)
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    shutdown_parse_pool()
+    flush_snapshot()  # a change still waiting out the debounce delay
+
 # ---- Routers ----
 app.include_router(courses.router)
 app.include_router(ingest.router)
 app.include_router(ask.router)
 app.include_router(admin.router)
-
-# ---- Auto Ingest ----
-if settings.AUTO_INGEST and os.path.exists(settings.AUTO_INGEST_PATH):
-    def _auto_ingest():
-        import csv
-        with SessionLocal() as db:
-            with open(settings.AUTO_INGEST_PATH, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    c = db.query(Course).filter(Course.course_id == int(row["course_id"])).first()
-                    if not c:
-                        c = Course(
-                            course_id=int(row["course_id"]),
-                            course_name=row["course_name"],
-                            department=row["department"],
-                            level=row["level"],
-                            delivery_mode=row["delivery_mode"],
-                            credits=int(row["credits"]),
-                            duration_weeks=int(row["duration_weeks"]),
-                            rating=float(row["rating"]),
-                            tuition_fee_inr=int(row["tuition_fee_inr"]),
-                            year_offered=int(row["year_offered"]),
-                        )
-                        db.add(c)
-                db.commit()
-    _auto_ingest()
+app.include_router(health.router)
+app.include_router(metrics.router)
@@ -0,0 +1,243 @@
+"""In-process database metrics: pool activity and statement latencies.
+
+`instrument_engine` hooks SQLAlchemy pool and cursor events on an engine;
+`snapshot()` returns everything collected so far (served by
+`/api/admin/db-stats`, and in Prometheus format at `/metrics`). Counters are
+per process: with several workers each one reports its own pool.
+"""
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+# Upper bounds in milliseconds; the last bucket catches everything slower.
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+MAX_STATEMENT_LABELS = 200
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (milliseconds)."""
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms: float):
+        i = 0
+        while i < len(self.buckets) and ms > self.buckets[i]:
+            i += 1
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += ms
+            self.max = max(self.max, ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None when empty)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return float(bound)
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum, 3),
+            "max_ms": round(self.max, 3),
+            "p50_ms": self.quantile(0.5),
+            "p99_ms": self.quantile(0.99),
+            "buckets": {
+                **{f"le_{b}": n for b, n in zip(self.buckets, self.counts)},
+                "le_inf": self.counts[-1],
+            },
+        }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait = Histogram()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.wait.observe((time.perf_counter() - started) * 1000)
+
+    def recreate(self):
+        new = super().recreate()
+        new.wait = self.wait
+        return new
+
+
+# -----------------------
+# Statement labels
+# -----------------------
+_VERB_RE = re.compile(r"^\s*(\w+)", re.I)
+_TABLE_RE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+\"?(\w+)", re.I)
+
+
+def statement_label(statement: str) -> str:
+    """Low-cardinality label, e.g. `SELECT courses` or `INSERT course_facets`."""
+    verb = _VERB_RE.match(statement)
+    table = _TABLE_RE.search(statement)
+    return " ".join(p for p in (verb.group(1).upper() if verb else "?", table.group(1) if table else "") if p)
+
+
+# -----------------------
+# Per-engine collectors
+# -----------------------
+class EngineStats:
+    def __init__(self, engine):
+        self.engine = engine
+        self.checkouts = 0
+        self.connects = 0
+        self.statements: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, label: str) -> Histogram:
+        hist = self.statements.get(label)
+        if hist is None:
+            with self._lock:
+                if label not in self.statements and len(self.statements) >= MAX_STATEMENT_LABELS:
+                    label = "other"
+                hist = self.statements.setdefault(label, Histogram())
+        return hist
+
+    def snapshot(self) -> Dict[str, Any]:
+        pool = self.engine.pool
+        out: Dict[str, Any] = {
+            "class": type(pool).__name__,
+            "checkouts": self.checkouts,
+            "connects": self.connects,
+        }
+        if isinstance(pool, QueuePool):
+            out.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+            )
+        if isinstance(pool, TimedQueuePool):
+            out["wait"] = pool.wait.snapshot()
+        return {
+            "url": self.engine.url.render_as_string(hide_password=True),
+            "pool": out,
+            "statements": {k: v.snapshot() for k, v in sorted(self.statements.items())},
+        }
+
+
+_engines: Dict[str, EngineStats] = {}
+
+
+def instrument_engine(engine, name: str) -> EngineStats:
+    """Start collecting pool and statement metrics for `engine` under `name`."""
+    if name in _engines and _engines[name].engine is engine:
+        return _engines[name]
+    stats = EngineStats(engine)
+    _engines[name] = stats
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_conn, record):
+        stats.connects += 1
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_conn, record, proxy):
+        stats.checkouts += 1
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started: List[float] = conn.info.get("query_started") or []
+        if started:
+            stats.histogram(statement_label(statement)).observe((time.perf_counter() - started.pop()) * 1000)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        # No after_cursor_execute for a failed statement: drop its start time.
+        if ctx.connection is not None and ctx.connection.info.get("query_started"):
+            ctx.connection.info["query_started"].pop()
+
+    return stats
+
+
+def snapshot() -> Dict[str, Any]:
+    return {name: stats.snapshot() for name, stats in _engines.items()}
+
+
+# -----------------------
+# Prometheus exposition
+# -----------------------
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, Any]) -> str:
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+def prometheus_histogram(name: str, labels: Dict[str, str], hist: Histogram) -> List[str]:
+    """Sample lines for one histogram, converted from ms to cumulative seconds."""
+    lines, cumulative = [], 0
+    for bound, n in zip(hist.buckets, hist.counts):
+        cumulative += n
+        lines.append(f'{name}_bucket{{{_labels({**labels, "le": f"{bound / 1000:g}"})}}} {cumulative}')
+    lines.append(f'{name}_bucket{{{_labels({**labels, "le": "+Inf"})}}} {hist.count}')
+    lines.append(f"{name}_sum{{{_labels(labels)}}} {hist.sum / 1000:.6f}")
+    lines.append(f"{name}_count{{{_labels(labels)}}} {hist.count}")
+    return lines
+
+
+def prometheus_lines() -> List[str]:
+    """Pool gauges/counters and statement latencies for every instrumented engine."""
+    gauges = {
+        "checked_out": "Connections currently checked out.",
+        "overflow": "Connections above pool_size currently open.",
+        "size": "Configured pool size.",
+    }
+    lines: List[str] = []
+    for key, help_ in gauges.items():
+        lines += [f"# HELP coursequest_db_pool_{key} {help_}", f"# TYPE coursequest_db_pool_{key} gauge"]
+        for name, stats in sorted(_engines.items()):
+            pool = stats.engine.pool
+            if isinstance(pool, QueuePool):
+                value = {"checked_out": pool.checkedout, "overflow": pool.overflow, "size": pool.size}[key]()
+                lines.append(f'coursequest_db_pool_{key}{{engine="{name}"}} {value}')
+    for key in ("checkouts", "connects"):
+        lines += [f"# HELP coursequest_db_{key}_total Pool {key} since start.", f"# TYPE coursequest_db_{key}_total counter"]
+        for name, stats in sorted(_engines.items()):
+            lines.append(f'coursequest_db_{key}_total{{engine="{name}"}} {getattr(stats, key)}')
+    lines += [
+        "# HELP coursequest_db_pool_wait_seconds Time spent waiting for a pooled connection.",
+        "# TYPE coursequest_db_pool_wait_seconds histogram",
+    ]
+    for name, stats in sorted(_engines.items()):
+        if isinstance(stats.engine.pool, TimedQueuePool):
+            lines += prometheus_histogram("coursequest_db_pool_wait_seconds", {"engine": name}, stats.engine.pool.wait)
+    lines += [
+        "# HELP coursequest_db_statement_duration_seconds SQL statement latency by kind.",
+        "# TYPE coursequest_db_statement_duration_seconds histogram",
+    ]
+    for name, stats in sorted(_engines.items()):
+        for label, hist in sorted(stats.statements.items()):
+            lines += prometheus_histogram(
+                "coursequest_db_statement_duration_seconds", {"engine": name, "statement": label}, hist
+            )
+    return lines
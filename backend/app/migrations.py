@@ -0,0 +1,119 @@
+"""Schema migrations for databases created before a schema change.
+
+`Base.metadata.create_all` creates missing tables with all their indexes but
+never alters a table that already exists. Each migration here runs once per
+database, in order, and is recorded in `schema_migrations`. Migrations must be
+idempotent: on a fresh database create_all has already done the work.
+
+Every API worker runs them at startup. On Postgres the workers serialize on an
+advisory lock (`schema_lock`); a migration another worker finished meanwhile
+is skipped, and recording it again is a no-op.
+
+    cd backend && python -m app.migrations
+"""
+from contextlib import contextmanager
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, insert, select, text
+from sqlalchemy.engine import Connection
+
+from .models import Course, SchemaMigration
+
+
+def _create_indexes(conn: Connection, *names: str):
+    for ix in Course.__table__.indexes:
+        if ix.name in names:
+            ix.create(conn, checkfirst=True)
+
+
+def _drop_indexes(conn: Connection, *names: str):
+    for name in names:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def _0001_sort_indexes(conn: Connection):
+    # Equality filters + default sort in one index. ix_courses_fee_rating had
+    # the wrong column order and direction for the default sort; the old
+    # department/level/mode index is a prefix of the new one.
+    _create_indexes(
+        conn,
+        "ix_courses_dept_level_mode_sort", "ix_courses_dept_sort", "ix_courses_level_sort", "ix_courses_mode_sort",
+    )
+    _drop_indexes(conn, "ix_courses_fee_rating", "ix_courses_dept_level_mode")
+
+
+def _0002_row_hash(conn: Connection):
+    # NULL until a row is next ingested; delta ingest treats it as changed.
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TABLE courses ADD COLUMN IF NOT EXISTS row_hash VARCHAR(32)"))
+    elif "row_hash" not in {c["name"] for c in inspect(conn).get_columns("courses")}:
+        conn.execute(text("ALTER TABLE courses ADD COLUMN row_hash VARCHAR(32)"))
+
+
+MIGRATIONS: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("0001_sort_indexes", _0001_sort_indexes),
+    ("0002_row_hash", _0002_row_hash),
+]
+
+
+# Arbitrary application-wide key for pg_advisory_lock.
+SCHEMA_LOCK_KEY = 0x436F7572
+
+
+@contextmanager
+def schema_lock(engine):
+    """Hold the schema advisory lock (Postgres; a no-op elsewhere) so that
+    workers starting together run create_all and migrations one at a time."""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        conn.commit()  # session-level lock: held until unlocked, not just for this transaction
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_LOCK_KEY})
+            conn.commit()
+
+
+def _record(conn: Connection, id_: str) -> bool:
+    """Record `id_` as applied; False when another process already did."""
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif conn.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return bool(conn.execute(insert(SchemaMigration).values(id=id_)).rowcount)
+    stmt = dialect_insert(SchemaMigration).values(id=id_).on_conflict_do_nothing(index_elements=["id"])
+    return bool(conn.execute(stmt).rowcount)
+
+
+def migrate(engine) -> List[str]:
+    """Apply pending migrations (each in its own transaction); returns their ids.
+
+    Call under `schema_lock` when several processes may start at once.
+    """
+    SchemaMigration.__table__.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        applied = set(conn.scalars(select(SchemaMigration.id)))
+    done = []
+    for id_, run in MIGRATIONS:
+        if id_ in applied:
+            continue
+        with engine.begin() as conn:
+            run(conn)
+            if not _record(conn, id_):
+                continue
+        print(f"✅ Applied migration {id_}")
+        done.append(id_)
+    return done
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    with schema_lock(engine):
+        done = migrate(engine)
+    if not done:
+        print("✅ Schema up to date")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Index
+from sqlalchemy import Column, DateTime, Integer, String, Float, Index, func
 from .database import Base
 
 class Course(Base):
@@ -14,6 +14,41 @@ class Course(Base):
     rating = Column(Float, index=True, nullable=False)
     tuition_fee_inr = Column(Integer, index=True, nullable=False)
     year_offered = Column(Integer, index=True, nullable=False)
+    row_hash = Column(String(32), nullable=True)  # ingestion.row_hash of the source row (delta ingest)
 
-Index("ix_courses_dept_level_mode", Course.department, Course.level, Course.delivery_mode)
-Index("ix_courses_fee_rating", Course.tuition_fee_inr, Course.rating)
+class CourseFacet(Base):
+    """Materialized catalog-wide facet counts (maintained by app/facets.py)."""
+    __tablename__ = "course_facets"
+    facet = Column(String(32), primary_key=True)
+    value = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False)
+
+# Matches crud.DEFAULT_ORDER so keyset pages are an index range scan.
+Index("ix_courses_rating_fee_id", Course.rating.desc(), Course.tuition_fee_inr, Course.id)
+
+# Equality filters followed by the default sort: a filtered page is read in
+# order from the index (no sort node), and the Postgres INCLUDE columns let
+# counts over any non-text filter combination run as index-only scans.
+# Existing databases get these through app/migrations.py.
+SORT_COLUMNS = (Course.rating.desc(), Course.tuition_fee_inr, Course.id)
+Index(
+    "ix_courses_dept_level_mode_sort",
+    Course.department, Course.level, Course.delivery_mode, *SORT_COLUMNS,
+    postgresql_include=["credits", "duration_weeks", "year_offered"],
+)
+Index("ix_courses_dept_sort", Course.department, *SORT_COLUMNS)
+Index("ix_courses_level_sort", Course.level, *SORT_COLUMNS)
+Index("ix_courses_mode_sort", Course.delivery_mode, *SORT_COLUMNS)
+
+class CatalogRevision(Base):
+    """Single row (id 1) bumped in the same transaction as every ingest write
+    to `courses`, so a snapshot can tell whether it still matches the table."""
+    __tablename__ = "catalog_revision"
+    id = Column(Integer, primary_key=True)
+    revision = Column(Integer, nullable=False)
+
+class SchemaMigration(Base):
+    """Migrations applied to this database (see app/migrations.py)."""
+    __tablename__ = "schema_migrations"
+    id = Column(String(100), primary_key=True)
+    applied_at = Column(DateTime, nullable=False, server_default=func.now())
@@ -0,0 +1,112 @@
+"""CSV row parsing and validation, shared by the serial and parallel ingest paths.
+
+This module imports nothing from the app beyond the standard library, so
+process-pool workers (see `ingestion.parse_pool`) start quickly and never
+touch the database or cache clients.
+
+Large uploads are cut by `split_blocks` into blocks of whole CSV records and
+each block is parsed by `parse_block` in a worker process; the results come
+back in file order and feed the single writer in `ingestion.ingest_rows`.
+"""
+import csv
+import io
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+# CSV column → converter. Order matches sample_data/courses.csv.
+COURSE_FIELDS: Dict[str, Callable[[str], Any]] = {
+    "course_id": int,
+    "course_name": str,
+    "department": str,
+    "level": str,
+    "delivery_mode": str,
+    "credits": int,
+    "duration_weeks": int,
+    "rating": float,
+    "tuition_fee_inr": int,
+    "year_offered": int,
+}
+
+
+class RowError(ValueError):
+    """Raised by `parse_row` when a CSV row cannot be converted."""
+
+
+def parse_row(row: Dict[str, Optional[str]]) -> Dict[str, Any]:
+    """Convert one raw CSV row into typed `Course` column values."""
+    out: Dict[str, Any] = {}
+    for field, conv in COURSE_FIELDS.items():
+        raw = (row.get(field) or "").strip()
+        if not raw:
+            raise RowError(f"missing value for '{field}'")
+        try:
+            out[field] = conv(raw)
+        except ValueError:
+            raise RowError(f"invalid {conv.__name__} for '{field}': {raw!r}")
+    return out
+
+
+# -----------------------
+# Blocks of whole records
+# -----------------------
+def _record_end(buf: bytes) -> int:
+    """Offset just past the last newline in `buf` that ends a record, or 0.
+
+    `buf` starts at a record boundary, so a newline ends a record when an even
+    number of quote characters precede it (RFC 4180 escapes `"` as `""`);
+    newlines inside quoted fields are skipped.
+    """
+    quotes = buf.count(b'"')
+    end = len(buf)
+    while True:
+        nl = buf.rfind(b"\n", 0, end)
+        if nl < 0:
+            return 0
+        quotes -= buf.count(b'"', nl, end)
+        if quotes % 2 == 0:
+            return nl + 1
+        end = nl
+
+
+def split_blocks(fileobj: BinaryIO, block_size: int) -> Iterator[bytes]:
+    """Yield consecutive byte blocks of about `block_size`, each ending on a record boundary."""
+    pending = b""
+    while True:
+        chunk = fileobj.read(block_size)
+        if not chunk:
+            break
+        pending += chunk
+        cut = _record_end(pending)
+        if cut:
+            yield pending[:cut]
+            pending = pending[cut:]
+    if pending:
+        yield pending
+
+
+def read_header(block: bytes) -> Tuple[List[str], bytes]:
+    """Column names from the first block (BOM stripped) and the rest of the block."""
+    line, _, rest = block.partition(b"\n")
+    header = next(csv.reader([line.decode("utf-8-sig")]), [])
+    return header, rest
+
+
+# Per record: the parsed row, or the RowError message. Dicts cost the
+# receiving process less to unpickle than tuples it would have to zip back up.
+BlockResult = List[Union[Dict[str, Any], str]]
+
+
+def parse_block(header: List[str], block: bytes) -> BlockResult:
+    """Parse and validate one block (runs in a worker process).
+
+    Blank lines are skipped and short rows read as missing values, as with
+    `csv.DictReader`, so results match the serial path record for record.
+    """
+    out: BlockResult = []
+    for values in csv.reader(io.StringIO(block.decode("utf-8"))):
+        if not values:
+            continue
+        try:
+            out.append(parse_row(dict(zip(header, values))))
+        except RowError as e:
+            out.append(str(e))
+    return out
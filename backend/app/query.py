@@ -0,0 +1,107 @@
+"""Canonical form of a course query, used for every cache key.
+
+`canonical(params)` keeps only the filters that change the result, typed the
+way `crud.apply_filters` reads them: falsy values (which it ignores) and the
+default sort are dropped, numbers become int/float and `q` is lowercased
+(every search backend matches case-insensitively). `key(params)` is its
+compact JSON, so `/api/ask` questions that parse to the same filters, or
+`/api/courses` URLs that differ only in empty parameters, share one entry.
+`scope(params)` picks the invalidation scope that goes into the key's version.
+
+Per-canonical-query hit/miss counts are kept in `stats` and served by
+`/api/admin/query-stats`.
+"""
+import json
+import threading
+from typing import Any, Callable, Dict, List, Mapping, Tuple
+
+from .cache import ANY_SCOPE
+
+FIELDS: Dict[str, Callable[[Any], Any]] = {
+    "department": str,
+    "level": str,
+    "delivery_mode": str,
+    "q": lambda v: str(v).lower(),
+    "min_rating": float,
+    "max_fee": int,
+    "min_credits": int,
+    "max_credits": int,
+    "min_duration_weeks": int,
+    "max_duration_weeks": int,
+    "year": int,
+}
+
+
+def canonical(params: Dict[str, Any], include_sort: bool = True) -> Dict[str, Any]:
+    """Normalized, typed filters in a fixed key order; unknown keys are dropped."""
+    out = {name: conv(params[name]) for name, conv in FIELDS.items() if params.get(name)}
+    # Relevance only reorders when there is a query to rank by.
+    if include_sort and params.get("sort") == "relevance" and out.get("q"):
+        out["sort"] = "relevance"
+    return out
+
+
+def key(params: Dict[str, Any], include_sort: bool = True) -> str:
+    return json.dumps(canonical(params, include_sort), sort_keys=True, separators=(",", ":"))
+
+
+# -----------------------
+# Invalidation scopes
+# -----------------------
+SCOPE_FIELDS = ("department", "delivery_mode", "level")  # most selective first
+
+
+def scope(params: Dict[str, Any]) -> str:
+    """The one scope a query's result depends on (see `cache.bump_scopes`).
+
+    A row can only affect a query restricted to `department=CS` if it is (or
+    was) in CS, so that scope's counter is enough; unrestricted queries depend
+    on every change.
+    """
+    for field in SCOPE_FIELDS:
+        if value := params.get(field):
+            return f"{field}={value}"
+    return ANY_SCOPE
+
+
+def row_scopes(row: Mapping[str, Any]) -> List[str]:
+    """Scopes a change to `row` invalidates."""
+    return [f"{field}={row[field]}" for field in SCOPE_FIELDS]
+
+
+# -----------------------
+# Per-query hit ratios
+# -----------------------
+MAX_TRACKED = 1000  # distinct (namespace, query) pairs; the rest are counted as "other"
+
+
+class QueryStats:
+    def __init__(self, max_tracked: int = MAX_TRACKED):
+        self.max_tracked = max_tracked
+        self.counts: Dict[Tuple[str, str], List[int]] = {}  # -> [hits, misses]
+        self._lock = threading.Lock()
+
+    def record(self, namespace: str, query_key: str, hit: bool):
+        with self._lock:
+            counts = self.counts.get((namespace, query_key))
+            if counts is None:
+                if len(self.counts) >= self.max_tracked:
+                    query_key = "other"
+                counts = self.counts.setdefault((namespace, query_key), [0, 0])
+            counts[0 if hit else 1] += 1
+
+    def top(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most requested canonical queries first."""
+        with self._lock:
+            items = sorted(self.counts.items(), key=lambda kv: -(kv[1][0] + kv[1][1]))[:limit]
+        return [
+            {"namespace": ns, "query": q, "hits": h, "misses": m, "hit_ratio": round(h / (h + m), 4)}
+            for (ns, q), (h, m) in items
+        ]
+
+    def clear(self):
+        with self._lock:
+            self.counts.clear()
+
+
+stats = QueryStats()
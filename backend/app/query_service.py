@@ -0,0 +1,227 @@
+"""Cache-aware read queries that produce finished JSON response bodies.
+
+Each function owns exactly one cache entry per request shape and stores the
+serialized body bytes. Computations passed to `get_or_compute` open their
+own session (`own_session`): they can be shared by concurrent requests or
+run as a background refresh after the originating request has finished. A hit is returned to the client as-is through a raw
+`Response`: no `json.loads`, no ORM objects, no Pydantic validation. On a miss
+the crud layer returns plain row dicts which are encoded once.
+"""
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from . import crud, facets as facets_, query, timing
+from .cache import (
+    adata_version, aget_cache_bytes, aget_many_bytes, ascoped_version, aset_cache, aset_many, get_or_compute, row_key,
+    vkey,
+)
+from .database import own_session, run_db
+from .settings import settings
+from .utils import nl_parser
+
+COURSES_TTL = 60
+ROW_TTL = 300
+META_TTL = 300
+FACETS_TTL = 120
+ASK_TTL = 120
+ASK_PAGE_SIZE = 10
+
+
+def dumps(obj: Any) -> bytes:
+    with timing.span("serialize"):
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+async def _cached(namespace: str, query_key: str, key: str, compute, ttl: int) -> bytes:
+    """`get_or_compute`, counting a hit for `query_key` unless this request computed."""
+    computed = False
+
+    async def run():
+        nonlocal computed
+        computed = True
+        return await compute()
+
+    body = await get_or_compute(key, run, ttl=ttl)
+    query.stats.record(namespace, query_key, hit=not computed)
+    return body
+
+
+async def _with_facets(db: Session, body: Dict[str, Any], params: Dict[str, Any], include: bool) -> Dict[str, Any]:
+    if include:
+        body["facets"] = await run_db(db, facets_.facets, params)
+    return body
+
+
+async def courses_page(
+    db: Session, params: Dict[str, Any], page: int, page_size: int, include_facets: bool = False
+) -> bytes:
+    params = query.canonical(params)
+    query_key = query.key(params)
+    version = await ascoped_version(query.scope(params))
+    key = vkey("courses", version, f"p{page}:s{page_size}:f{int(include_facets)}:{query_key}")
+
+    async def compute():
+        async with own_session(db) as session:
+            items, total, exact = await run_db(session, crud.list_courses_counted, params, page, page_size)
+            # An estimated total can undershoot, so a full page also means "maybe more".
+            more = page * page_size < total if exact else len(items) == page_size
+            return dumps(await _with_facets(session, {
+                "items": items,
+                "total": total,
+                "total_exact": exact,
+                "page": page,
+                "page_size": page_size,
+                # Lets offset clients switch to constant-time keyset paging from here on.
+                "next_cursor": crud.encode_cursor(items[-1]) if items and more else None,
+            }, params, include_facets))
+
+    return await _cached("courses", query_key, key, compute, COURSES_TTL)
+
+
+async def courses_keyset(
+    db: Session,
+    params: Dict[str, Any],
+    cursor: str,
+    after: Optional[crud.Cursor],
+    page_size: int,
+    include_total: bool,
+    include_facets: bool = False,
+) -> bytes:
+    params = query.canonical(params)
+    query_key = query.key(params)
+    version = await ascoped_version(query.scope(params))
+    key = vkey(
+        "courses", version,
+        f"c{cursor}:s{page_size}:t{int(include_total)}:f{int(include_facets)}:{query_key}",
+    )
+
+    async def compute():
+        async with own_session(db) as session:
+            items, next_cursor = await run_db(session, crud.list_courses_after, params, after, page_size)
+            total, exact = await run_db(session, crud.total_courses, params) if include_total else (None, None)
+            return dumps(await _with_facets(session, {
+                "items": items,
+                "total": total,
+                "total_exact": exact,
+                "page": None,
+                "page_size": page_size,
+                "next_cursor": next_cursor,
+            }, params, include_facets))
+
+    return await _cached("courses", query_key, key, compute, COURSES_TTL)
+
+
+async def compare(db: Session, ids: List[int]) -> bytes:
+    """Courses by `course_id`, in request order, from the per-row cache.
+
+    Cached rows come from one multi-get; only the missing ids are queried
+    (one IN query) and written back in one pipeline. Unknown ids are omitted.
+    """
+    ids = list(dict.fromkeys(ids))
+    keys = [row_key(i) for i in ids]
+    with timing.span("cache"):
+        rows = await aget_many_bytes(keys, local_ttl=ROW_TTL)
+    for k in keys:
+        timing.cache_result(k, k in rows)
+    missing = [i for i, k in zip(ids, keys) if k not in rows]
+    if missing:
+        fresh = {row_key(r["course_id"]): dumps(r) for r in await run_db(db, crud.compare_courses, missing)}
+        await aset_many(fresh, ttl=ROW_TTL)
+        rows.update(fresh)
+    return b"[" + b",".join(rows[k] for k in keys if k in rows) + b"]"
+
+
+async def meta(db: Session) -> bytes:
+    version = await adata_version()
+
+    async def compute():
+        async with own_session(db) as session:
+            return dumps(await run_db(session, crud.meta))
+
+    return await get_or_compute(vkey("meta", version), compute, ttl=META_TTL)
+
+
+async def facets(db: Session, params: Dict[str, Any]) -> bytes:
+    params = query.canonical(params, include_sort=False)
+    query_key = query.key(params)
+    version = await ascoped_version(query.scope(params))
+
+    async def compute():
+        async with own_session(db) as session:
+            return dumps(await run_db(session, facets_.facets, params))
+
+    return await _cached("facets", query_key, vkey("facets", version, query_key), compute, FACETS_TTL)
+
+
+async def _ensure_vocabulary(db: Session, version: str):
+    if nl_parser.vocabulary_version != version:
+        # Recognise the departments/levels/modes that exist in this catalog generation.
+        nl_parser.set_vocabulary(await run_db(db, crud.meta), version)
+
+
+def _ask_body(filters: Dict[str, Any], items: List[Dict[str, Any]], total: int, exact: bool = True) -> bytes:
+    return dumps({
+        "parsed_filters": filters,
+        "results": {
+            "items": items, "total": total, "total_exact": exact,
+            "page": 1, "page_size": ASK_PAGE_SIZE, "next_cursor": None,
+        },
+        "message": "No matching courses found." if total == 0 else None,
+    })
+
+
+async def _parse(db: Session, data_version: str, question: str) -> Dict[str, Any]:
+    await _ensure_vocabulary(db, data_version)
+    return query.canonical(nl_parser.parse_question(question))
+
+
+async def ask(db: Session, question: str) -> bytes:
+    """Answer a question, cached on its canonical filters: differently worded
+    questions that parse alike share one entry."""
+    filters = await _parse(db, await adata_version(), question)
+    query_key = query.key(filters)
+    version = await ascoped_version(query.scope(filters))
+
+    async def compute():
+        async with own_session(db) as session:
+            return _ask_body(filters, *await run_db(session, crud.list_courses_counted, filters, 1, ASK_PAGE_SIZE))
+
+    return await _cached("ask", query_key, vkey("ask", version, query_key), compute, ASK_TTL)
+
+
+async def ask_batch(db: Session, questions: List[str]) -> bytes:
+    """Answer several questions at once; the body lists them in input order.
+
+    Entries are shared with `ask`. Questions are parsed and collapsed to
+    distinct filter sets; the uncached ones are answered with one
+    `crud.list_courses_many` query.
+    """
+    data_version = await adata_version()
+    filters = [await _parse(db, data_version, q) for q in questions]
+    query_keys = [query.key(f) for f in filters]
+    keys = [vkey("ask", await ascoped_version(query.scope(f)), k) for f, k in zip(filters, query_keys)]
+    filters_for = dict(zip(keys, filters))
+    distinct = list(dict.fromkeys(keys))
+    with timing.span("cache"):
+        bodies = dict(zip(distinct, await asyncio.gather(*(aget_cache_bytes(k) for k in distinct))))
+    hits = {k for k, body in bodies.items() if body is not None}
+    for k, query_key in dict(zip(keys, query_keys)).items():
+        timing.cache_result(k, k in hits)
+        query.stats.record("ask", query_key, hit=k in hits)
+
+    missing = [k for k in distinct if k not in hits]
+    if missing:
+        results = await run_db(db, crud.list_courses_many, [filters_for[k] for k in missing], ASK_PAGE_SIZE)
+        for k, result in zip(missing, results):
+            bodies[k] = _ask_body(filters_for[k], *result)
+        # Same lifetime as `get_or_compute` entries, so `ask` can serve them stale.
+        await asyncio.gather(*(aset_cache(k, bodies[k], ASK_TTL + settings.CACHE_STALE_TTL) for k in missing))
+
+    items = [
+        b'{"question":%s,"cached":%s,"response":%s}' % (dumps(q), b"true" if k in hits else b"false", bodies[k])
+        for q, k in zip(questions, keys)
+    ]
+    return b'{"items":[' + b",".join(items) + b"]}"
@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Header, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy.orm import Session
 from ..settings import settings
-from ..cache import clear_cache_prefix
-from typing import Optional
+from ..cache import clear_cache_prefix, bump_catalog_version
+from ..database import get_db
+from .. import crud, index_advisor, metrics, query
+from .courses import filter_params
+from typing import Any, Dict, Literal, Optional
 router = APIRouter(prefix="/api")
 
 @router.post("/cache/clear")
@@ -10,8 +14,11 @@ def clear_cache(
     x_admin_token: Optional[str] = Header(default=None),
 ):
     """Clear Redis or in-memory cache. 
-    - If `prefix` is given, clears only keys with that prefix.
-    - Otherwise clears common prefixes (courses, meta, ask, compare)."""
+    - If `prefix` is given, clears only keys with that prefix (SCAN + delete).
+    - Otherwise starts a new catalog generation, which invalidates every
+      catalog-derived namespace (courses, count, meta, ask, facets) in O(1).
+      Per-course `row:` entries (compare) are invalidated by ingest; clear
+      them explicitly with prefix=row:."""
 
     if x_admin_token != settings.INGEST_TOKEN:
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -20,7 +27,60 @@ def clear_cache(
         cleared = clear_cache_prefix(prefix)
         return {"status": "ok", "cleared": prefix, "keys": cleared}
 
-    cleared_all = []
-    for p in ["courses:", "meta", "ask:", "compare:"]:
-        cleared_all.append({p: clear_cache_prefix(p)})
-    return {"status": "ok", "cleared": cleared_all}
+    previous, current = bump_catalog_version()
+    return {"status": "ok", "generation": current, "previous_generation": previous}
+
+
+@router.get("/admin/db-stats")
+def db_stats(x_admin_token: Optional[str] = Header(default=None)):
+    """Connection pool state and SQL latency histograms for this worker.
+
+    Per engine (primary, replica, async): pool size, checked-out and overflow
+    connections, total checkouts/connects, checkout wait times (Postgres
+    pools) and a latency histogram per statement kind (e.g. `SELECT courses`).
+    """
+    if x_admin_token != settings.INGEST_TOKEN:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return {"engines": metrics.snapshot()}
+
+
+@router.get("/admin/query-stats")
+def query_stats(
+    limit: int = Query(50, ge=1, le=1000),
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """Cache hits/misses per canonical query (courses, facets, ask) for this
+    worker, most requested first."""
+    if x_admin_token != settings.INGEST_TOKEN:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return {"queries": query.stats.top(limit)}
+
+
+@router.get("/admin/index-advice")
+def index_advice(
+    min_share: float = Query(0.01, ge=0, le=1),
+    x_admin_token: Optional[str] = Header(default=None),
+    db: Session = Depends(get_db),
+):
+    """Index recommendations from the filter shapes this worker has served
+    from the database since start (needs `QUERY_LOG=1`)."""
+    if x_admin_token != settings.INGEST_TOKEN:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    recs = index_advisor.advise(db.get_bind(), min_share=min_share)
+    return {"queries": sum(index_advisor.shapes.values()), "recommendations": recs}
+
+
+@router.get("/admin/explain")
+def explain(
+    filters: Dict[str, Any] = Depends(filter_params),
+    sort: Literal["default", "relevance"] = "default",
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=100),
+    x_admin_token: Optional[str] = Header(default=None),
+    db: Session = Depends(get_db),
+):
+    """Query plan of the `/api/courses` page query for these filters."""
+    if x_admin_token != settings.INGEST_TOKEN:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    params = {**filters, "sort": None if sort == "default" else sort}
+    return {"params": params, "plan": crud.explain_courses(db, params, page, page_size)}
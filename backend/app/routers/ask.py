@@ -1,35 +1,18 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy.orm import Session
-from typing import Dict, Any
-import json
 
-from ..database import get_db
-from ..schemas import AskRequest, AskResponse, CoursesResponse
-from ..crud import list_courses
-from ..utils.nl_parser import parse_question
-from ..cache import get_cache, set_cache
+from ..database import get_session
+from ..schemas import AskRequest, AskResponse, AskBatchRequest, AskBatchResponse
+from .. import query_service
 
 router = APIRouter(prefix="/api")
 
 @router.post("/ask", response_model=AskResponse)
-def ask(req: AskRequest, db: Session = Depends(get_db)):
-    # ---- Cache key
-    cache_key = f"ask:{req.question.strip().lower()}"
-    cached = get_cache(cache_key)
-    if cached:
-        return json.loads(cached)
+async def ask(req: AskRequest, db: Session = Depends(get_session)):
+    body = await query_service.ask(db, req.question)
+    return Response(content=body, media_type="application/json")
 
-    filters: Dict[str, Any] = parse_question(req.question)
-    items, total = list_courses(db, filters, page=1, page_size=10)
-    message = None
-    if total == 0:
-        message = "No matching courses found."
-
-    result = AskResponse(
-        parsed_filters=filters,
-        results=CoursesResponse(items=items, total=total, page=1, page_size=10),
-        message=message
-    ).dict()
-
-    set_cache(cache_key, json.dumps(result), ttl=120)  
-    return result
+@router.post("/ask/batch", response_model=AskBatchResponse)
+async def ask_batch(req: AskBatchRequest, db: Session = Depends(get_session)):
+    body = await query_service.ask_batch(db, req.questions)
+    return Response(content=body, media_type="application/json")
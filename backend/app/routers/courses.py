@@ -1,19 +1,24 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
-import json
+from typing import List, Optional, Dict, Any, Literal
 
-from ..database import get_db
-from ..schemas import CoursesResponse, CourseOut
-from ..crud import list_courses, compare_courses, meta, serialize_course
-from ..cache import get_cache, set_cache
+from ..database import get_read_db, get_session
+from ..schemas import CoursesResponse, CourseOut, FacetsResponse
+from ..crud import decode_cursor
+from .. import export, http_cache, query_service
 
 router = APIRouter(prefix="/api")
 
-@router.get("/courses", response_model=CoursesResponse)
-def get_courses(
-    page: int = Query(1, ge=1),
-    page_size: int = Query(10, ge=1, le=100),
+# Handlers return the cached, pre-serialized JSON body directly. Caching goes
+# through `get_or_compute`: concurrent misses for one key share a single query,
+# and stale entries are refreshed in the background. Those computations open
+# their own session (`database.own_session`); the request's session is closed
+# by its dependency when the handler returns. `http_cache.cached_json`
+# answers revalidations with 304 before any of that and compresses bodies.
+
+
+async def filter_params(
     department: Optional[str] = None,
     level: Optional[str] = None,
     delivery_mode: Optional[str] = None,
@@ -25,9 +30,9 @@ def get_courses(
     max_duration_weeks: Optional[int] = None,
     year: Optional[int] = None,
     q: Optional[str] = None,
-    db: Session = Depends(get_db),
-):
-    params: Dict[str, Any] = {
+) -> Dict[str, Any]:
+    """Listing filters shared by /courses and /facets (async: no threadpool hop)."""
+    return {
         "department": department,
         "level": level,
         "delivery_mode": delivery_mode,
@@ -41,52 +46,77 @@ def get_courses(
         "q": q,
     }
 
-    cache_key = f"courses:{page}:{page_size}:{json.dumps(params, sort_keys=True)}"
-    cached = get_cache(cache_key)
-    if cached:
-        return json.loads(cached)
-
-    items, total = list_courses(db, params, page, page_size)
-    result = {
-        "items": [serialize_course(i) for i in items],  # ✅ dicts, not models
-        "total": total,
-        "page": page,
-        "page_size": page_size,
-    }
 
-    set_cache(cache_key, json.dumps(result), ttl=60)
-    return result
+@router.get("/courses", response_model=CoursesResponse)
+async def get_courses(
+    request: Request,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=100),
+    filters: Dict[str, Any] = Depends(filter_params),
+    sort: Literal["default", "relevance"] = "default",
+    cursor: Optional[str] = Query(None, description="Keyset cursor from `next_cursor`; pass empty to start"),
+    include_total: bool = Query(False, description="Cursor mode only: also return the (cached) total"),
+    include_facets: bool = Query(False, description="Also return facet counts for the filters"),
+    db: Session = Depends(get_session),
+):
+    params: Dict[str, Any] = {**filters, "sort": None if sort == "default" else sort}
+
+    if cursor is not None:
+        if params["sort"]:
+            raise HTTPException(status_code=400, detail="Cursor pagination only supports the default sort")
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return await http_cache.cached_json(request, lambda: query_service.courses_keyset(
+            db, params, cursor, after, page_size, include_total, include_facets
+        ))
+
+    return await http_cache.cached_json(
+        request, lambda: query_service.courses_page(db, params, page, page_size, include_facets)
+    )
+
+
+@router.get("/courses/export")
+def export_courses(
+    request: Request,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    filters: Dict[str, Any] = Depends(filter_params),
+    sort: Literal["default", "relevance"] = "default",
+    db: Session = Depends(get_read_db),
+):
+    """Every course matching the filters, streamed as NDJSON or CSV in listing
+    order (gzip/brotli on the fly per `Accept-Encoding`)."""
+    params: Dict[str, Any] = {**filters, "sort": None if sort == "default" else sort}
+    body = export.stream(db, params, format)
+    headers = {"Content-Disposition": f'attachment; filename="courses.{format}"', "Vary": "Accept-Encoding"}
+    if encoding := http_cache.negotiate(request.headers.get("accept-encoding")):
+        body = http_cache.compress_stream(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(body, media_type=export.MEDIA_TYPES[format], headers=headers)
+
+
+@router.get("/facets", response_model=FacetsResponse)
+async def get_facets(
+    request: Request,
+    filters: Dict[str, Any] = Depends(filter_params),
+    db: Session = Depends(get_session),
+):
+    return await http_cache.cached_json(request, lambda: query_service.facets(db, filters))
 
 
 @router.get("/compare", response_model=List[CourseOut])
-def compare(ids: str, db: Session = Depends(get_db)):
+async def compare(request: Request, ids: str, db: Session = Depends(get_session)):
     try:
         id_list = [int(x) for x in ids.split(",") if x.strip()]
     except:
         id_list = []
 
-    cache_key = f"compare:{','.join(map(str, sorted(id_list)))}"
-    cached = get_cache(cache_key)
-    if cached:
-        return json.loads(cached)
-
-    # 🔑 FIX: query using course_id instead of id
-    from ..models import Course
-    items = db.query(Course).filter(Course.course_id.in_(id_list)).all()
-
-    result = [serialize_course(i) for i in items]
-    set_cache(cache_key, json.dumps(result), ttl=60)
-    return result
+    # 🔑 FIX: compare by course_id instead of id
+    return await http_cache.cached_json(request, lambda: query_service.compare(db, id_list))
 
 
 
 @router.get("/meta")
-def get_meta(db: Session = Depends(get_db)):
-    cache_key = "meta"
-    cached = get_cache(cache_key)
-    if cached:
-        return json.loads(cached)
-
-    result = meta(db)
-    set_cache(cache_key, json.dumps(result), ttl=300)
-    return result
+async def get_meta(request: Request, db: Session = Depends(get_session)):
+    return await http_cache.cached_json(request, lambda: query_service.meta(db))
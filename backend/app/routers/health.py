@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Response
+from ..facets import materialize_status
+from ..ingestion import auto_ingest_status
+router = APIRouter(prefix="/api")
+
+@router.get("/ready")
+def ready(response: Response):
+    """Readiness probe. Returns 503 while facet counts are being materialized
+    or the startup auto-ingest is still loading."""
+    loading = "running" in (auto_ingest_status["state"], materialize_status["state"])
+    if loading:
+        response.status_code = 503
+    return {
+        "ready": not loading,
+        "auto_ingest": {k: v for k, v in auto_ingest_status.items() if k != "batches"},
+        "facets": dict(materialize_status),
+    }
@@ -1,59 +1,42 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Header, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-import csv, io
-from typing import Optional
+from typing import Literal, Optional
 from ..database import get_db
-from ..models import Course
 from ..settings import settings
-from ..cache import clear_cache_prefix  
+from ..ingestion import ingest_file, invalidate_catalog, invalidate_scopes
 router = APIRouter(prefix="/api")
 
 @router.post("/ingest")
 async def ingest_csv(
     file: UploadFile = File(...),
+    mode: Literal["full", "delta"] = Query("full", description="delta: write only new/changed rows"),
+    sync: bool = Query(False, description="Also delete courses missing from the file"),
     x_ingest_token:  Optional[str] = Header(default=None),
     db: Session = Depends(get_db),
 ):
     if x_ingest_token != settings.INGEST_TOKEN:
         raise HTTPException(status_code=401, detail="Invalid ingest token")
 
-    content = await file.read()
-    reader = csv.DictReader(io.StringIO(content.decode("utf-8")))
-    count = 0
+    # Parsing + DB writes are blocking; keep them off the event loop.
+    report = await run_in_threadpool(ingest_file, db, file.file, mode=mode, sync=sync)
 
-    for row in reader:
-        course = Course(
-            course_id=int(row["course_id"]),
-            course_name=row["course_name"],
-            department=row["department"],
-            level=row["level"],
-            delivery_mode=row["delivery_mode"],
-            credits=int(row["credits"]),
-            duration_weeks=int(row["duration_weeks"]),
-            rating=float(row["rating"]),
-            tuition_fee_inr=int(row["tuition_fee_inr"]),
-            year_offered=int(row["year_offered"]),
-        )
-
-        # ⚡ Upsert by course_id
-        existing = db.query(Course).filter(Course.course_id == course.course_id).first()
-        if existing:
-            for k, v in course.__dict__.items():
-                if k not in ["_sa_instance_state", "id"]:
-                    setattr(existing, k, v)
-        else:
-            db.add(course)
-
-        count += 1
-
-    db.commit()
-
-    #  Invalidate all relevant cache namespaces
-    clear_cache_prefix("courses:")
-    clear_cache_prefix("meta")
-
-    return {
+    result = {
         "status": "ok",
-        "ingested": count,
-        "cache_cleared": ["courses:*", "meta"],
+        "mode": mode,
+        "ingested": report["ingested"],
+        "failed": report["failed"],
+        "errors": report["errors"],
+        "batches": report["batches"],
+        "diff": {k: report[k] for k in ("inserted", "updated", "unchanged", "deleted")},
     }
+    if "sync_skipped" in report:
+        result["sync_skipped"] = report["sync_skipped"]
+
+    if mode == "full":
+        #  Invalidate all catalog-derived caches (new generation)
+        result["catalog_version"] = await run_in_threadpool(invalidate_catalog, db)
+    else:
+        # Only entries restricted to the touched departments/levels/modes
+        result["invalidated_scopes"] = await run_in_threadpool(invalidate_scopes, db, report["scopes"])
+    return result
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from .. import metrics, timing
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus text exposition for this worker (DB always; request/cache with REQUEST_TIMING=1)."""
+    body = "\n".join(metrics.prometheus_lines() + timing.prometheus_lines()) + "\n"
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
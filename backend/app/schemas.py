@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Annotated, Optional, List, Dict, Any
 
 class CourseOut(BaseModel):
     id: int
@@ -16,16 +16,51 @@ class CourseOut(BaseModel):
     class Config:
         from_attributes = True
 
+class FacetValue(BaseModel):
+    value: Any
+    count: int
+
+class FacetRange(BaseModel):
+    min: float  # inclusive
+    max: float  # exclusive
+    count: int
+
+class FacetsResponse(BaseModel):
+    total: int
+    department: List[FacetValue]
+    level: List[FacetValue]
+    delivery_mode: List[FacetValue]
+    year_offered: List[FacetValue]
+    tuition_fee_inr: List[FacetRange]
+    rating: List[FacetRange]
+
 class CoursesResponse(BaseModel):
     items: List[CourseOut]
-    total: int
-    page: int
+    total: Optional[int]  # omitted in cursor mode unless include_total=true
+    total_exact: Optional[bool] = None  # False when `total` is an estimate (COUNT_STRATEGY=estimate)
+    page: Optional[int]  # None in cursor mode
     page_size: int
+    next_cursor: Optional[str] = None
+    facets: Optional[FacetsResponse] = None  # only with include_facets=true
+
+# Shared by /api/ask and every entry of /api/ask/batch.
+Question = Annotated[str, Field(min_length=2)]
 
 class AskRequest(BaseModel):
-    question: str = Field(..., min_length=2)
+    question: Question
 
 class AskResponse(BaseModel):
     parsed_filters: Dict[str, Any]
     results: CoursesResponse
     message: Optional[str] = None
+
+class AskBatchRequest(BaseModel):
+    questions: List[Question] = Field(..., min_length=1, max_length=50)
+
+class AskBatchItem(BaseModel):
+    question: str
+    cached: bool  # answered from cache rather than by this request's query
+    response: AskResponse
+
+class AskBatchResponse(BaseModel):
+    items: List[AskBatchItem]
@@ -0,0 +1,280 @@
+"""Course-name search backends for the `q` filter.
+
+`SEARCH_MODE=substring` (default) keeps the original `ILIKE '%q%'` semantics;
+on Postgres it is served by a pg_trgm GIN index instead of a sequential scan.
+
+`SEARCH_MODE=fulltext` matches whole words, word prefixes and single-typo
+variants:
+  - Postgres: `to_tsvector @@ to_tsquery` (prefix terms) OR trigram `%` similarity,
+    both backed by GIN indexes created in `ensure_search_indexes`.
+  - SQLite/dev: an in-process inverted index (`SearchIndex`), whose matches
+    are joined in from a temp table.
+
+Both modes support `sort=relevance` (ts_rank/similarity on Postgres, the
+inverted-index score elsewhere), with the default order as tie-breaker.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import column, delete, func, insert, literal_column, or_, select, table, text
+from sqlalchemy.orm import Session
+
+from . import aio
+from .cache import data_version
+from .models import Course
+from .settings import settings
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Scores per matched query term.
+EXACT, PREFIX, FUZZY = 3.0, 2.0, 1.0
+MIN_PREFIX_LEN = 2
+MIN_FUZZY_LEN = 4
+
+
+def tokenize(text_: str) -> List[str]:
+    return TOKEN_RE.findall(text_.lower())
+
+
+def fulltext_enabled() -> bool:
+    return settings.SEARCH_MODE == "fulltext"
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+# -----------------------
+# Postgres
+# -----------------------
+PG_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_courses_name_trgm ON courses USING gin (course_name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_courses_name_tsv ON courses "
+    "USING gin (to_tsvector('simple', course_name))",
+]
+
+
+def ensure_search_indexes(engine):
+    """Create the trigram / tsvector indexes (Postgres only, idempotent)."""
+    if engine.dialect.name != "postgresql":
+        return
+    try:
+        with engine.begin() as conn:
+            for ddl in PG_SEARCH_DDL:
+                conn.execute(text(ddl))
+    except Exception as e:
+        logging.warning(f"⚠️ Could not create search indexes (is pg_trgm available?): {e}")
+
+
+# Inlined (not bound) so the expression matches the ix_courses_name_tsv definition.
+_PG_CONFIG = literal_column("'simple'")
+
+
+def _pg_tsvector():
+    return func.to_tsvector(_PG_CONFIG, Course.course_name)
+
+
+def _pg_tsquery(q: str):
+    terms = " & ".join(f"{t}:*" for t in tokenize(q))
+    return func.to_tsquery(_PG_CONFIG, terms or "''")
+
+
+# -----------------------
+# In-process inverted index
+# -----------------------
+def _edits1(token: str) -> Set[str]:
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = j = diffs = 0
+    while i < len(a) and j < len(b):
+        if a[i] != b[j]:
+            diffs += 1
+            if diffs > 1:
+                return False
+            if len(a) == len(b):
+                i += 1
+            j += 1
+        else:
+            i += 1
+            j += 1
+    return diffs + (len(b) - j) + (len(a) - i) <= 1
+
+
+class SearchIndex:
+    """Token → course ids, with prefix lookup and one-edit typo tolerance."""
+
+    def __init__(self, rows: Iterable[Tuple[int, str]], version: str = ""):
+        self.version = version
+        postings: Dict[str, Set[int]] = defaultdict(set)
+        for cid, name in rows:
+            for tok in tokenize(name):
+                postings[tok].add(cid)
+        self.postings = dict(postings)
+        self.vocab = sorted(self.postings)
+        # Deletion neighbourhood (SymSpell-style) for typo candidates.
+        self.deletes: Dict[str, Set[str]] = defaultdict(set)
+        for tok in self.vocab:
+            if len(tok) >= MIN_FUZZY_LEN:
+                for d in _edits1(tok):
+                    self.deletes[d].add(tok)
+        self.built_at = time.time()
+
+    def _prefix_tokens(self, term: str) -> List[str]:
+        lo = bisect.bisect_left(self.vocab, term)
+        hi = bisect.bisect_left(self.vocab, term + "\uffff")
+        return self.vocab[lo:hi]
+
+    def _fuzzy_tokens(self, term: str) -> Set[str]:
+        candidates = set(self.deletes.get(term, ()))
+        for d in _edits1(term):
+            candidates |= self.deletes.get(d, set())
+            if d in self.postings:
+                candidates.add(d)
+        return {c for c in candidates if _within_one_edit(term, c)}
+
+    def term_scores(self, term: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        if len(term) >= MIN_FUZZY_LEN:
+            for tok in self._fuzzy_tokens(term):
+                for cid in self.postings[tok]:
+                    scores[cid] = FUZZY
+        if len(term) >= MIN_PREFIX_LEN:
+            for tok in self._prefix_tokens(term):
+                for cid in self.postings[tok]:
+                    scores[cid] = PREFIX
+        for cid in self.postings.get(term, ()):
+            scores[cid] = EXACT
+        return scores
+
+    def search(self, q: str) -> Dict[int, float]:
+        """Ids matching every term of `q`, mapped to their summed score."""
+        result: Optional[Dict[int, float]] = None
+        for term in tokenize(q):
+            scores = self.term_scores(term)
+            if result is None:
+                result = scores
+            else:
+                result = {cid: s + scores[cid] for cid, s in result.items() if cid in scores}
+            if not result:
+                return {}
+        return result or {}
+
+
+_index: Optional[SearchIndex] = None
+_build_lock = threading.Lock()
+
+
+def get_index(db: Session) -> SearchIndex:
+    global _index
+    idx = _index
+    if (
+        idx is not None
+        and idx.version == data_version()
+        and time.time() - idx.built_at < settings.CATALOG_INDEX_MAX_AGE
+    ):
+        return idx
+    aio.acquire(_build_lock)
+    try:
+        if _index is idx:
+            _index = _build(db)
+        return _index
+    finally:
+        _build_lock.release()
+
+
+def _build(db: Session) -> SearchIndex:
+    version = data_version()
+    return aio.offload(SearchIndex, db.execute(select(Course.id, Course.course_name)).all(), version)
+
+
+def refresh(db: Session):
+    """Rebuild the in-process index after an ingest (if it was ever built)."""
+    global _index
+    if _index is not None:
+        with _build_lock:
+            _index = _build(db)
+
+
+def reset():
+    global _index
+    _index = None
+
+
+# -----------------------
+# Query building
+# -----------------------
+# In-process matches are handed to SQL through a per-connection temp table
+# rather than as bound ids: a common word can match more courses than SQLite
+# allows parameters in one statement. The rows are written inside the
+# session's transaction and vanish when a read request rolls back, so the
+# memo of loaded queries is only trusted within the transaction that wrote it.
+_HITS = table("search_hits", column("q"), column("id"), column("score"))
+_HITS_DDL = "CREATE TEMP TABLE IF NOT EXISTS search_hits (q TEXT, id INTEGER, score REAL, PRIMARY KEY (q, id))"
+MAX_HIT_QUERIES = 256  # distinct `q` kept per connection; least recently used are dropped
+
+
+def _load_hits(db: Session, q: str) -> bool:
+    """Fill `search_hits` with the index matches for `q` on this session's
+    connection (skipped when already loaded from the current index in the
+    current transaction). Returns whether anything matched."""
+    idx = get_index(db)
+    conn = db.connection()
+    txn = conn.get_transaction()
+    loaded: "Optional[OrderedDict[str, Tuple[SearchIndex, bool]]]" = conn.info.get("search_hits")
+    if loaded is None or conn.info.get("search_hits_txn") is not txn:
+        # Earlier rows were rolled back (or committed and may be stale): start over.
+        loaded = conn.info["search_hits"] = OrderedDict()
+        conn.info["search_hits_txn"] = txn
+    entry = loaded.get(q)
+    if entry is not None and entry[0] is idx:
+        loaded.move_to_end(q)
+        return entry[1]
+
+    scores = idx.search(q)
+    conn.execute(text(_HITS_DDL))
+    conn.execute(delete(_HITS).where(_HITS.c.q == q))
+    if scores:
+        conn.execute(insert(_HITS), [{"q": q, "id": cid, "score": s} for cid, s in scores.items()])
+    loaded[q] = (idx, bool(scores))
+    loaded.move_to_end(q)
+    while len(loaded) > MAX_HIT_QUERIES:
+        old, _ = loaded.popitem(last=False)
+        conn.execute(delete(_HITS).where(_HITS.c.q == old))
+    return bool(scores)
+
+
+def match_clause(db: Optional[Session], q: str):
+    """WHERE clause for the `q` filter under the configured search mode."""
+    if not fulltext_enabled() or db is None or not tokenize(q):
+        return Course.course_name.ilike(f"%{q}%")
+    if _is_postgres(db):
+        return or_(_pg_tsvector().op("@@")(_pg_tsquery(q)), Course.course_name.op("%")(q))
+    _load_hits(db, q)
+    return Course.id.in_(select(_HITS.c.id).where(_HITS.c.q == q))
+
+
+def relevance_order(db: Session, q: Optional[str]):
+    """ORDER BY expression ranking best matches for `q` first."""
+    if not q:
+        return None
+    if _is_postgres(db):
+        return func.greatest(
+            func.ts_rank(_pg_tsvector(), _pg_tsquery(q)),
+            func.similarity(Course.course_name, q),
+        ).desc()
+    if not _load_hits(db, q):
+        return None
+    score = select(_HITS.c.score).where(_HITS.c.q == q, _HITS.c.id == Course.id).scalar_subquery()
+    return func.coalesce(score, 0.0).desc()
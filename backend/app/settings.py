@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from typing import List, Literal
 import os
 
 class Settings(BaseSettings):
@@ -7,7 +7,39 @@ class Settings(BaseSettings):
     INGEST_TOKEN: str = "supersecrettoken"
     CORS_ORIGINS: str = "http://localhost:3000,http://127.0.0.1:3000"
     AUTO_INGEST: int = 0
-    AUTO_INGEST_PATH: str = "/sample_data/courses.csv"
+    AUTO_INGEST_PATH: str = "/sample_data/courses.csv"  # CSV, or a snapshot from `python -m app.snapshot`
+    INGEST_BATCH_SIZE: int = 500  # rows per INSERT ... ON CONFLICT statement
+    INGEST_CHUNK_SIZE: int = 64 * 1024  # bytes read from the upload at a time
+    INGEST_WORKERS: int = 0  # processes parsing large uploads (0/1: parse on the ingest thread)
+    INGEST_PARALLEL_MIN_BYTES: int = 8 * 1024 * 1024  # smaller uploads are always parsed serially
+    INGEST_BLOCK_SIZE: int = 1024 * 1024  # bytes of whole CSV records per worker task
+    CATALOG_INDEX: int = 0  # serve /api/courses filtering from in-memory column arrays (needs numpy)
+    CATALOG_INDEX_MAX_AGE: int = 60  # seconds before a worker reloads its index from the DB
+    CATALOG_SNAPSHOT_PATH: str = ""  # columnar snapshot rewritten after ingests; warm-loads the catalog index
+    CATALOG_SNAPSHOT_DELAY: int = 5  # seconds without data changes before the snapshot is rewritten (background)
+    LOCAL_CACHE_MAX_ENTRIES: int = 10000  # in-process tier in front of Redis
+    LOCAL_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    LOCAL_CACHE_MAX_TTL: int = 30  # cap on local copies of Redis entries (seconds)
+    CACHE_STALE_TTL: int = 30  # serve-stale window after TTL while one request revalidates
+    CACHE_LOCK: int = 0  # cross-worker Redis lock so only one worker recomputes a missing key
+    CACHE_LOCK_TIMEOUT_MS: int = 5000
+    COMPRESS_MIN_BYTES: int = 512  # smaller catalog responses are sent uncompressed
+    COMPRESSED_CACHE_MAX_BYTES: int = 32 * 1024 * 1024  # gzip/brotli variants kept per worker
+    EXPORT_BATCH_SIZE: int = 1000  # rows per server-side cursor fetch (and per chunk) in /api/courses/export
+    ASYNC_DB: int = 0  # async handlers use AsyncSession (asyncpg/aiosqlite) + redis.asyncio
+    DATABASE_READ_URL: str = ""  # optional read replica for the GET routers
+    DB_POOL_SIZE: int = 10  # persistent connections per worker (Postgres)
+    DB_MAX_OVERFLOW: int = 20  # extra connections allowed under burst
+    DB_POOL_RECYCLE: int = 1800  # seconds before a connection is replaced
+    DB_POOL_TIMEOUT: int = 30  # seconds to wait for a free connection
+    DB_ECHO: int = 0  # log every SQL statement (debugging only)
+    DB_CONNECT_ATTEMPTS: int = 10  # startup connectivity probes (exponential backoff)
+    REQUEST_TIMING: int = 0  # Server-Timing header, per-request JSON logs and /metrics request histograms
+    COUNT_STRATEGY: Literal["cached", "exact", "estimate"] = "cached"  # per filter set / window count per page / estimate
+    COUNT_ESTIMATE_THRESHOLD: int = 10000  # estimate mode: report estimates at or above this many rows
+    QUERY_LOG: int = 0  # record filter shapes of DB-served course queries for the index advisor
+    EXPLAIN_COURSES: int = 0  # log the plan of every DB-served courses query (2 = EXPLAIN ANALYZE on Postgres)
+    SEARCH_MODE: str = "substring"  # "substring" (ILIKE) or "fulltext" (word/prefix/typo matching)
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 if os.getenv("PYTEST_CURRENT_TEST"):
@@ -0,0 +1,339 @@
+"""Columnar binary snapshots of the `courses` table.
+
+A snapshot stores each column as one contiguous array, so loading it is a
+memory map plus a few array copies instead of parsing CSV or reading every
+row from the database:
+
+    magic "CQSNAP\\0\\1" | u32 manifest length | u32 0 | manifest JSON | sections
+
+The manifest (JSON, padded to 8 bytes) records the row count, where the
+snapshot came from, the data version it was taken at and, per column, the
+offset of its section relative to the end of the manifest. Numeric columns
+are fixed-width arrays of the narrowest type that holds their range (`array`
+typecodes, little-endian). String columns (department, level, delivery_mode,
+course_name) are dictionary-encoded: an unsigned code per row plus a string
+table of u32 end offsets into a UTF-8 blob. Every section starts 8-aligned.
+
+Snapshots from the database include the surrogate `id`, so they can warm
+the catalog index (`CATALOG_SNAPSHOT_PATH`); snapshots from CSV can only be
+loaded into a database (`load`, or as `AUTO_INGEST_PATH`).
+
+    cd backend && python -m app.snapshot export catalog.cqs
+    cd backend && python -m app.snapshot from-csv ../sample_data/courses.csv catalog.cqs
+    cd backend && python -m app.snapshot load catalog.cqs [--mode delta] [--sync]
+    cd backend && python -m app.snapshot info catalog.cqs
+"""
+import argparse
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .models import CatalogRevision, Course
+from .parsing import COURSE_FIELDS, RowError, parse_row
+
+MAGIC = b"CQSNAP\x00\x01"
+_HEADER = struct.Struct("<8sII")
+
+COLUMNS = tuple(["id", *COURSE_FIELDS])
+STR_COLUMNS = ("course_name", "department", "level", "delivery_mode")
+FLOAT_COLUMNS = ("rating",)
+
+
+class SnapshotError(ValueError):
+    """Raised for files that are not snapshots of this format."""
+
+
+def _int_code(values: array) -> str:
+    """Narrowest signed typecode holding every value (`q` when empty)."""
+    if not values:
+        return "q"
+    lo, hi = min(values), max(values)
+    for code in ("b", "h", "i"):
+        bits = array(code).itemsize * 8 - 1
+        if -(1 << bits) <= lo and hi < (1 << bits):
+            return code
+    return "q"
+
+
+def _code_typecode(cardinality: int) -> str:
+    for code in ("B", "H", "I"):
+        if cardinality <= 1 << (array(code).itemsize * 8):
+            return code
+    return "Q"
+
+
+def _pad(n: int) -> int:
+    return -n % 8
+
+
+# -----------------------
+# Writing
+# -----------------------
+class _Columns:
+    """Column builders fed one row at a time."""
+
+    def __init__(self, columns: Sequence[str]):
+        self.columns = columns
+        self.numbers: Dict[str, array] = {
+            c: array("d" if c in FLOAT_COLUMNS else "q") for c in columns if c not in STR_COLUMNS
+        }
+        self.codes: Dict[str, array] = {c: array("I") for c in columns if c in STR_COLUMNS}
+        self.lookup: Dict[str, Dict[str, int]] = {c: {} for c in self.codes}
+        self.rows = 0
+
+    def add(self, row: Mapping[str, Any]):
+        for c, values in self.numbers.items():
+            values.append(row[c])
+        for c, codes in self.codes.items():
+            lookup = self.lookup[c]
+            codes.append(lookup.setdefault(row[c], len(lookup)))
+        self.rows += 1
+
+    def sections(self) -> Iterator[Tuple[str, Dict[str, Any], List[bytes]]]:
+        """(column, manifest entry without offsets, section parts) per column."""
+        for c in self.columns:
+            if c in self.numbers:
+                values = self.numbers[c]
+                code = values.typecode if values.typecode == "d" else _int_code(values)
+                yield c, {"type": code}, [array(code, values).tobytes()]
+            else:
+                strings = [s.encode("utf-8") for s in self.lookup[c]]
+                ends, total = array("I"), 0
+                for s in strings:
+                    total += len(s)
+                    ends.append(total)
+                code = _code_typecode(len(strings))
+                yield c, {"type": code, "strings": len(strings)}, [
+                    array(code, self.codes[c]).tobytes(), ends.tobytes(), b"".join(strings),
+                ]
+
+
+def write(path: str, rows: Iterable[Mapping[str, Any]], columns: Sequence[str] = COLUMNS,
+          meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Write `rows` as a snapshot at `path` (atomically replaced); returns the manifest."""
+    if sys.byteorder != "little":
+        raise SnapshotError("snapshots are little-endian; writing on a big-endian host is not supported")
+    builder = _Columns(columns)
+    for row in rows:
+        builder.add(row)
+
+    manifest: Dict[str, Any] = {
+        "format": 1, "rows": builder.rows, "created_at": time.time(), **(meta or {}), "columns": {},
+    }
+    body: List[bytes] = []
+    offset = 0
+    for c, entry, parts in builder.sections():
+        # Section parts (codes, string ends, string blob) each start 8-aligned.
+        entry["offsets"] = []
+        for part in parts:
+            entry["offsets"].append(offset)
+            body += [part, b"\0" * _pad(len(part))]
+            offset += len(part) + _pad(len(part))
+        manifest["columns"][c] = entry
+
+    encoded = json.dumps(manifest, separators=(",", ":")).encode("utf-8")
+    encoded += b" " * _pad(_HEADER.size + len(encoded))
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(encoded), 0))
+        f.write(encoded)
+        f.writelines(body)
+    os.replace(tmp, path)
+    return manifest
+
+
+def _revision(db: Session) -> int:
+    return db.scalar(select(CatalogRevision.revision).where(CatalogRevision.id == 1)) or 0
+
+
+def export_db(db: Session, path: str, version: str = "", batch_size: int = 10000) -> Dict[str, Any]:
+    """Snapshot the `courses` table (server-side cursor, `batch_size` rows at a time).
+
+    The catalog revision is read first: a write committed during the export
+    bumps it past the recorded one, so such a snapshot is never current.
+    """
+    revision = _revision(db)
+    max_id = db.execute(select(func.max(Course.id))).scalar() or 0
+    stmt = select(*(getattr(Course, c) for c in COLUMNS)).order_by(Course.id)
+    stmt = stmt.execution_options(yield_per=batch_size)
+    rows = (dict(zip(COLUMNS, r)) for r in db.execute(stmt))
+    return write(path, rows, COLUMNS, {
+        "source": "db", "catalog_version": version, "revision": revision, "max_id": max_id,
+    })
+
+
+def export_csv(fileobj: BinaryIO, path: str, chunk_size: int = 64 * 1024) -> Dict[str, Any]:
+    """Snapshot a CSV file; rows that fail to parse are skipped and counted."""
+    from .ingestion import iter_lines
+
+    failed = 0
+
+    def parsed() -> Iterator[Dict[str, Any]]:
+        nonlocal failed
+        for row in csv.DictReader(iter_lines(fileobj, chunk_size)):
+            try:
+                yield parse_row(row)
+            except RowError:
+                failed += 1
+
+    manifest = write(path, parsed(), tuple(COURSE_FIELDS), {"source": "csv"})
+    manifest["failed"] = failed
+    return manifest
+
+
+# -----------------------
+# Reading
+# -----------------------
+def is_snapshot(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class Snapshot:
+    """Read-only view of a snapshot file through a memory map."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, length, _ = _HEADER.unpack_from(self._mm)
+            if magic != MAGIC:
+                raise SnapshotError(f"{path} is not a course snapshot")
+            self.manifest: Dict[str, Any] = json.loads(self._mm[_HEADER.size:_HEADER.size + length])
+        except (struct.error, ValueError):
+            self._mm.close()
+            raise
+        self._data = _HEADER.size + length
+        self.rows: int = self.manifest["rows"]
+        self.columns: List[str] = list(self.manifest["columns"])
+        self._views: List[memoryview] = []
+
+    def _view(self, offset: int, code: str, count: int) -> memoryview:
+        start = self._data + offset
+        view = memoryview(self._mm)[start:start + count * array(code).itemsize].cast(code)
+        self._views.append(view)
+        return view
+
+    def column(self, name: str) -> memoryview:
+        """Values of a numeric column, or the dictionary codes of a string column (zero-copy)."""
+        entry = self.manifest["columns"][name]
+        return self._view(entry["offsets"][0], entry["type"], self.rows)
+
+    def strings(self, name: str) -> List[str]:
+        """String table of a dictionary-encoded column: `strings(c)[column(c)[i]]` is row i's value."""
+        entry = self.manifest["columns"][name]
+        _, ends_at, blob_at = entry["offsets"]
+        ends = self._view(ends_at, "I", entry["strings"])
+        blob = self._data + blob_at
+        out, start = [], 0
+        for end in ends:
+            out.append(self._mm[blob + start:blob + end].decode("utf-8"))
+            start = end
+        return out
+
+    def iter_rows(self, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        columns = list(columns or self.columns)
+        arrays = [self.column(c) for c in columns]
+        tables = [self.strings(c) if c in STR_COLUMNS else None for c in columns]
+        for i in range(self.rows):
+            yield {
+                c: (table[values[i]] if table is not None else values[i])
+                for c, values, table in zip(columns, arrays, tables)
+            }
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._views.clear()
+        self._mm.close()
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load(db: Session, path: str, mode: str = "full", sync: bool = False,
+         progress: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Upsert a snapshot's rows through the regular ingest writer (`ingestion.ingest_parsed`)."""
+    from .ingestion import ingest_parsed
+
+    with Snapshot(path) as snap:
+        # "line" in error reports is the 1-based row number within the snapshot.
+        parsed = enumerate(snap.iter_rows(tuple(COURSE_FIELDS)), start=1)
+        return ingest_parsed(db, parsed, progress=progress, mode=mode, sync=sync)
+
+
+def is_current(db: Session, snap: Snapshot) -> bool:
+    """Whether a database snapshot still matches the `courses` table: taken
+    at the catalog revision stored in the database (`crud.bump_revision`),
+    with the same row count and highest id.
+
+    The database is the reference rather than the cache's data version,
+    which restarts from zero in each worker when Redis is not configured.
+    """
+    meta = snap.manifest
+    if meta.get("source") != "db" or meta.get("revision") != _revision(db):
+        return False
+    count, max_id = db.execute(select(func.count(Course.id), func.max(Course.id))).one()
+    return count == snap.rows and (max_id or 0) == meta.get("max_id")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("export", help="snapshot the courses table of DATABASE_URL")
+    p.add_argument("out")
+    p = sub.add_parser("from-csv", help="snapshot a CSV file in the sample_data/courses.csv schema")
+    p.add_argument("csv")
+    p.add_argument("out")
+    p = sub.add_parser("load", help="upsert a snapshot into DATABASE_URL")
+    p.add_argument("snapshot")
+    p.add_argument("--mode", choices=("full", "delta"), default="full")
+    p.add_argument("--sync", action="store_true", help="also delete courses missing from the snapshot")
+    p = sub.add_parser("info", help="print a snapshot's manifest")
+    p.add_argument("snapshot")
+    args = ap.parse_args()
+
+    started = time.perf_counter()
+    if args.command == "info":
+        with Snapshot(args.snapshot) as snap:
+            print(json.dumps(snap.manifest, indent=2))
+        sys.exit(0)
+    if args.command == "from-csv":
+        with open(args.csv, "rb") as f:
+            m = export_csv(f, args.out)
+        print(f"✅ Wrote {m['rows']} rows to {args.out} ({m['failed']} failed to parse)")
+    else:
+        from .cache import data_version, init_cache
+        from .database import SessionLocal
+
+        init_cache()
+        with SessionLocal() as db:
+            if args.command == "export":
+                m = export_db(db, args.out, data_version())
+                print(f"✅ Wrote {m['rows']} rows to {args.out}")
+            else:
+                from .ingestion import invalidate_catalog, invalidate_scopes
+
+                report = load(db, args.snapshot, args.mode, args.sync)
+                if args.mode == "full":
+                    invalidate_catalog(db)
+                else:
+                    invalidate_scopes(db, report["scopes"])
+                print(f"✅ Loaded {report['ingested']} rows from {args.snapshot}")
+    print(f"   {time.perf_counter() - started:.2f} s")
@@ -0,0 +1,186 @@
+"""Per-request timing: spans, a `Server-Timing` header, structured logs and
+in-process histograms (exposed at `/metrics`).
+
+Enabled with `REQUEST_TIMING=1`. The middleware opens a span list for each
+request in a context variable; `span(name)` appends to it and is a shared
+no-op context manager when there is no list, so instrumented code costs one
+`ContextVar.get()` when timing is off. Cache hit/miss counters per key
+namespace (`courses`, `ask`, `row`, `meta`, ...) are kept the same way.
+"""
+import json
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from .metrics import Histogram
+
+logger = logging.getLogger("coursequest.timing")
+
+# (name, duration ms or None, description)
+SpanRecord = Tuple[str, Optional[float], Optional[str]]
+
+_spans: ContextVar[Optional[List[SpanRecord]]] = ContextVar("request_spans", default=None)
+
+request_histograms: Dict[Tuple[str, str], Histogram] = {}  # (method, route) -> latency
+span_histograms: Dict[str, Histogram] = {}
+cache_counts: Dict[str, List[int]] = {}  # namespace -> [hits, misses]
+_lock = threading.Lock()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "spans", "started")
+
+    def __init__(self, name: str, spans: List[SpanRecord]):
+        self.name = name
+        self.spans = spans
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.spans.append((self.name, (time.perf_counter() - self.started) * 1000, None))
+        return False
+
+
+def span(name: str):
+    """Time a block as stage `name` of the current request (no-op outside one)."""
+    spans = _spans.get()
+    if spans is None:
+        return _NULL
+    return _Span(name, spans)
+
+
+def cache_result(key: str, hit: bool):
+    """Count a cache lookup for the namespace of `key` (e.g. `courses:v3:...`)."""
+    spans = _spans.get()
+    if spans is None:
+        return
+    namespace = key.split(":", 1)[0]
+    spans.append(("cache_hit" if hit else "cache_miss", None, namespace))
+    with _lock:
+        counts = cache_counts.setdefault(namespace, [0, 0])
+        counts[0 if hit else 1] += 1
+
+
+def _histogram(table: Dict, key) -> Histogram:
+    hist = table.get(key)
+    if hist is None:
+        with _lock:
+            hist = table.setdefault(key, Histogram())
+    return hist
+
+
+def server_timing(spans: List[SpanRecord], total_ms: float) -> str:
+    """`Server-Timing` value; repeated span names are summed."""
+    durations: Dict[str, float] = {}
+    marks: Dict[Tuple[str, str], None] = {}
+    for name, ms, desc in spans:
+        if ms is None:
+            marks[(name, desc or "")] = None
+        else:
+            durations[name] = durations.get(name, 0.0) + ms
+    parts = [f"{name};dur={ms:.2f}" for name, ms in durations.items()]
+    parts += [f'{name};desc="{desc}"' for name, desc in marks]
+    parts.append(f"total;dur={total_ms:.2f}")
+    return ", ".join(parts)
+
+
+class TimingMiddleware:
+    """ASGI middleware: collects spans, adds `Server-Timing`, logs and records histograms."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        spans: List[SpanRecord] = []
+        token = _spans.set(spans)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total = (time.perf_counter() - started) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(spans, total).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _spans.reset(token)
+            total = (time.perf_counter() - started) * 1000
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            _histogram(request_histograms, (scope["method"], route_path)).observe(total)
+            stages: Dict[str, Any] = {}
+            for name, ms, desc in spans:
+                if ms is not None:
+                    _histogram(span_histograms, name).observe(ms)
+                    stages[name] = round(stages.get(name, 0.0) + ms, 3)
+                else:
+                    stages.setdefault(name, []).append(desc)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(json.dumps({
+                    "method": scope["method"],
+                    "route": route_path,
+                    "path": scope["path"],
+                    "status": status,
+                    "ms": round(total, 3),
+                    "spans": stages,
+                }))
+
+
+# -----------------------
+# Prometheus exposition
+# -----------------------
+def prometheus_lines() -> List[str]:
+    from .metrics import prometheus_histogram
+
+    lines = [
+        "# HELP coursequest_request_duration_seconds HTTP request latency by route.",
+        "# TYPE coursequest_request_duration_seconds histogram",
+    ]
+    for (method, route), hist in sorted(request_histograms.items()):
+        lines += prometheus_histogram("coursequest_request_duration_seconds", {"method": method, "route": route}, hist)
+    lines += [
+        "# HELP coursequest_span_duration_seconds Time spent per request stage.",
+        "# TYPE coursequest_span_duration_seconds histogram",
+    ]
+    for name, hist in sorted(span_histograms.items()):
+        lines += prometheus_histogram("coursequest_span_duration_seconds", {"span": name}, hist)
+    lines += [
+        "# HELP coursequest_cache_requests_total Cache lookups by key namespace and result.",
+        "# TYPE coursequest_cache_requests_total counter",
+    ]
+    ratios = []
+    for ns, (hits, misses) in sorted(cache_counts.items()):
+        lines.append(f'coursequest_cache_requests_total{{namespace="{ns}",result="hit"}} {hits}')
+        lines.append(f'coursequest_cache_requests_total{{namespace="{ns}",result="miss"}} {misses}')
+        ratios.append(f'coursequest_cache_hit_ratio{{namespace="{ns}"}} {hits / ((hits + misses) or 1):.6f}')
+    lines += [
+        "# HELP coursequest_cache_hit_ratio Cache hits / lookups since start, by key namespace.",
+        "# TYPE coursequest_cache_hit_ratio gauge",
+        *ratios,
+    ]
+    return lines
@@ -1,6 +1,21 @@
+"""Rule-based parser turning an /api/ask question into course filters.
+
+All patterns are compiled once. Keyword filters (level, delivery mode,
+department) are found with alternation regexes built from the vocabulary:
+one scan for the built-in keywords, one for phrases `set_vocabulary` adds
+from the catalog metadata, so departments that exist in the data are
+recognised without code changes. Built-in keywords always take precedence:
+"computer science" maps to CS even when the catalog also lists a
+"Computer Science" department.
+
+Parses are memoized in a bounded LRU keyed on the normalized question
+(lowercased, whitespace collapsed) and the vocabulary it was parsed with.
+The cache is dropped whenever the vocabulary changes.
+"""
 import re
-from typing import Dict, Any
-from typing import Optional
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Sequence, Tuple
 
 DELV_MAP = {
     "online": "online",
@@ -20,109 +35,188 @@ LEVEL_MAP = {
     "masters": "PG",
 }
 
+# Keyword → department, in priority order (first listed wins when several match).
+DEPT_MAP = {
+    "cs": "CS",
+    "computer": "CS",
+    "math": "Math",
+    "mathematics": "Math",
+    "economics": "Economics",
+    "business": "Business",
+    "psychology": "Psychology",
+}
+
+PARSE_CACHE_SIZE = 4096
+
+_FEE_CAP_RE = re.compile(r"(under|below|less than|<=?)\s*([\d,\.]+)\s*(k|lakh|lac|thousand|inr|rs|₹)?")
+_FEE_WORD_RE = re.compile(r"(fee|tuition)")
+_MONEY_CAP_RE = re.compile(r"(?:under|below|less than|<=?)\s*(\d+(?:\.\d+)?)\s*(lakh|lac|k|thousand|rs|inr|₹)?")
+_MONEY_NUM_RE = re.compile(r"(\d+(?:\,\d{3})+|\d+)")
+_RATING_RE = re.compile(r"(?:rating|rated)\s*(?:>=|at least|above)?\s*(\d(?:\.\d)?)")
+_RATING_PLUS_RE = re.compile(r"(\d(?:\.\d)?)\s*\+\s*rating")
+_CREDITS_RE = re.compile(r"(?:credits?)\s*(?:>=|at least)?\s*(\d+)")
+_WEEKS_RE = re.compile(r"(?:weeks?)\s*(?:<=|under|less than)?\s*(\d+)")
+_YEAR_RE = re.compile(r"(?:year|offered)\s*(\d{4})")
+_TOPIC_RE = re.compile(r"(?:about|on|for)\s+([a-zA-Z ]{3,})$")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _scale(value: float, unit: str) -> int:
+    if unit in ("lakh", "lac"):
+        return int(value * 100000)
+    if unit in ("k", "thousand"):
+        return int(value * 1000)
+    return int(value)
+
+
 def parse_money(text: str) -> Optional[int]:
     # Support '50k', '50,000', '1 lakh', '1.5 lakh', '100000'
     text = text.replace(",", " ").lower()
-    m1 = re.search(r"(?:under|below|less than|<=?)\s*(\d+(?:\.\d+)?)\s*(lakh|lac|k|thousand|rs|inr|₹)?", text)
+    m1 = _MONEY_CAP_RE.search(text)
     if m1:
-        num = float(m1.group(1))
-        unit = m1.group(2) or ""
-        if unit in ["lakh", "lac"]:
-            return int(num * 100000)
-        if unit in ["k", "thousand"]:
-            return int(num * 1000)
-        return int(num)
-    m2 = re.search(r"(\d+(?:\,\d{3})+|\d+)", text)
+        return _scale(float(m1.group(1)), m1.group(2) or "")
+    m2 = _MONEY_NUM_RE.search(text)
     if m2:
-        val = int(m2.group(1).replace(",", ""))
-        return val
+        return int(m2.group(1).replace(",", ""))
     return None
 
-def parse_question(q: str) -> Dict[str, Any]:
-    ql = q.lower()
 
+def normalize(q: str) -> str:
+    return _SPACE_RE.sub(" ", q.lower()).strip()
+
+
+# -----------------------
+# Keyword vocabulary
+# -----------------------
+Terms = Dict[str, Tuple[str, str, int]]  # phrase -> (field, value, priority)
+Tables = Sequence[Dict[str, str]]  # phrase -> value, per field in Vocabulary.FIELDS
+
+
+class Vocabulary:
+    """Keyword tables compiled into word-bounded alternation regexes, one per
+    tier: built-in keywords, then phrases taken from the catalog."""
+
+    FIELDS = ("level", "delivery_mode", "department")
+
+    def __init__(self, builtin: Tables, catalog: Tables = ({}, {}, {})):
+        self.terms: Terms = {}
+        self.tiers: List[Tuple[Terms, Pattern]] = []
+        for tables in (builtin, catalog):
+            # The first table entry keeps a phrase; catalog copies of built-ins are dropped.
+            terms: Terms = {}
+            for field, table in zip(self.FIELDS, tables):
+                for priority, (phrase, value) in enumerate(table.items()):
+                    phrase = phrase.lower()
+                    if phrase not in self.terms:
+                        terms.setdefault(phrase, (field, value, priority))
+            if terms:
+                # Longest phrases first so "on campus" is not shadowed by a shorter term.
+                alternatives = sorted(terms, key=len, reverse=True)
+                pattern = re.compile(r"\b(?:" + "|".join(map(re.escape, alternatives)) + r")\b")
+                self.tiers.append((terms, pattern))
+                self.terms.update(terms)
+
+    def match(self, ql: str) -> Dict[str, str]:
+        """Per field, the value of the highest-priority phrase found in `ql`;
+        a field set by a built-in keyword ignores catalog phrases."""
+        found: Dict[str, str] = {}
+        for terms, pattern in self.tiers:
+            best: Dict[str, Tuple[int, str]] = {}
+            for m in pattern.finditer(ql):
+                field, value, priority = terms[m.group(0)]
+                if field in found:
+                    continue
+                if field not in best or priority < best[field][0]:
+                    best[field] = (priority, value)
+            found.update((field, value) for field, (_, value) in best.items())
+        return {field: found[field] for field in self.FIELDS if field in found}
+
+
+def build_vocabulary(
+    departments: Iterable[str] = (),
+    levels: Iterable[str] = (),
+    delivery_modes: Iterable[str] = (),
+) -> Vocabulary:
+    """Built-in keywords plus the values present in the catalog."""
+    def table(values: Iterable[str]) -> Dict[str, str]:
+        out: Dict[str, str] = {}
+        for v in values:
+            if v and v.strip():
+                out.setdefault(v.strip().lower(), v)
+        return out
+
+    return Vocabulary(
+        (LEVEL_MAP, DELV_MAP, DEPT_MAP),
+        (table(levels), table(delivery_modes), table(departments)),
+    )
+
+
+_vocab = build_vocabulary()
+_vocab_lock = threading.Lock()
+vocabulary_version: Optional[str] = None  # data version the vocabulary was loaded at
+
+
+def set_vocabulary(meta: Dict[str, Iterable[str]], version: Optional[str] = None):
+    """Load departments/levels/modes from `crud.meta` output and reset the memo."""
+    global _vocab, vocabulary_version
+    vocab = build_vocabulary(
+        meta.get("departments", ()), meta.get("levels", ()), meta.get("delivery_modes", ())
+    )
+    with _vocab_lock:
+        _vocab = vocab
+        vocabulary_version = version
+        _parse_cached.cache_clear()
+
+
+# -----------------------
+# Parsing
+# -----------------------
+def _parse(ql: str, vocab: Vocabulary) -> Dict[str, Any]:
     out: Dict[str, Any] = {}
 
-    # fee cap
+    # fee cap: explicit "under/below/less than X", else a number next to fee/tuition
     fee = None
-    # explicit "under/below/less than X"
-    m = re.search(r"(under|below|less than|<=?)\s*([\d,\.]+)\s*(k|lakh|lac|thousand|inr|rs|₹)?", ql)
+    m = _FEE_CAP_RE.search(ql)
     if m:
-        raw = m.group(2).replace(",", "")
-        unit = (m.group(3) or "").lower()
-        val = float(raw)
-        if unit in ["lakh", "lac"]:
-            fee = int(val * 100000)
-        elif unit in ["k", "thousand"]:
-            fee = int(val * 1000)
-        else:
-            fee = int(val)
-    else:
-        # generic number: treat as max fee if words like fee/tuition present
-        if re.search(r"(fee|tuition)", ql):
-            fee = parse_money(ql)
+        fee = _scale(float(m.group(2).replace(",", "")), (m.group(3) or "").lower())
+    elif _FEE_WORD_RE.search(ql):
+        fee = parse_money(ql)
     if fee:
         out["max_fee"] = fee
 
-    # rating
-    m = re.search(r"(?:rating|rated)\s*(?:>=|at least|above)?\s*(\d(?:\.\d)?)", ql)
+    # rating, or phrases like "4+ rating"
+    m = _RATING_RE.search(ql) or _RATING_PLUS_RE.search(ql)
     if m:
-        try:
-            out["min_rating"] = float(m.group(1))
-        except:
-            pass
-    else:
-        # phrases like "rating 4 and above"
-        m2 = re.search(r"(\d(?:\.\d)?)\s*\+\s*rating", ql)
-        if m2:
-            out["min_rating"] = float(m2.group(1))
-
-    # level
-    for k,v in LEVEL_MAP.items():
-        if re.search(rf"\b{k}\b", ql):
-            out["level"] = v
-            break
-
-    # delivery mode
-    for k,v in DELV_MAP.items():
-        if re.search(rf"\b{k}\b", ql):
-            out["delivery_mode"] = v
-            break
-
-    # department: take first capitalized word like CS/Math/Economics/Business/Psychology or keywords
-    dep_words = ["cs","computer","math","mathematics","economics","business","psychology"]
-    for w in dep_words:
-        if re.search(rf"\b{w}\b", ql):
-            if w in ["cs","computer"]:
-                out["department"] = "CS"
-            elif w in ["math","mathematics"]:
-                out["department"] = "Math"
-            elif w == "economics":
-                out["department"] = "Economics"
-            elif w == "business":
-                out["department"] = "Business"
-            elif w == "psychology":
-                out["department"] = "Psychology"
-            break
-
-    # credits
-    m = re.search(r"(?:credits?)\s*(?:>=|at least)?\s*(\d+)", ql)
+        out["min_rating"] = float(m.group(1))
+
+    out.update(vocab.match(ql))
+
+    m = _CREDITS_RE.search(ql)
     if m:
         out["min_credits"] = int(m.group(1))
 
-    # duration in weeks
-    m = re.search(r"(?:weeks?)\s*(?:<=|under|less than)?\s*(\d+)", ql)
+    m = _WEEKS_RE.search(ql)
     if m and ("under" in ql or "less than" in ql or "<=" in ql):
         out["max_duration_weeks"] = int(m.group(1))
 
-    # year offered
-    m = re.search(r"(?:year|offered)\s*(\d{4})", ql)
+    m = _YEAR_RE.search(ql)
     if m:
         out["year"] = int(m.group(1))
 
-    # search keyword
-    m = re.search(r"(?:about|on|for)\s+([a-zA-Z ]{3,})$", ql)
+    m = _TOPIC_RE.search(ql)
     if m:
         out["q"] = m.group(1).strip()
 
     return out
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_cached(ql: str, vocab: Vocabulary) -> Tuple[Tuple[str, Any], ...]:
+    # Keyed on the vocabulary instance (hashed by identity): a parse made
+    # while `set_vocabulary` swaps it can never be served for the new one.
+    return tuple(_parse(ql, vocab).items())
+
+
+def parse_question(q: str) -> Dict[str, Any]:
+    # Fresh dict per call: callers may add to it without touching the memo.
+    return dict(_parse_cached(normalize(q), _vocab))
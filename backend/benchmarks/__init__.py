@@ -0,0 +1 @@
+"""Benchmarks for the CourseQuest Lite backend (run with `python -m benchmarks.<name>`)."""
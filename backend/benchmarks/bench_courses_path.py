@@ -0,0 +1,164 @@
+"""p50/p99 of /api/courses: legacy double-cached path vs the bytes passthrough.
+
+The legacy handler is reproduced here as it was before `query_service`:
+a dict is cached as JSON, decoded on every hit, then re-validated through
+`CoursesResponse` and re-encoded by FastAPI. Misses built ORM objects and
+ran `serialize_course` on them. It keeps all 13 query parameters and the
+sync generator session dependency of the original: most of a warm hit is
+FastAPI parameter validation and dependency setup, not the handler.
+
+    cd backend && python -m benchmarks.bench_courses_path --rows 20000 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _setup(rows: int):
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from app.database import Base, SessionLocal, engine
+    from app.crud import upsert_courses
+
+    Base.metadata.create_all(bind=engine)
+
+    rnd = random.Random(42)
+    depts = ["CS", "Math", "Physics", "Business", "Economics", "Psychology"]
+    with SessionLocal() as db:
+        batch = []
+        for i in range(rows):
+            batch.append({
+                "course_id": i + 1,
+                "course_name": f"Course {i}",
+                "department": rnd.choice(depts),
+                "level": rnd.choice(["UG", "PG"]),
+                "delivery_mode": rnd.choice(["online", "offline", "hybrid"]),
+                "credits": rnd.randint(2, 5),
+                "duration_weeks": rnd.randint(4, 16),
+                "rating": round(rnd.uniform(3.0, 5.0), 1),
+                "tuition_fee_inr": rnd.randrange(10000, 100000, 5000),
+                "year_offered": rnd.choice([2023, 2024, 2025]),
+            })
+            if len(batch) == 500:
+                upsert_courses(db, batch)
+                batch.clear()
+        upsert_courses(db, batch)
+        db.commit()
+
+
+def _legacy_router():
+    """The pre-query_service /api/courses handler, for comparison."""
+    from typing import Optional
+    from fastapi import APIRouter, Depends, Query
+    from sqlalchemy import select, func
+    from app.cache import get_cache, set_cache
+    from app.crud import apply_filters, serialize_course
+    from app.database import SessionLocal
+    from app.models import Course
+    from app.schemas import CoursesResponse
+
+    router = APIRouter()
+
+    def legacy_db():  # the old sync generator dependency
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @router.get("/legacy/courses", response_model=CoursesResponse)
+    def legacy_courses(
+        page: int = Query(1, ge=1),
+        page_size: int = Query(10, ge=1, le=100),
+        department: Optional[str] = None,
+        level: Optional[str] = None,
+        delivery_mode: Optional[str] = None,
+        min_rating: Optional[float] = None,
+        max_fee: Optional[int] = None,
+        min_credits: Optional[int] = None,
+        max_credits: Optional[int] = None,
+        min_duration_weeks: Optional[int] = None,
+        max_duration_weeks: Optional[int] = None,
+        year: Optional[int] = None,
+        q: Optional[str] = None,
+        db=Depends(legacy_db),
+    ):
+        # Same query parameters as the real handler had, so both sides pay for
+        # validating them; only `department` is exercised.
+        params = {"department": department}
+        cache_key = f"legacy:{page}:{page_size}:{json.dumps(params, sort_keys=True)}"
+        cached = get_cache(cache_key)
+        if cached:
+            return json.loads(cached)
+        inner_key = f"legacy-inner:{json.dumps(params, sort_keys=True)}:p{page}:s{page_size}"
+        inner = get_cache(inner_key)
+        if inner:
+            data = json.loads(inner)
+            items, total = [Course(**i) for i in data["items"]], data["total"]
+        else:
+            stmt = apply_filters(select(Course), params)
+            total = db.scalar(select(func.count()).select_from(apply_filters(select(Course), params).subquery()))
+            stmt = stmt.order_by(Course.rating.desc(), Course.tuition_fee_inr.asc()).offset((page - 1) * page_size).limit(page_size)
+            items = list(db.execute(stmt).scalars())
+            set_cache(inner_key, json.dumps({"items": [serialize_course(i) for i in items], "total": total}))
+        result = {"items": [serialize_course(i) for i in items], "total": total, "page": page, "page_size": page_size}
+        set_cache(cache_key, json.dumps(result))
+        return result
+
+    return router
+
+
+async def _measure(client, path: str, n: int, cold: bool):
+    from app import cache
+
+    samples = []
+    for i in range(n):
+        if cold:
+            cache.cache_store.clear()
+        url = f"{path}?page={1 + i % 50}&page_size=20&department=CS"
+        started = time.perf_counter()
+        r = await client.get(url)
+        samples.append((time.perf_counter() - started) * 1000)
+        assert r.status_code == 200, r.text
+    return samples
+
+
+async def main(rows: int, requests: int):
+    _setup(rows)
+    import httpx
+    from app.main import app
+
+    app.include_router(_legacy_router())
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'path':<10} {'cache':<5} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+        for cold in (True, False):
+            for name, path in (("legacy", "/legacy/courses"), ("bytes", "/api/courses")):
+                await _measure(client, path, 100, cold)  # warm-up / fill
+                samples = await _measure(client, path, requests, cold)
+                print(
+                    f"{name:<10} {'cold' if cold else 'warm':<5} "
+                    f"{_percentile(samples, 50):>8.3f} {_percentile(samples, 99):>8.3f} "
+                    f"{statistics.mean(samples):>8.3f}"
+                )
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--requests", type=int, default=2000)
+    args = ap.parse_args()
+    asyncio.run(main(args.rows, args.requests))
@@ -0,0 +1,86 @@
+"""CSV parse + validate throughput: serial vs `parse_parallel` per worker count.
+
+Only parsing is timed (rows are consumed as the single writer would receive
+them, without the database), so the figures show how far parsing scales
+with cores; the end-to-end ingest is then bounded by the writer. Results
+are unpickled on one process, so the speedup levels off at about serial
+time / receive time, printed as the ceiling. On a single core the pool
+is slower than serial parsing (pickling and IPC, nothing to overlap).
+
+    cd backend && python -m benchmarks.bench_ingest_parse --rows 500000 --workers 1,2,4,8
+"""
+import argparse
+import csv
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import ingestion, parsing  # noqa: E402
+from app.settings import settings  # noqa: E402
+from benchmarks.datagen import write_csv  # noqa: E402
+
+
+def _drain(parsed) -> int:
+    n = 0
+    for _, row in parsed:
+        n += 1
+    return n
+
+
+def _serial(path: str) -> int:
+    with open(path, "rb") as f:
+        reader = csv.DictReader(ingestion.iter_lines(f, settings.INGEST_CHUNK_SIZE))
+        return _drain(ingestion.parse_rows(reader))
+
+
+def _parallel(path: str, workers: int) -> int:
+    with open(path, "rb") as f:
+        return _drain(ingestion.parse_parallel(f, workers))
+
+
+def _receive_seconds(path: str) -> float:
+    """Time the parent spends unpickling every block's results."""
+    with open(path, "rb") as f:
+        blocks = parsing.split_blocks(f, settings.INGEST_BLOCK_SIZE)
+        header, rest = parsing.read_header(next(blocks))
+        blobs = [pickle.dumps(parsing.parse_block(header, b)) for b in [rest, *blocks]]
+    started = time.perf_counter()
+    for blob in blobs:
+        pickle.loads(blob)
+    return time.perf_counter() - started
+
+
+def _best(fn, repeat: int) -> tuple:
+    best, n = float("inf"), 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        n = fn()
+        best = min(best, time.perf_counter() - started)
+    return n, best
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=200000)
+    ap.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    ap.add_argument("--block-size", type=int, default=settings.INGEST_BLOCK_SIZE)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    settings.INGEST_BLOCK_SIZE = args.block_size
+
+    path = write_csv(os.path.join(tempfile.mkdtemp(), "courses.csv"), args.rows)
+    size_mb = os.path.getsize(path) / 1e6
+    print(f"{args.rows} rows, {size_mb:.1f} MB, {os.cpu_count()} CPUs, blocks of {args.block_size} bytes")
+
+    n, base = _best(lambda: _serial(path), args.repeat)
+    print(f"{'serial':>10}  {n / base:>12,.0f} rows/s  {size_mb / base:7.1f} MB/s  1.00x")
+    print(f"{'ceiling':>10}  {base / _receive_seconds(path):.1f}x (results are received by one process)")
+    for workers in (int(w) for w in args.workers.split(",")):
+        _parallel(path, workers)  # untimed: workers are spawned on demand
+        n, took = _best(lambda: _parallel(path, workers), args.repeat)
+        print(f"{workers:>7} wk  {n / took:>12,.0f} rows/s  {size_mb / took:7.1f} MB/s  {base / took:.2f}x")
+    ingestion.shutdown_parse_pool()
@@ -0,0 +1,115 @@
+"""Throughput of /api/ask question parsing.
+
+Compares the previous per-call regex parser (reproduced below), the compiled
+parser without memoization, and `parse_question` with its LRU.
+
+    cd backend && python -m benchmarks.bench_nl_parser --questions 50000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import nl_parser  # noqa: E402
+from app.utils.nl_parser import DELV_MAP, LEVEL_MAP, parse_money  # noqa: E402
+
+TEMPLATES = [
+    "Show {dept} courses",
+    "{level} {mode} {dept} courses under {fee}k",
+    "{dept} courses rated at least {rating} for {topic}",
+    "{mode} {level} {dept} with credits {credits} weeks under {weeks}",
+    "tuition below {fee}000 {dept} offered {year}",
+    "{rating}+ rating {dept} courses about {topic}",
+]
+DEPTS = ["cs", "computer", "math", "mathematics", "economics", "business", "psychology"]
+TOPICS = ["machine learning", "data science", "finance", "statistics", "cognition"]
+
+
+def _legacy_parse(q):
+    """The parser before patterns were compiled (keyword/numeric logic only)."""
+    ql = q.lower()
+    out = {}
+    fee = None
+    m = re.search(r"(under|below|less than|<=?)\s*([\d,\.]+)\s*(k|lakh|lac|thousand|inr|rs|₹)?", ql)
+    if m:
+        val, unit = float(m.group(2).replace(",", "")), (m.group(3) or "").lower()
+        fee = int(val * 100000) if unit in ["lakh", "lac"] else int(val * 1000) if unit in ["k", "thousand"] else int(val)
+    elif re.search(r"(fee|tuition)", ql):
+        fee = parse_money(ql)
+    if fee:
+        out["max_fee"] = fee
+    m = re.search(r"(?:rating|rated)\s*(?:>=|at least|above)?\s*(\d(?:\.\d)?)", ql)
+    if m:
+        out["min_rating"] = float(m.group(1))
+    else:
+        m2 = re.search(r"(\d(?:\.\d)?)\s*\+\s*rating", ql)
+        if m2:
+            out["min_rating"] = float(m2.group(1))
+    for k, v in LEVEL_MAP.items():
+        if re.search(rf"\b{k}\b", ql):
+            out["level"] = v
+            break
+    for k, v in DELV_MAP.items():
+        if re.search(rf"\b{k}\b", ql):
+            out["delivery_mode"] = v
+            break
+    for w in DEPTS:
+        if re.search(rf"\b{w}\b", ql):
+            out["department"] = nl_parser.DEPT_MAP[w]
+            break
+    m = re.search(r"(?:credits?)\s*(?:>=|at least)?\s*(\d+)", ql)
+    if m:
+        out["min_credits"] = int(m.group(1))
+    m = re.search(r"(?:weeks?)\s*(?:<=|under|less than)?\s*(\d+)", ql)
+    if m and ("under" in ql or "less than" in ql or "<=" in ql):
+        out["max_duration_weeks"] = int(m.group(1))
+    m = re.search(r"(?:year|offered)\s*(\d{4})", ql)
+    if m:
+        out["year"] = int(m.group(1))
+    m = re.search(r"(?:about|on|for)\s+([a-zA-Z ]{3,})$", ql)
+    if m:
+        out["q"] = m.group(1).strip()
+    return out
+
+
+def corpus(n, distinct, seed=7):
+    rnd = random.Random(seed)
+    pool = [
+        rnd.choice(TEMPLATES).format(
+            dept=rnd.choice(DEPTS), level=rnd.choice(list(LEVEL_MAP)), mode=rnd.choice(list(DELV_MAP)),
+            fee=rnd.randint(10, 99), rating=rnd.choice(["3.5", "4", "4.5"]), topic=rnd.choice(TOPICS),
+            credits=rnd.randint(2, 5), weeks=rnd.randint(4, 16), year=rnd.choice([2023, 2024, 2025]),
+        )
+        for _ in range(distinct)
+    ]
+    return [rnd.choice(pool) for _ in range(n)]
+
+
+def run(name, fn, questions):
+    started = time.perf_counter()
+    for q in questions:
+        fn(q)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<22} {len(questions) / elapsed:>12,.0f} q/s  {elapsed * 1e6 / len(questions):>8.2f} µs/q")
+
+
+def main(n, distinct):
+    questions = corpus(n, distinct)
+    mismatches = sum(_legacy_parse(q) != nl_parser.parse_question(q) for q in set(questions))
+    print(f"{n} questions, {distinct} distinct, {mismatches} parse mismatches vs legacy")
+    run("legacy (per-call re)", _legacy_parse, questions)
+    run("compiled", lambda q: nl_parser._parse(nl_parser.normalize(q), nl_parser._vocab), questions)
+    nl_parser._parse_cached.cache_clear()
+    run("compiled + LRU", nl_parser.parse_question, questions)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--questions", type=int, default=50000)
+    ap.add_argument("--distinct", type=int, default=500)
+    args = ap.parse_args()
+    main(args.questions, args.distinct)
@@ -0,0 +1,74 @@
+"""Synthetic course catalogs in the `sample_data/courses.csv` schema.
+
+Rows are generated and written one at a time, so multi-million-row files
+need constant memory. A fixed seed gives identical files across runs.
+
+    cd backend && python -m benchmarks.datagen --rows 100000 --out /tmp/courses_100k.csv
+"""
+import argparse
+import csv
+import random
+import sys
+from typing import Dict, Iterator, List
+
+COLUMNS = [
+    "course_id", "course_name", "department", "level", "delivery_mode",
+    "credits", "duration_weeks", "rating", "tuition_fee_inr", "year_offered",
+]
+
+TOPICS: Dict[str, List[str]] = {
+    "CS": ["Algorithms", "Data Structures", "Operating Systems", "Machine Learning", "Databases",
+           "Computer Networks", "Cloud Computing", "Cyber Security", "Web Development", "Compilers"],
+    "Math": ["Calculus", "Linear Algebra", "Probability", "Discrete Math", "Number Theory", "Topology"],
+    "Physics": ["Classical Mechanics", "Electromagnetism", "Quantum Mechanics", "Thermodynamics", "Optics"],
+    "Business": ["Finance", "Accounting", "Marketing", "Entrepreneurship", "Management", "Operations"],
+    "Economics": ["Microeconomics", "Macroeconomics", "Econometrics", "Game Theory", "Development Economics"],
+    "Psychology": ["Cognitive Science", "Social Psychology", "Behavioral Neuroscience", "Psychology"],
+    "Biology": ["Genetics", "Molecular Biology", "Biochemistry", "Evolutionary Biology", "Ecology"],
+    "Chemistry": ["Organic Chemistry", "Inorganic Chemistry", "Physical Chemistry", "Analytical Chemistry"],
+    "Engineering": ["Electrical Circuits", "Mechanical Design", "Civil Engineering", "Robotics"],
+    "Philosophy": ["Philosophy of Mind", "Philosophy of Science", "Ethics", "Logic"],
+}
+PREFIXES = ["", "Intro to ", "Advanced ", "Applied ", "Foundations of ", "Topics in "]
+MODES = ["online", "offline", "hybrid"]
+YEARS = [2023, 2024, 2025]
+
+
+def generate(rows: int, seed: int = 42, start_id: int = 1) -> Iterator[Dict[str, object]]:
+    rnd = random.Random(seed)
+    departments = list(TOPICS)
+    for i in range(rows):
+        dept = rnd.choice(departments)
+        yield {
+            "course_id": start_id + i,
+            "course_name": f"{rnd.choice(PREFIXES)}{rnd.choice(TOPICS[dept])} {rnd.randint(100, 599)}",
+            "department": dept,
+            "level": "PG" if rnd.random() < 0.35 else "UG",
+            "delivery_mode": rnd.choice(MODES),
+            "credits": rnd.randint(2, 5),
+            "duration_weeks": rnd.choice([6, 8, 10, 12, 14, 16]),
+            "rating": round(rnd.triangular(2.5, 5.0, 4.1), 1),
+            "tuition_fee_inr": rnd.randrange(10000, 150001, 5000),
+            "year_offered": rnd.choice(YEARS),
+        }
+
+
+def write_csv(path: str, rows: int, seed: int = 42) -> str:
+    out = sys.stdout if path == "-" else open(path, "w", newline="", encoding="utf-8")
+    try:
+        writer = csv.DictWriter(out, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(generate(rows, seed))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return path
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=10000)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", default="-", help="CSV path, or - for stdout")
+    args = ap.parse_args()
+    write_csv(args.out, args.rows, args.seed)
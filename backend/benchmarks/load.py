@@ -0,0 +1,316 @@
+"""Load and latency benchmark for the CourseQuest Lite API.
+
+Generates a synthetic catalog (`benchmarks.datagen`), loads it, then drives
+/api/courses, /api/ask, /api/compare and /api/meta with concurrent clients,
+either in-process (httpx ASGITransport, no sockets) or over HTTP against a
+`uvicorn app.main:app` subprocess. Every endpoint gets a cold pass (fresh
+cache generation, row cache cleared, each request a distinct key) followed by
+a warm pass replaying the same requests. Throughput and p50/p95/p99 go to
+stdout and to a JSON file; `--baseline` prints the change against an earlier
+run.
+
+    cd backend
+    python -m benchmarks.load --rows 10000 --concurrency 16 --out bench.json
+    python -m benchmarks.load --mode uvicorn --workers 2 --rows 1000000 --ingest direct --baseline bench.json
+
+Multi-worker runs need REDIS_URL: without it every worker has its own cache
+and catalog generation, so the cold pass only resets one of them.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks import datagen  # noqa: E402
+from benchmarks.bench_nl_parser import corpus as ask_corpus  # noqa: E402
+
+ENDPOINTS = ("courses", "ask", "compare", "meta")
+# Settings worth recording with each run (only those set in the environment).
+RECORDED_ENV = (
+    "CATALOG_INDEX", "SEARCH_MODE", "ASYNC_DB", "CACHE_STALE_TTL", "CACHE_LOCK", "LOCAL_CACHE_MAX_ENTRIES",
+    "DB_POOL_SIZE", "DB_MAX_OVERFLOW", "INGEST_BATCH_SIZE", "REDIS_URL",
+)
+
+Request = Tuple[str, str, Optional[Dict[str, Any]]]  # (method, url, json body)
+
+
+# -----------------------
+# Workloads
+# -----------------------
+def workload(endpoint: str, n: int, rows: int, seed: int = 1) -> List[Request]:
+    """`n` requests for `endpoint`; distinct where the endpoint allows it."""
+    rnd = random.Random(seed)
+    if endpoint == "courses":
+        reqs, seen = [], set()
+        while len(reqs) < n:
+            params = {"page": rnd.randint(1, 5), "page_size": 20}
+            if rnd.random() < 0.6:
+                params["department"] = rnd.choice(list(datagen.TOPICS))
+            if rnd.random() < 0.4:
+                params["level"] = rnd.choice(["UG", "PG"])
+            if rnd.random() < 0.3:
+                params["delivery_mode"] = rnd.choice(datagen.MODES)
+            if rnd.random() < 0.5:
+                params["max_fee"] = rnd.randrange(20000, 150001, 5000)
+            if rnd.random() < 0.3:
+                params["min_rating"] = rnd.choice([3.5, 4.0, 4.5])
+            if rnd.random() < 0.2:
+                params["q"] = rnd.choice(["intro", "advanced", "learning", "theory", "chem"])
+            url = "/api/courses?" + "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+            if url not in seen or len(seen) > 50 * n:
+                seen.add(url)
+                reqs.append(("GET", url, None))
+        return reqs
+    if endpoint == "ask":
+        questions = list(dict.fromkeys(ask_corpus(n * 4, distinct=n * 2, seed=seed)))[:n]
+        return [("POST", "/api/ask", {"question": q}) for q in questions]
+    if endpoint == "compare":
+        return [
+            ("GET", "/api/compare?ids=" + ",".join(str(rnd.randint(1, rows)) for _ in range(rnd.randint(2, 4))), None)
+            for _ in range(n)
+        ]
+    if endpoint == "meta":
+        return [("GET", "/api/meta", None)] * n
+    raise ValueError(f"unknown endpoint {endpoint!r}")
+
+
+# -----------------------
+# Measurement
+# -----------------------
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+async def run_phase(client, requests: List[Request], concurrency: int) -> Dict[str, Any]:
+    """Send `requests` with `concurrency` clients; latency stats in ms."""
+    queue: asyncio.Queue = asyncio.Queue()
+    for r in requests:
+        queue.put_nowait(r)
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                method, url, body = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                resp = await client.request(method, url, json=body)
+                ok = resp.status_code < 400
+            except Exception:
+                ok = False
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(requests),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(requests) / elapsed, 1) if elapsed else None,
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+
+async def reset_caches(client, token: str):
+    """New catalog generation + dropped row cache: the next pass starts cold."""
+    headers = {"x-admin-token": token}
+    await client.post("/api/cache/clear", headers=headers)
+    await client.post("/api/cache/clear", params={"prefix": "row:"}, headers=headers)
+
+
+async def load_catalog_api(client, csv_path: str, token: str, rows: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    with open(csv_path, "rb") as f:
+        resp = await client.post(
+            "/api/ingest", headers={"x-ingest-token": token}, files={"file": ("bench.csv", f, "text/csv")},
+        )
+    resp.raise_for_status()
+    seconds = time.perf_counter() - started
+    return {"via": "api", "rows": rows, "seconds": round(seconds, 3), "rows_per_s": round(rows / seconds, 1)}
+
+
+def load_catalog_direct(csv_path: str, rows: int) -> Dict[str, Any]:
+    """Ingest in this process (bypasses HTTP; for catalogs too large to upload)."""
+    from app.database import Base, SessionLocal, engine
+    from app.ingestion import ingest_file, invalidate_catalog
+
+    Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    with SessionLocal() as db, open(csv_path, "rb") as f:
+        ingest_file(db, f)
+        invalidate_catalog(db)
+    seconds = time.perf_counter() - started
+    return {"via": "direct", "rows": rows, "seconds": round(seconds, 3), "rows_per_s": round(rows / seconds, 1)}
+
+
+async def drive(client, args, csv_path: str, token: str) -> Dict[str, Any]:
+    report: Dict[str, Any] = {"results": []}
+    if args.ingest == "api":
+        report["ingest"] = await load_catalog_api(client, csv_path, token, args.rows)
+        print(f"ingest   {args.rows} rows in {report['ingest']['seconds']}s ({report['ingest']['rows_per_s']} rows/s)")
+    for endpoint in args.endpoints:
+        requests = workload(endpoint, args.requests, args.rows)
+        await reset_caches(client, token)
+        for phase in ("cold", "warm"):
+            stats = await run_phase(client, requests, args.concurrency)
+            report["results"].append({"endpoint": endpoint, "phase": phase, **stats})
+            print(
+                f"{endpoint:<8} {phase:<5} {stats['throughput_rps']:>9} rps  p50 {stats['p50_ms']:>8.2f}  "
+                f"p95 {stats['p95_ms']:>8.2f}  p99 {stats['p99_ms']:>8.2f} ms  errors {stats['errors']}"
+            )
+    return report
+
+
+# -----------------------
+# Targets
+# -----------------------
+async def run_inprocess(args, csv_path: str) -> Dict[str, Any]:
+    import httpx
+    from app.main import app
+    from app.settings import settings
+
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            return await drive(client, args, csv_path, settings.INGEST_TOKEN)
+    finally:
+        await app.router.shutdown()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run_uvicorn(args, csv_path: str) -> Dict[str, Any]:
+    import httpx
+    from app.settings import settings
+
+    port = args.port or _free_port()
+    cmd = [
+        sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(args.workers), "--log-level", "warning",
+    ]
+    server = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=os.environ.copy())
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits) as client:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    if (await client.get("/api/ready")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError("uvicorn did not become ready")
+                await asyncio.sleep(0.2)
+            return await drive(client, args, csv_path, settings.INGEST_TOKEN)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+# -----------------------
+# Reporting
+# -----------------------
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def print_baseline_diff(report: Dict[str, Any], baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["endpoint"], r["phase"]): r for r in json.load(f)["results"]}
+    print(f"\nvs {baseline_path}:")
+    for r in report["results"]:
+        old = baseline.get((r["endpoint"], r["phase"]))
+        if not old:
+            continue
+        delta = lambda k: (r[k] - old[k]) / old[k] * 100 if old[k] else 0.0  # noqa: E731
+        print(
+            f"{r['endpoint']:<8} {r['phase']:<5} rps {delta('throughput_rps'):+6.1f}%  "
+            f"p50 {delta('p50_ms'):+6.1f}%  p99 {delta('p99_ms'):+6.1f}%"
+        )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    ap.add_argument("--rows", type=int, default=10000, help="synthetic catalog size (10k-5M)")
+    ap.add_argument("--csv", help="use this catalog CSV instead of generating one")
+    ap.add_argument("--requests", type=int, default=500, help="requests per endpoint and phase")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    ap.add_argument("--ingest", choices=["api", "direct"], default="api",
+                    help="load via POST /api/ingest (timed) or in this process before starting")
+    ap.add_argument("--database-url", help="default: a fresh SQLite file in a temp directory")
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn workers (--mode uvicorn)")
+    ap.add_argument("--port", type=int, default=0)
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--baseline", help="earlier JSON report to compare against")
+    args = ap.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="coursequest-bench-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    csv_path = args.csv
+    if not csv_path:
+        csv_path = datagen.write_csv(os.path.join(workdir, "courses.csv"), args.rows)
+        print(f"generated {args.rows} rows -> {csv_path}")
+
+    ingest = load_catalog_direct(csv_path, args.rows) if args.ingest == "direct" else None
+    runner = run_inprocess if args.mode == "inprocess" else run_uvicorn
+    report = asyncio.run(runner(args, csv_path))
+    if ingest:
+        report["ingest"] = ingest
+
+    report["meta"] = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "mode": args.mode,
+        "workers": args.workers if args.mode == "uvicorn" else None,
+        "rows": args.rows,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+        "python": platform.python_version(),
+        "env": {k: os.environ[k] for k in RECORDED_ENV if k in os.environ},
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwrote {args.out}")
+    if args.baseline:
+        print_baseline_diff(report, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
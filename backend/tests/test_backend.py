@@ -1,4 +1,5 @@
 # backend/tests/test_backend.py
+import gzip
 import os, sys
 import pytest
 from fastapi.testclient import TestClient
@@ -17,6 +18,7 @@ from app.main import app
 from app.database import Base, get_db
 from app.models import Course
 from app.settings import settings
+from app import cache
 
 # ------------------------
 # Shared in-memory SQLite
@@ -49,6 +51,7 @@ client = TestClient(app)
 # ------------------------
 @pytest.fixture(autouse=True)
 def setup_test_db():
+    cache.cache_store.clear()  # the DB is rebuilt per test, so cached results are too
     Base.metadata.create_all(bind=engine)
     db = TestingSessionLocal()
     course = Course(
@@ -148,3 +151,938 @@ def test_admin_cache_clear():
     assert r.status_code == 200
     data = r.json()
     assert data["status"] == "ok"
+
+
+def test_ingest_csv_batched_upsert(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_BATCH_SIZE", 2)
+    csv_file = tmp_path / "batched.csv"
+    csv_file.write_text(
+        "course_id,course_name,department,level,delivery_mode,credits,duration_weeks,rating,tuition_fee_inr,year_offered\n"
+        "999,Test Course Renamed,CS,UG,online,4,12,4.5,10000,2025\n"
+        "2001,Batch One,Math,PG,hybrid,3,10,3.9,20000,2024\n"
+        "2002,Batch Two,Math,PG,hybrid,3,10,3.8,21000,2024\n"
+    )
+
+    with open(csv_file, "rb") as f:
+        r = client.post(
+            "/api/ingest",
+            headers={"x-ingest-token": settings.INGEST_TOKEN},
+            files={"file": ("batched.csv", f, "text/csv")},
+        )
+
+    assert r.status_code == 200
+    data = r.json()
+    assert data["ingested"] == 3
+    assert [b["rows"] for b in data["batches"]] == [2, 1]
+
+    db = TestingSessionLocal()
+    try:
+        assert db.query(Course).count() == 3
+        updated = db.query(Course).filter(Course.course_id == 999).one()
+        assert updated.course_name == "Test Course Renamed"
+        assert updated.rating == 4.5
+    finally:
+        db.close()
+
+
+def test_ingest_reports_bad_rows(tmp_path):
+    csv_file = tmp_path / "bad.csv"
+    csv_file.write_text(
+        "course_id,course_name,department,level,delivery_mode,credits,duration_weeks,rating,tuition_fee_inr,year_offered\n"
+        "3001,Good Row,CS,UG,online,3,8,4.0,15000,2025\n"
+        "3002,Bad Credits,CS,UG,online,three,8,4.0,15000,2025\n"
+        "3003,Missing Fee,CS,UG,online,3,8,4.0,,2025\n"
+    )
+
+    with open(csv_file, "rb") as f:
+        r = client.post(
+            "/api/ingest",
+            headers={"x-ingest-token": settings.INGEST_TOKEN},
+            files={"file": ("bad.csv", f, "text/csv")},
+        )
+
+    assert r.status_code == 200
+    data = r.json()
+    assert data["ingested"] == 1
+    assert data["failed"] == 2
+    assert [e["line"] for e in data["errors"]] == [3, 4]
+    assert "credits" in data["errors"][0]["error"]
+
+
+def test_auto_ingest_background_progress():
+    from app import ingestion
+
+    sample = os.path.join(os.path.dirname(__file__), "..", "..", "sample_data", "courses.csv")
+    ingestion._run_auto_ingest(TestingSessionLocal, sample)
+    assert ingestion.auto_ingest_status["state"] == "done"
+    assert ingestion.auto_ingest_status["ingested"] > 0
+
+    r = client.get("/api/ready")
+    assert r.status_code == 200
+    assert r.json()["ready"] is True
+
+    ingestion.auto_ingest_status["state"] = "running"
+    try:
+        assert client.get("/api/ready").status_code == 503
+    finally:
+        ingestion.auto_ingest_status["state"] = "done"
+
+
+def test_facet_materialization_runs_in_background_then_auto_ingest():
+    from app import facets
+    from app.models import CourseFacet
+
+    order = []
+    facets._run_materialize(TestingSessionLocal, then=lambda: order.append(facets.materialize_status["state"]))
+    assert order == ["done"]  # the follow-up (auto-ingest) starts after the rebuild
+    with TestingSessionLocal() as db:
+        assert db.query(CourseFacet).filter_by(facet="department", value="CS").one().count == 1
+
+    r = client.get("/api/ready")
+    assert r.status_code == 200 and r.json()["facets"]["state"] == "done"
+    facets.materialize_status["state"] = "running"
+    try:
+        assert client.get("/api/ready").status_code == 503
+    finally:
+        facets.materialize_status["state"] = "done"
+
+
+def _seed_catalog(db, n=40):
+    depts, levels, modes = ["CS", "Math", "Physics"], ["UG", "PG"], ["online", "offline", "hybrid"]
+    for i in range(n):
+        db.add(Course(
+            course_id=5000 + i,
+            course_name=f"{['Intro to', 'Advanced', 'Applied'][i % 3]} Topic {i}",
+            department=depts[i % 3],
+            level=levels[i % 2],
+            delivery_mode=modes[(i // 2) % 3],
+            credits=2 + i % 4,
+            duration_weeks=6 + i % 10,
+            rating=round(3.0 + (i % 5) * 0.4, 1),
+            tuition_fee_inr=10000 + (i % 7) * 5000,
+            year_offered=2023 + i % 3,
+        ))
+    db.commit()
+
+
+def test_catalog_index_matches_sql(monkeypatch):
+    pytest.importorskip("numpy")
+    from app import cache, catalog_index, crud
+
+    db = TestingSessionLocal()
+    _seed_catalog(db)
+    cases = [
+        {},
+        {"department": "CS"},
+        {"level": "PG", "delivery_mode": "online"},
+        {"q": "advanced", "min_rating": 3.5},
+        {"max_fee": 25000, "min_credits": 3, "max_credits": 4},
+        {"min_duration_weeks": 8, "max_duration_weeks": 12, "year": 2024},
+        {"department": "Nope"},
+    ]
+    try:
+        for params in cases:
+            for page in (1, 2):
+                cache.cache_store.clear()
+                monkeypatch.setattr(settings, "CATALOG_INDEX", 0)
+                sql_items, sql_total = crud.list_courses(db, params, page, 7)
+
+                cache.cache_store.clear()
+                monkeypatch.setattr(settings, "CATALOG_INDEX", 1)
+                idx_items, idx_total = crud.list_courses(db, params, page, 7)
+
+                assert idx_total == sql_total
+                assert idx_items == sql_items
+    finally:
+        catalog_index.reset()
+        cache.cache_store.clear()
+        db.close()
+
+
+def test_keyset_pagination_matches_offset():
+    db = TestingSessionLocal()
+    _seed_catalog(db)
+    db.close()
+
+    offset_ids = []
+    for page in range(1, 10):
+        data = client.get(f"/api/courses?page={page}&page_size=6&level=UG").json()
+        offset_ids += [c["id"] for c in data["items"]]
+    total = data["total"]
+
+    keyset_ids, cursor = [], ""
+    while cursor is not None:
+        r = client.get("/api/courses", params={"page_size": 6, "level": "UG", "cursor": cursor})
+        assert r.status_code == 200
+        data = r.json()
+        assert data["total"] is None
+        keyset_ids += [c["id"] for c in data["items"]]
+        cursor = data["next_cursor"]
+
+    assert keyset_ids == offset_ids
+    assert len(keyset_ids) == total
+
+    r = client.get("/api/courses", params={"cursor": "", "level": "UG", "include_total": "true"})
+    assert r.json()["total"] == total
+
+
+def test_count_strategies(monkeypatch):
+    from app import cache, crud, facets
+
+    db = TestingSessionLocal()
+    _seed_catalog(db)  # 40 rows + the seeded course
+    params = {"level": "UG", "min_rating": 3.5}
+    try:
+        expected = crud.count_courses(db, params)
+        cache.cache_store.clear()
+        monkeypatch.setattr(settings, "COUNT_STRATEGY", "exact")
+        for page in (1, 2, 99):
+            items, total, exact = crud.list_courses_counted(db, params, page, 7)
+            assert (total, exact) == (expected, True)
+            assert items == crud.list_courses(db, params, page, 7)[0]
+            assert all("_total" not in r for r in items)
+
+        assert facets.estimate(db, {}) == 41
+        assert facets.estimate(db, {"department": "Math"}) == 13
+        assert facets.estimate(db, {"q": "intro"}) is None
+        cache.cache_store.clear()
+        monkeypatch.setattr(settings, "COUNT_STRATEGY", "estimate")
+        monkeypatch.setattr(settings, "COUNT_ESTIMATE_THRESHOLD", 1000)
+        assert crud.total_courses(db, {"department": "CS"}) == (15, True)  # small: counted
+    finally:
+        db.close()
+
+    monkeypatch.setattr(settings, "COUNT_ESTIMATE_THRESHOLD", 10)
+    cache.cache_store.clear()
+    data = client.get("/api/courses", params={"page_size": 5}).json()
+    assert data["total_exact"] is False and data["total"] == 41
+    assert data["next_cursor"] is not None
+    data = client.get("/api/courses", params={"q": "intro"}).json()  # no estimate for text search
+    assert data["total_exact"] is True and data["total"] == 14
+
+    # An exact count cached for the filter set wins over an estimate.
+    monkeypatch.setattr(settings, "COUNT_STRATEGY", "cached")
+    cache.cache_store.clear()
+    assert client.get("/api/courses", params={"level": "PG"}).json()["total_exact"] is True
+    monkeypatch.setattr(settings, "COUNT_STRATEGY", "estimate")
+    r = client.get("/api/courses", params={"cursor": "", "level": "PG", "include_total": "true"})
+    assert r.json()["total_exact"] is True and r.json()["total"] == 20
+
+
+def test_unknown_count_strategy_fails_at_startup():
+    from pydantic import ValidationError
+    from app.settings import Settings
+
+    assert Settings(COUNT_STRATEGY="estimate").COUNT_STRATEGY == "estimate"
+    for bad in ("exact ", "Estimate", "approx"):
+        with pytest.raises(ValidationError):
+            Settings(COUNT_STRATEGY=bad)
+
+
+def test_keyset_invalid_cursor():
+    r = client.get("/api/courses", params={"cursor": "not-a-cursor"})
+    assert r.status_code == 400
+
+
+def test_catalog_index_keyset_matches_sql(monkeypatch):
+    pytest.importorskip("numpy")
+    from app import catalog_index, crud
+
+    db = TestingSessionLocal()
+    _seed_catalog(db)
+    try:
+        for params in ({}, {"department": "Math"}, {"max_fee": 30000}):
+            walks = []
+            for enabled in (0, 1):
+                monkeypatch.setattr(settings, "CATALOG_INDEX", enabled)
+                ids, after = [], None
+                while True:
+                    items, nxt = crud.list_courses_after(db, params, after, 5)
+                    ids += [c["id"] for c in items]
+                    if nxt is None:
+                        break
+                    after = crud.decode_cursor(nxt)
+                walks.append(ids)
+            assert walks[0] == walks[1]
+    finally:
+        catalog_index.reset()
+        db.close()
+
+
+def test_fulltext_search_with_relevance(monkeypatch):
+    from app import search
+
+    monkeypatch.setattr(settings, "SEARCH_MODE", "fulltext")
+    db = TestingSessionLocal()
+    for i, name in enumerate(["Intro to Statistics", "Statistical Learning", "Applied Statistics Lab"]):
+        db.add(Course(
+            course_id=7000 + i, course_name=name, department="Math", level="UG",
+            delivery_mode="online", credits=3, duration_weeks=8, rating=3.0 + i,
+            tuition_fee_inr=10000, year_offered=2025,
+        ))
+    db.commit()
+    db.close()
+    search.reset()
+    try:
+        r = client.get("/api/courses", params={"q": "statistcs", "sort": "relevance"})
+        assert r.status_code == 200
+        names = [c["course_name"] for c in r.json()["items"]]
+        # One-typo match on "statistics"; equal relevance falls back to rating desc.
+        assert names == ["Applied Statistics Lab", "Intro to Statistics"]
+
+        r = client.get("/api/courses", params={"q": "stat", "sort": "relevance"})
+        assert r.json()["total"] == 3
+
+        r = client.get("/api/courses", params={"q": "stat", "sort": "relevance", "cursor": ""})
+        assert r.status_code == 400
+    finally:
+        search.reset()
+
+
+def test_fulltext_search_beyond_sqlite_variable_limit(monkeypatch):
+    from app import crud, search
+
+    monkeypatch.setattr(settings, "SEARCH_MODE", "fulltext")
+    import sqlite3
+
+    n = 33000
+    db = TestingSessionLocal()
+    raw = db.connection().connection.driver_connection
+    # Distro builds raise the limit; pin SQLite's default (32766) so n matches exceed it.
+    previous = raw.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 32766)
+    rows = [dict(course_id=20000 + i, course_name=f"Intro to Data {i}", department="CS", level="UG",
+                 delivery_mode="online", credits=3, duration_weeks=8, rating=3.0 + (i % 20) / 10,
+                 tuition_fee_inr=10000 + i, year_offered=2025) for i in range(n)]
+    for i in range(0, n, 2000):
+        crud.upsert_courses(db, rows[i:i + 2000])
+    db.commit()
+    search.reset()
+    try:
+        items, total = crud.list_courses(db, {"q": "data"}, 1, 10)
+        assert total == n and items[0]["rating"] == 4.9
+        items, total = crud.list_courses(db, {"q": "data 123", "sort": "relevance"}, 1, 3)
+        # "123" matches exactly once and as a prefix of 1230-1239, 12300-12399
+        assert total == 111 and items[0]["course_name"] == "Intro to Data 123"
+    finally:
+        raw.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, previous)
+        search.reset()
+        db.close()
+
+
+def test_run_db_with_async_session(tmp_path):
+    pytest.importorskip("aiosqlite")
+    import asyncio
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from app import crud
+    from app.database import async_database_url, run_db
+
+    url = async_database_url(f"sqlite:///{tmp_path / 'async.db'}")
+    assert url.startswith("sqlite+aiosqlite://")
+
+    async def scenario():
+        aengine = create_async_engine(url)
+        async with aengine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with async_sessionmaker(aengine, expire_on_commit=False)() as db:
+            db.add(Course(
+                course_id=8001, course_name="Async Course", department="CS", level="PG",
+                delivery_mode="online", credits=3, duration_weeks=8, rating=4.9,
+                tuition_fee_inr=1000, year_offered=2025,
+            ))
+            await db.commit()
+            items, total = await run_db(db, crud.list_courses, {"level": "PG"}, 1, 10)
+            meta = await run_db(db, crud.meta)
+        await aengine.dispose()
+        return items, total, meta
+
+    items, total, meta = asyncio.run(scenario())
+    assert total == 1 and items[0]["course_name"] == "Async Course"
+    assert meta["levels"] == ["PG"]
+
+
+def test_ingest_bumps_catalog_generation(tmp_path):
+    assert client.get("/api/courses").json()["total"] == 1  # now cached
+
+    csv_file = tmp_path / "gen.csv"
+    csv_file.write_text(
+        "course_id,course_name,department,level,delivery_mode,credits,duration_weeks,rating,tuition_fee_inr,year_offered\n"
+        "4001,Generation Course,Math,PG,online,3,8,4.0,15000,2025\n"
+    )
+    with open(csv_file, "rb") as f:
+        r = client.post(
+            "/api/ingest",
+            headers={"x-ingest-token": settings.INGEST_TOKEN},
+            files={"file": ("gen.csv", f, "text/csv")},
+        )
+    version = r.json()["catalog_version"]
+    assert version["current"] == version["previous"] + 1
+    assert client.get("/api/courses").json()["total"] == 2
+
+    r = client.post("/api/cache/clear", headers={"x-admin-token": settings.INGEST_TOKEN})
+    data = r.json()
+    assert data["previous_generation"] == version["current"]
+    assert data["generation"] == version["current"] + 1
+
+
+def test_ask_batch_matches_single_asks():
+    db = TestingSessionLocal()
+    _seed_catalog(db)
+    db.close()
+
+    questions = [
+        "Show CS courses",
+        "PG online math courses",
+        "show  cs courses",  # same normalized question as the first
+        "ug physics rated at least 4",
+        "Show Biology courses",
+    ]
+    r = client.post("/api/ask/batch", json={"questions": questions})
+    assert r.status_code == 200
+    items = r.json()["items"]
+    assert [i["question"] for i in items] == questions
+    assert not any(i["cached"] for i in items)
+    assert items[0]["response"] == items[2]["response"]
+
+    # Single asks now hit the entries the batch stored; compare with fresh answers.
+    singles = [client.post("/api/ask", json={"question": q}).json() for q in questions]
+    cache.cache_store.clear()
+    fresh = [client.post("/api/ask", json={"question": q}).json() for q in questions]
+    assert [i["response"] for i in items] == singles == fresh
+
+    r = client.post("/api/ask/batch", json={"questions": questions[:2]})
+    assert all(i["cached"] for i in r.json()["items"])
+
+    # Entries are validated like single questions.
+    assert client.post("/api/ask", json={"question": "x"}).status_code == 422
+    r = client.post("/api/ask/batch", json={"questions": ["Show CS courses", "x"]})
+    assert r.status_code == 422 and r.json()["detail"][0]["loc"] == ["body", "questions", 1]
+
+
+def _brute_facets(db, params):
+    from sqlalchemy import select
+    from app import crud, facets
+
+    rows = db.execute(crud.apply_filters(select(*crud.COURSE_COLUMNS), params, db)).mappings()
+    counts = facets._empty()
+    for row in rows:
+        for facet, value in facets.row_facets(row):
+            counts[facet][value] += 1
+    return facets._shape(counts)
+
+
+def test_facets_grouped_pass_matches_rows(monkeypatch):
+    from app import catalog_index, facets
+
+    db = TestingSessionLocal()
+    _seed_catalog(db)
+    cases = [{}, {"department": "CS"}, {"level": "PG", "min_rating": 3.5}, {"q": "applied", "max_fee": 30000}]
+    try:
+        for params in cases:
+            expected = _brute_facets(db, params)
+            assert facets._shape(facets.count(db, params)) == expected
+            if catalog_index.np is not None:
+                monkeypatch.setattr(settings, "CATALOG_INDEX", 1)
+                assert facets._shape(facets.count(db, params)) == expected
+                monkeypatch.setattr(settings, "CATALOG_INDEX", 0)
+        assert expected["total"] == sum(b["count"] for b in expected["rating"])
+    finally:
+        catalog_index.reset()
+        db.close()
+
+
+def test_facets_maintained_incrementally_on_ingest(tmp_path):
+    from app import facets
+
+    header = "course_id,course_name,department,level,delivery_mode,credits,duration_weeks,rating,tuition_fee_inr,year_offered\n"
+    csv_file = tmp_path / "facets.csv"
+    csv_file.write_text(
+        header
+        + "999,Test Course,Math,PG,hybrid,4,12,3.1,60000,2024\n"  # moves the seeded course
+        + "7001,New Course,Math,UG,online,3,8,4.6,20000,2025\n"
+    )
+    with open(csv_file, "rb") as f:
+        client.post("/api/ingest", headers={"x-ingest-token": settings.INGEST_TOKEN},
+                    files={"file": ("facets.csv", f, "text/csv")})
+
+    db = TestingSessionLocal()
+    try:
+        materialized = facets._shape(facets.catalog_counts(db))
+        assert materialized == _brute_facets(db, {})
+        assert materialized["department"] == [{"value": "Math", "count": 2}]
+        assert db.query(facets.CourseFacet).filter_by(facet="department", value="CS").count() == 0
+    finally:
+        db.close()
+
+    r = client.get("/api/facets", params={"level": "UG"})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["total"] == 1
+    assert data["rating"] == [{"min": 4.5, "max": 5.0, "count": 1}]
+    assert data["tuition_fee_inr"] == [{"min": 0, "max": 25000, "count": 1}]
+
+    page = client.get("/api/courses", params={"department": "Math", "include_facets": "true"}).json()
+    assert page["facets"]["total"] == page["total"] == 2
+    assert "facets" not in client.get("/api/courses").json()
+    assert client.get("/api/meta").json()["departments"] == ["Math"]
+
+
+def test_compare_row_cache(monkeypatch, tmp_path):
+    from app import crud
+
+    db = TestingSessionLocal()
+    _seed_catalog(db, n=5)
+    db.close()
+
+    fetched = []
+    real = crud.compare_courses
+    monkeypatch.setattr(crud, "compare_courses", lambda db, ids: fetched.append(sorted(ids)) or real(db, ids))
+
+    data = client.get("/api/compare?ids=5003,999,5001,424242").json()
+    assert [c["course_id"] for c in data] == [5003, 999, 5001]  # request order, unknown id dropped
+    assert fetched == [[999, 5001, 5003, 424242]]
+
+    # A different permutation/superset only queries the ids not cached yet.
+    data = client.get("/api/compare?ids=5001,5002,5003").json()
+    assert [c["course_id"] for c in data] == [5001, 5002, 5003]
+    assert fetched[1:] == [[5002]]
+
+    csv_file = tmp_path / "row.csv"
+    csv_file.write_text(
+        "course_id,course_name,department,level,delivery_mode,credits,duration_weeks,rating,tuition_fee_inr,year_offered\n"
+        "5001,Renamed Course,CS,UG,online,3,8,4.0,15000,2025\n"
+    )
+    with open(csv_file, "rb") as f:
+        client.post("/api/ingest", headers={"x-ingest-token": settings.INGEST_TOKEN},
+                    files={"file": ("row.csv", f, "text/csv")})
+    data = client.get("/api/compare?ids=5003,5001").json()
+    assert [c["course_name"] for c in data][1] == "Renamed Course"
+    assert fetched[2:] == [[5001]]  # only the ingested row was invalidated
+
+
+def test_admin_db_stats():
+    assert client.get("/api/admin/db-stats").status_code == 401
+    r = client.get("/api/admin/db-stats", headers={"x-admin-token": settings.INGEST_TOKEN})
+    assert r.status_code == 200
+    assert "primary" in r.json()["engines"]
+
+
+def test_request_timing_and_metrics():
+    from app import timing
+    from app.timing import TimingMiddleware
+
+    assert timing.span("page") is timing._NULL  # outside a timed request: no-op
+    timed = TestClient(TimingMiddleware(app))
+    timing.cache_counts.clear()
+    timing.request_histograms.clear()
+
+    first = timed.get("/api/courses?department=CS").headers["server-timing"]
+    assert 'cache_miss;desc="courses"' in first
+    for stage in ("cache;dur=", "page;dur=", "count;dur=", "serialize;dur=", "total;dur="):
+        assert stage in first
+    second = timed.get("/api/courses?department=CS").headers["server-timing"]
+    assert 'cache_hit;desc="courses"' in second and "page;dur=" not in second
+
+    body = timed.get("/metrics").text
+    assert 'coursequest_cache_requests_total{namespace="courses",result="hit"} 1' in body
+    assert 'coursequest_cache_hit_ratio{namespace="courses"} 0.500000' in body
+    assert 'coursequest_request_duration_seconds_count{method="GET",route="/api/courses"} 2' in body
+    assert "# TYPE coursequest_db_statement_duration_seconds histogram" in body
+
+
+def test_explain_and_index_advice(monkeypatch, caplog):
+    from app import index_advisor
+
+    headers = {"x-admin-token": settings.INGEST_TOKEN}
+    r = client.get("/api/admin/explain", params={"department": "CS"}, headers=headers)
+    assert r.status_code == 200
+    plan = " ".join(r.json()["plan"])
+    assert "ix_courses_dept_sort" in plan and "TEMP B-TREE" not in plan  # no sort step
+    assert client.get("/api/admin/explain").status_code == 401
+
+    monkeypatch.setattr(settings, "QUERY_LOG", 1)
+    monkeypatch.setattr(settings, "EXPLAIN_COURSES", 1)
+    index_advisor.shapes.clear()
+    with caplog.at_level("INFO"):
+        client.get("/api/courses", params={"department": "CS", "level": "UG"})
+        client.get("/api/courses", params={"department": "CS", "level": "UG", "page": 2})
+        client.get("/api/courses", params={"cursor": "", "department": "CS"})
+    assert any(r.name == "coursequest.explain" for r in caplog.records)
+    assert sum(index_advisor.read_log(r.getMessage() for r in caplog.records).values()) == 3
+
+    data = client.get("/api/admin/index-advice", headers=headers).json()
+    assert data["queries"] == 3
+    recs = {rec["name"]: rec for rec in data["recommendations"]}
+    assert recs["ix_courses_auto_dept_level_sort"]["covered_by"] is None
+    assert recs["ix_courses_auto_dept_sort"]["covered_by"] == "ix_courses_dept_sort"
+    index_advisor.shapes.clear()
+
+
+def test_etag_conditional_get_and_compression(monkeypatch):
+    from app import http_cache, query_service
+
+    _seed_catalog(TestingSessionLocal())
+    r = client.get("/api/courses", params={"page_size": 20})
+    tag = r.headers["etag"]
+    assert tag.startswith('W/"') and r.headers["cache-control"] == "no-cache"
+    assert r.headers["content-encoding"] == "gzip"  # httpx sends Accept-Encoding and decodes
+
+    async def fail(*args, **kwargs):
+        raise AssertionError("revalidation must not run the query")
+
+    with monkeypatch.context() as m:
+        m.setattr(query_service, "courses_page", fail)
+        r304 = client.get("/api/courses", params={"page_size": 20}, headers={"If-None-Match": tag})
+    assert r304.status_code == 304 and r304.content == b"" and r304.headers["etag"] == tag
+    assert client.get("/api/courses", params={"page_size": 21}).headers["etag"] != tag
+
+    # Repeated hits reuse the compressed body.
+    calls = []
+    monkeypatch.setattr(http_cache, "compress", lambda body, enc: calls.append(enc) or gzip.compress(body))
+    http_cache.compressed_bodies.clear()
+    bodies = [client.get("/api/courses", params={"page_size": 20}).json() for _ in range(3)]
+    assert calls == ["gzip"] and bodies[0] == bodies[2] and len(bodies[0]["items"]) == 20
+
+    plain = client.get("/api/courses", params={"page_size": 20}, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and plain.json() == bodies[0]
+    assert "content-encoding" not in client.get("/api/meta").headers  # below COMPRESS_MIN_BYTES
+
+    # An ingest (new catalog generation) invalidates every tag.
+    cache.bump_catalog_version()
+    r = client.get("/api/courses", params={"page_size": 20}, headers={"If-None-Match": tag})
+    assert r.status_code == 200 and r.headers["etag"] != tag
+
+    assert http_cache.negotiate("gzip;q=0, deflate") is None
+    assert http_cache.negotiate("br;q=1.0, gzip;q=0.8") == ("br" if http_cache.brotli else "gzip")
+
+
+def test_canonical_cache_keys_shared_across_wordings():
+    from app import query
+
+    query.stats.clear()
+    first = client.post("/api/ask", json={"question": "cheap online CS courses under 50k"}).json()
+    second = client.post("/api/ask", json={"question": "online  CS courses under 50k, cheap"}).json()
+    assert first == second
+    assert first["parsed_filters"] == {"department": "CS", "delivery_mode": "online", "max_fee": 50000}
+
+    client.get("/api/courses", params={"department": "CS", "q": "", "min_rating": 0})
+    client.get("/api/courses", params={"department": "CS", "sort": "relevance"})
+
+    r = client.get("/api/admin/query-stats", headers={"x-admin-token": settings.INGEST_TOKEN})
+    stats = {(s["namespace"], s["query"]): (s["hits"], s["misses"]) for s in r.json()["queries"]}
+    assert stats[("ask", query.key(first["parsed_filters"]))] == (1, 1)
+    assert stats[("courses", '{"department":"CS"}')] == (1, 1)
+    query.stats.clear()
+
+
+def _ingest(tmp_path, body, **params):
+    header = "course_id,course_name,department,level,delivery_mode,credits,duration_weeks,rating,tuition_fee_inr,year_offered\n"
+    csv_file = tmp_path / "delta.csv"
+    csv_file.write_text(header + body)
+    with open(csv_file, "rb") as f:
+        r = client.post("/api/ingest", params=params, headers={"x-ingest-token": settings.INGEST_TOKEN},
+                        files={"file": ("delta.csv", f, "text/csv")})
+    assert r.status_code == 200
+    return r.json()
+
+
+def test_delta_ingest_writes_changes_and_scopes_invalidation(tmp_path):
+    from app import query
+
+    seeded = "999,Test Course,CS,UG,online,3,8,4.2,10000,2025\n"
+    math = "1001,Algebra,Math,PG,offline,4,12,4.0,20000,2024\n"
+    physics = "1002,Optics,Physics,UG,hybrid,3,10,3.9,30000,2024\n"
+    r = _ingest(tmp_path, seeded + math + physics, mode="delta")
+    assert r["diff"] == {"inserted": 2, "updated": 1, "unchanged": 0, "deleted": 0}  # 999 had no hash yet
+
+    query.stats.clear()
+    for dept in ("Math", "Physics"):
+        client.get("/api/courses", params={"department": dept})
+    r = _ingest(tmp_path, seeded + math.replace("4.0", "4.8") + physics, mode="delta")
+    assert r["diff"] == {"inserted": 0, "updated": 1, "unchanged": 2, "deleted": 0}
+    assert [b["written"] for b in r["batches"]] == [1]
+    assert "department=Math" in r["invalidated_scopes"] and "*" in r["invalidated_scopes"]
+    assert "department=Physics" not in r["invalidated_scopes"]
+
+    assert client.get("/api/courses", params={"department": "Math"}).json()["items"][0]["rating"] == 4.8
+    client.get("/api/courses", params={"department": "Physics"})  # still cached
+    hits = {s["query"]: s["hits"] for s in query.stats.top()}
+    assert hits['{"department":"Physics"}'] == 1 and hits['{"department":"Math"}'] == 0
+    assert client.get("/api/compare", params={"ids": "1001"}).json()[0]["rating"] == 4.8
+    assert "row_hash" not in client.get("/api/compare", params={"ids": "1001"}).json()[0]
+
+    r = _ingest(tmp_path, seeded + math.replace("4.0", "4.8") + physics, mode="delta")
+    assert r["diff"]["unchanged"] == 3 and r["invalidated_scopes"] == []
+
+    # sync deletes what the source no longer has, but never after a bad row
+    r = _ingest(tmp_path, seeded + "oops,,,,,,,,,\n", mode="delta", sync="true")
+    assert r["diff"]["deleted"] == 0 and r["sync_skipped"] == "some rows failed to parse"
+    r = _ingest(tmp_path, seeded + physics, mode="delta", sync="true")
+    assert r["diff"] == {"inserted": 0, "updated": 0, "unchanged": 2, "deleted": 1}
+    assert "department=Math" in r["invalidated_scopes"]
+    assert client.get("/api/courses").json()["total"] == 2
+    assert client.get("/api/meta").json()["departments"] == ["CS", "Physics"]
+    query.stats.clear()
+
+
+def test_parallel_ingest_matches_serial(tmp_path, monkeypatch):
+    from app import ingestion
+
+    body = "".join(f'{5000 + i},"Parallel, {i}",Biology,UG,online,3,8,4.0,{1000 * i},2025\n' for i in range(40))
+    body += "5100,Bad Row,Biology,UG,online,x,8,4.0,100,2025\n"
+    serial = _ingest(tmp_path, body)
+
+    monkeypatch.setattr(settings, "INGEST_WORKERS", 2)
+    monkeypatch.setattr(settings, "INGEST_PARALLEL_MIN_BYTES", 0)
+    monkeypatch.setattr(settings, "INGEST_BLOCK_SIZE", 256)  # many blocks
+    try:
+        parallel = _ingest(tmp_path, body.replace("4.0", "4.5"))
+    finally:
+        ingestion.shutdown_parse_pool()
+    assert parallel["ingested"] == serial["ingested"] == 40
+    assert parallel["errors"] == serial["errors"] == [{"line": 42, "error": "invalid int for 'credits': 'x'"}]
+    assert parallel["diff"]["updated"] == 40
+    items = client.get("/api/courses", params={"department": "Biology", "page_size": 100}).json()["items"]
+    assert {c["course_name"] for c in items} == {f"Parallel, {i}" for i in range(40)}
+    assert {c["rating"] for c in items} == {4.5}
+
+
+def test_snapshot_written_on_ingest_warms_index_and_reloads(tmp_path, monkeypatch):
+    from app import catalog_index, crud, ingestion, snapshot
+
+    path = str(tmp_path / "catalog.cqs")
+    monkeypatch.setattr(settings, "CATALOG_SNAPSHOT_PATH", path)
+    monkeypatch.setattr(settings, "CATALOG_SNAPSHOT_DELAY", 3600)
+    writes = []
+    write_snapshot = ingestion.write_snapshot
+    monkeypatch.setattr(ingestion, "write_snapshot", lambda db: writes.append(1) or write_snapshot(db))
+
+    body = "6001,Snap One,Math,PG,online,3,8,4.4,12000,2024\n6002,Snap Two,CS,UG,hybrid,4,10,3.1,9000,2025\n"
+    _ingest(tmp_path, body)
+    _ingest(tmp_path, body, mode="delta")  # nothing changed: no snapshot scheduled
+    _ingest(tmp_path, body.replace("4.4", "4.5"), mode="delta")
+    _ingest(tmp_path, body)
+    assert not writes and not os.path.exists(path)  # nothing exported inside the requests
+    ingestion.flush_snapshot()
+    assert writes == [1]  # the burst is debounced into one export
+    ingestion.flush_snapshot()
+    assert writes == [1]
+    with snapshot.Snapshot(path) as snap:
+        assert snap.rows == 3 and snap.manifest["source"] == "db"
+
+    db = TestingSessionLocal()
+    try:
+        if catalog_index.np is not None:
+            warmed = []
+            from_snapshot = catalog_index.CatalogIndex.from_snapshot
+            monkeypatch.setattr(catalog_index.CatalogIndex, "from_snapshot",
+                                lambda snap, version: warmed.append(version) or from_snapshot(snap, version))
+            sql = crud.list_courses(db, {"min_rating": 3.0}, 1, 10)
+            cache.cache_store.clear()
+            monkeypatch.setattr(settings, "CATALOG_INDEX", 1)
+            catalog_index.reset()
+            assert crud.list_courses(db, {"min_rating": 3.0}, 1, 10) == sql
+            assert warmed == [cache.data_version()]
+            monkeypatch.setattr(settings, "CATALOG_INDEX", 0)
+
+        db.query(Course).filter(Course.course_id != 999).delete()
+        db.commit()
+        report = snapshot.load(db, path, mode="delta")
+        assert report["ingested"] == 3 and report["inserted"] == 2 and report["updated"] == 1  # 999 had no hash
+        assert db.query(Course).filter(Course.course_id == 6001).one().course_name == "Snap One"
+    finally:
+        catalog_index.reset()
+        db.close()
+
+
+def test_snapshot_written_in_background_after_delay(tmp_path, monkeypatch):
+    import threading
+    from app import snapshot
+
+    path = str(tmp_path / "catalog.cqs")
+    monkeypatch.setattr(settings, "CATALOG_SNAPSHOT_PATH", path)
+    monkeypatch.setattr(settings, "CATALOG_SNAPSHOT_DELAY", 0)
+    _ingest(tmp_path, "6001,Snap One,Math,PG,online,3,8,4.4,12000,2024\n")
+    for thread in threading.enumerate():  # the timer clears `_snapshot_timer` before it writes
+        if thread.name == "catalog-snapshot":
+            thread.join(timeout=10)
+    with snapshot.Snapshot(path) as snap:
+        assert snap.rows == 2 and snap.manifest["catalog_version"] == cache.data_version()
+
+
+def test_snapshot_warm_starts_a_fresh_worker(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    from app import catalog_index, crud, ingestion
+
+    path = str(tmp_path / "catalog.cqs")
+    monkeypatch.setattr(settings, "CATALOG_SNAPSHOT_PATH", path)
+    monkeypatch.setattr(settings, "CATALOG_SNAPSHOT_DELAY", 3600)
+    monkeypatch.setattr(settings, "CATALOG_INDEX", 1)
+    _ingest(tmp_path, "6001,Snap One,Math,PG,online,3,8,4.4,12000,2024\n")
+    ingestion.flush_snapshot()
+
+    # A new worker without Redis: its generation counters start from zero again.
+    monkeypatch.setattr(cache, "_local_version", 0)
+    monkeypatch.setattr(cache, "_local_scopes", {})
+    cache._forget_version()
+    cache._forget_scopes()
+    catalog_index.reset()
+    warmed = []
+    from_snapshot = catalog_index.CatalogIndex.from_snapshot
+    monkeypatch.setattr(catalog_index.CatalogIndex, "from_snapshot",
+                        lambda snap, version: warmed.append(version) or from_snapshot(snap, version))
+    db = TestingSessionLocal()
+    try:
+        assert catalog_index.get_index(db).size == 2
+        assert len(warmed) == 1
+
+        # Any later write makes the snapshot stale: rebuilt from the database.
+        _ingest(tmp_path, "6001,Snap One,Math,PG,online,3,8,4.9,12000,2024\n", mode="delta")
+        catalog_index.reset()
+        assert catalog_index.get_index(db).size == 2
+        assert len(warmed) == 1
+    finally:
+        catalog_index.reset()
+        db.close()
+
+
+def test_export_streams_all_filtered_rows(monkeypatch):
+    import csv
+    import io
+    import json
+    from app import export
+
+    db = TestingSessionLocal()
+    _seed_catalog(db)
+    db.close()
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 5)
+    params = {"department": "CS", "min_rating": 3.5}
+    paged = client.get("/api/courses", params={**params, "page_size": 100}).json()["items"]
+    assert len(paged) > 5
+
+    r = client.get("/api/courses/export", params=params, headers={"Accept-Encoding": "identity"})
+    assert r.headers["content-type"] == "application/x-ndjson" and "content-encoding" not in r.headers
+    assert [json.loads(line) for line in r.text.splitlines()] == paged
+
+    chunks = list(export.stream(TestingSessionLocal(), params, "ndjson"))
+    assert len(chunks) == -(-len(paged) // 5)  # one chunk per cursor batch
+
+    r = client.get("/api/courses/export", params={**params, "format": "csv"}, headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["content-disposition"] == 'attachment; filename="courses.csv"'
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert [int(row["course_id"]) for row in rows] == [c["course_id"] for c in paged]
+
+    r = client.get("/api/courses/export", params={"department": "Nope", "format": "csv"})
+    assert r.text.strip() == "id,course_id,course_name,department,level,delivery_mode,credits,duration_weeks,rating,tuition_fee_inr,year_offered"
+
+
+def test_cache_computes_use_their_own_session(monkeypatch):
+    import asyncio
+    from app import query_service
+
+    seen = []
+    real_run_db = query_service.run_db
+
+    async def spy(session, fn, *args, **kwargs):
+        seen.append(session)
+        return await real_run_db(session, fn, *args, **kwargs)
+
+    monkeypatch.setattr(query_service, "run_db", spy)
+    db = TestingSessionLocal()
+    db.close()  # as after the request's dependency teardown
+
+    async def scenario():
+        return await asyncio.gather(
+            query_service.meta(db),
+            query_service.courses_page(db, {"department": "CS"}, 1, 10),
+            query_service.courses_page(db, {"department": "CS"}, 1, 10),  # joins the first flight
+        )
+
+    meta, page, same = asyncio.run(scenario())
+    assert b'"CS"' in meta and page == same
+    assert len(seen) == 2 and all(s is not db and s.get_transaction() is None for s in seen)
+
+
+def test_run_db_keeps_redis_and_index_builds_off_the_event_loop(tmp_path, monkeypatch):
+    pytest.importorskip("aiosqlite")
+    pytest.importorskip("numpy")
+    import asyncio
+    import threading
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from app import cache, catalog_index, crud
+    from app.database import async_database_url, run_db
+
+    loop_thread = threading.get_ident()
+    blocking_calls = []
+
+    class SyncRedis:
+        """Blocking client that records which thread uses it."""
+        def _call(self, *args, **kwargs):
+            blocking_calls.append(threading.get_ident())
+        get = setex = _call
+
+        def pipeline(self, transaction=False):
+            redis = self
+
+            class Pipe:
+                def get(self, key):
+                    return self
+                pttl = get
+
+                def execute(self):
+                    redis._call()
+                    return [None, -2]
+            return Pipe()
+
+    class RecordingIndex(catalog_index.CatalogIndex):
+        built_on = []
+
+        def __init__(self, *args, **kwargs):
+            RecordingIndex.built_on.append(threading.get_ident())
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(cache, "redis_client", SyncRedis())
+    monkeypatch.setattr(cache, "async_redis_client", None)
+    monkeypatch.setattr(catalog_index, "CatalogIndex", RecordingIndex)
+    monkeypatch.setattr(settings, "CATALOG_INDEX", 1)
+    monkeypatch.setattr(settings, "COUNT_STRATEGY", "cached")
+    url = async_database_url(f"sqlite:///{tmp_path / 'async.db'}")
+
+    async def scenario():
+        nonlocal loop_thread
+        loop_thread = threading.get_ident()
+        aengine = create_async_engine(url)
+        async with aengine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with async_sessionmaker(aengine, expire_on_commit=False)() as db:
+            for i in range(5):
+                db.add(Course(
+                    course_id=8100 + i, course_name=f"Loop Course {i}", department="CS", level="PG",
+                    delivery_mode="online", credits=3, duration_weeks=8, rating=4.0,
+                    tuition_fee_inr=1000, year_offered=2025,
+                ))
+            await db.commit()
+            # Two concurrent first calls: one builds, the other waits for the build lock.
+            results = await asyncio.gather(
+                run_db(db, crud.list_courses_counted, {"level": "PG"}, 1, 10),
+                run_db(db, crud.total_courses, {"department": "CS"}),
+            )
+        await aengine.dispose()
+        return results
+
+    cache.cache_store.clear()
+    catalog_index.reset()
+    out = []
+    # A build lock taken with a blocking acquire on the loop deadlocks the loop, so run it in a thread.
+    runner = threading.Thread(target=lambda: out.append(asyncio.run(scenario())), daemon=True)
+    try:
+        runner.start()
+        runner.join(timeout=30)
+        assert not runner.is_alive(), "event loop blocked"
+        (items, total, exact), (cs_total, _) = out[0]
+    finally:
+        catalog_index.reset()
+        cache.cache_store.clear()
+    assert total == 5 and cs_total == 5 and len(items) == 5
+    assert RecordingIndex.built_on and loop_thread not in RecordingIndex.built_on
+    assert blocking_calls and loop_thread not in blocking_calls
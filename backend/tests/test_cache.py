@@ -0,0 +1,104 @@
+# backend/tests/test_cache.py
+import asyncio, os, sys, time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app import cache
+from app.cache import LocalCache, get_or_compute
+
+
+def test_local_cache_expires_entries():
+    c = LocalCache(max_entries=10, max_bytes=1 << 20)
+    c.set("a", b"1", ttl=0.05)
+    c.set("b", b"2", ttl=60)
+    assert c.get("a") == b"1"
+    time.sleep(0.06)
+    assert c.get("a") is None
+    assert c.get("b") == b"2"
+    assert len(c) == 1
+
+
+def test_local_cache_lru_entry_bound():
+    c = LocalCache(max_entries=2, max_bytes=1 << 20)
+    c.set("a", b"1", 60)
+    c.set("b", b"2", 60)
+    c.get("a")  # "b" is now least recently used
+    c.set("c", b"3", 60)
+    assert "b" not in c
+    assert c.get("a") == b"1" and c.get("c") == b"3"
+
+
+def test_local_cache_memory_bound():
+    c = LocalCache(max_entries=100, max_bytes=3 * (1000 + LocalCache.ENTRY_OVERHEAD + 1))
+    for k in "abcd":
+        c.set(k, b"x" * 1000, 60)
+    assert len(c) == 3 and "a" not in c
+    assert c.nbytes <= c.max_bytes
+    c.set("huge", b"x" * 10_000, 60)  # larger than the whole budget: not stored
+    assert "huge" not in c and len(c) == 3
+
+
+def test_local_cache_clear_prefix():
+    c = LocalCache(max_entries=10, max_bytes=1 << 20)
+    for k in ("courses:1", "courses:2", "meta"):
+        c.set(k, b"v", 60)
+    assert c.clear_prefix("courses:") == 2
+    assert list(c._data) == ["meta"]
+
+
+def test_get_or_compute_single_flight():
+    cache.cache_store.clear()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def scenario():
+        return await asyncio.gather(*(get_or_compute("sf:key", compute, ttl=60) for _ in range(20)))
+
+    results = asyncio.run(scenario())
+    assert results == [b"result"] * 20
+    assert len(calls) == 1
+
+
+def test_get_or_compute_stale_while_revalidate():
+    cache.cache_store.clear()
+    versions = iter(["v1", "v2"])
+
+    async def compute():
+        return next(versions)
+
+    async def scenario():
+        first = await get_or_compute("swr:key", compute, ttl=60, stale_ttl=10)
+        # Pretend the fresh part of the TTL has elapsed: 5s left, inside the stale window.
+        cache.cache_store.set("swr:key", first, ttl=5)
+        stale = await get_or_compute("swr:key", compute, ttl=60, stale_ttl=10)
+        await asyncio.sleep(0.01)  # let the background refresh finish
+        fresh = await get_or_compute("swr:key", compute, ttl=60, stale_ttl=10)
+        return first, stale, fresh
+
+    assert asyncio.run(scenario()) == (b"v1", b"v1", b"v2")
+
+
+def test_failed_flight_without_waiters_is_not_reported_unretrieved():
+    import gc
+
+    cache.cache_store.clear()
+    unhandled = []
+
+    async def compute():
+        raise RuntimeError("boom")
+
+    async def scenario():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, ctx: unhandled.append(ctx))
+        # A non-refresh flight whose waiters are all gone by the time it fails.
+        cache._flight("sf:fail", compute, 60, 0)
+        await asyncio.sleep(0.01)
+        assert "sf:fail" not in cache._inflight
+        gc.collect()
+
+    asyncio.run(scenario())
+    gc.collect()
+    assert not [c for c in unhandled if "never retrieved" in c.get("message", "")]
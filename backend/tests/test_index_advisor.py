@@ -0,0 +1,88 @@
+# backend/tests/test_index_advisor.py
+import os, sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from collections import Counter
+
+from sqlalchemy import create_engine, inspect, text
+
+from app import index_advisor
+from app.database import Base
+from app import migrations
+from app.migrations import MIGRATIONS, migrate, schema_lock
+
+
+def test_migrations_upgrade_old_schema_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:  # indexes as shipped before 0001
+        conn.execute(text(
+            "CREATE TABLE courses (id INTEGER PRIMARY KEY, course_id INTEGER UNIQUE NOT NULL, "
+            "course_name VARCHAR(255) NOT NULL, department VARCHAR(100) NOT NULL, level VARCHAR(10) NOT NULL, "
+            "delivery_mode VARCHAR(20) NOT NULL, credits INTEGER NOT NULL, duration_weeks INTEGER NOT NULL, "
+            "rating FLOAT NOT NULL, tuition_fee_inr INTEGER NOT NULL, year_offered INTEGER NOT NULL)"
+        ))
+        conn.execute(text("CREATE INDEX ix_courses_fee_rating ON courses (tuition_fee_inr, rating)"))
+        conn.execute(text("CREATE INDEX ix_courses_dept_level_mode ON courses (department, level, delivery_mode)"))
+
+    Base.metadata.create_all(engine)  # leaves the existing table alone
+    assert migrate(engine) == [m[0] for m in MIGRATIONS]
+    assert migrate(engine) == []
+
+    indexes = index_advisor.existing_indexes(engine)
+    assert "ix_courses_fee_rating" not in indexes and "ix_courses_dept_level_mode" not in indexes
+    assert indexes["ix_courses_dept_sort"] == ["department", "rating", "tuition_fee_inr", "id"]
+    assert "row_hash" in {c["name"] for c in inspect(engine).get_columns("courses")}
+
+    # On a fresh database create_all already built everything; migrations are no-ops.
+    fresh = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    Base.metadata.create_all(fresh)
+    assert migrate(fresh) == [m[0] for m in MIGRATIONS]
+    sort_indexes = {name for name in indexes if name.endswith("_sort")}
+    assert len(sort_indexes) == 4 and sort_indexes <= set(index_advisor.existing_indexes(fresh))
+
+
+def test_migration_recorded_by_another_worker_is_skipped(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}")
+    Base.metadata.create_all(engine)
+    first_id, first_run = MIGRATIONS[0]
+
+    def finished_elsewhere(conn):
+        # Another worker records the migration after this one read the applied set.
+        with engine.begin() as other:
+            migrations._record(other, first_id)
+        first_run(conn)
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [(first_id, finished_elsewhere), *MIGRATIONS[1:]])
+    with schema_lock(engine):  # no-op outside Postgres
+        assert migrate(engine) == [m[0] for m in MIGRATIONS[1:]]
+    assert migrate(engine) == []
+
+
+def test_recommendations_from_query_log():
+    lines = [
+        'INFO:coursequest.queries:{"equality": ["department", "level"], "range": ["rating"], "sort": "default"}',
+        '{"equality": ["level", "department"], "range": ["tuition_fee_inr"], "sort": "default"}',
+        '{"equality": ["department"], "range": [], "sort": "default"}',
+        '{"equality": ["year_offered"], "range": ["credits"], "sort": "relevance"}',
+        '{"equality": [], "range": ["rating"], "sort": "default"}',
+        "not json",
+    ]
+    counts = index_advisor.read_log(lines)
+    assert sum(counts.values()) == 5
+
+    existing = {"ix_courses_dept_sort": ["department", "rating", "tuition_fee_inr", "id"]}
+    recs = {r["name"]: r for r in index_advisor.recommend(counts, existing)}
+    assert set(recs) == {
+        "ix_courses_auto_dept_level_sort", "ix_courses_auto_level_dept_sort",
+        "ix_courses_auto_dept_sort", "ix_courses_auto_year_credits",
+    }
+    assert recs["ix_courses_auto_dept_sort"]["covered_by"] == "ix_courses_dept_sort"
+    pair = recs["ix_courses_auto_dept_level_sort"]
+    assert pair["covered_by"] is None and pair["share"] == 0.2
+    assert pair["ddl"] == (
+        "CREATE INDEX IF NOT EXISTS ix_courses_auto_dept_level_sort "
+        "ON courses (department, level, rating DESC, tuition_fee_inr, id)"
+    )
+    assert recs["ix_courses_auto_year_credits"]["columns"] == ["year_offered", "credits"]
+    assert index_advisor.recommend(Counter(counts), existing, min_share=0.5) == []
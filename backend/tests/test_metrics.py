@@ -0,0 +1,49 @@
+# backend/tests/test_metrics.py
+import os, sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from sqlalchemy import create_engine, text
+
+from app import metrics
+
+
+def test_histogram_buckets_and_quantiles():
+    h = metrics.Histogram(buckets=(1, 10, 100))
+    for ms in (0.5, 0.7, 5, 50, 500):
+        h.observe(ms)
+    snap = h.snapshot()
+    assert snap["count"] == 5 and snap["max_ms"] == 500
+    assert snap["buckets"] == {"le_1": 2, "le_10": 1, "le_100": 1, "le_inf": 1}
+    assert h.quantile(0.5) == 10.0
+    assert h.quantile(0.99) == 500
+
+
+def test_statement_label():
+    assert metrics.statement_label("SELECT courses.id FROM courses WHERE ...") == "SELECT courses"
+    assert metrics.statement_label('INSERT INTO "course_facets" (facet) VALUES (?)') == "INSERT course_facets"
+    assert metrics.statement_label("SELECT 1") == "SELECT"
+
+
+def test_instrumented_timed_pool(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'm.db'}", poolclass=metrics.TimedQueuePool, pool_size=2, max_overflow=1
+    )
+    stats = metrics.instrument_engine(engine, "test")
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("CREATE TABLE t (x INTEGER)"))
+            for _ in range(3):
+                conn.execute(text("SELECT x FROM t"))
+            held = engine.connect()  # second connection checked out concurrently
+            snap = metrics.snapshot()["test"]["pool"]
+            assert snap["class"] == "TimedQueuePool"
+            assert snap["checked_out"] == 2 and snap["size"] == 2
+            held.close()
+        snap = metrics.snapshot()["test"]
+        assert snap["pool"]["checkouts"] == 2 and snap["pool"]["wait"]["count"] == 2
+        assert snap["statements"]["SELECT t"]["count"] == 3
+        assert stats.checkouts == 2
+    finally:
+        metrics._engines.pop("test", None)
+        engine.dispose()
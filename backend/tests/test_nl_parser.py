@@ -0,0 +1,46 @@
+from app.utils import nl_parser
+from app.utils.nl_parser import parse_question
+
+
+def teardown_function():
+    nl_parser.set_vocabulary({})
+
+
+def test_parse_question_filters():
+    assert parse_question("PG online Math courses under 50k") == {
+        "max_fee": 50000, "level": "PG", "delivery_mode": "online", "department": "Math",
+    }
+    assert parse_question("masters on-campus mathematics below 1.5 lakh rated at least 4") == {
+        "max_fee": 150000, "min_rating": 4.0, "level": "PG", "delivery_mode": "offline", "department": "Math",
+    }
+    # Keyword priority follows the table order, not the position in the question.
+    assert parse_question("economics and cs")["department"] == "CS"
+
+
+def test_parse_question_memo_returns_copies():
+    a = parse_question("Show  CS courses")
+    a["page"] = 2
+    b = parse_question("show cs courses ")
+    assert b == {"department": "CS"}
+    assert nl_parser._parse_cached.cache_info().hits >= 1
+
+
+def test_vocabulary_from_catalog_meta():
+    assert "department" not in parse_question("data science courses")
+    nl_parser.set_vocabulary({"departments": ["CS", "Data Science"], "levels": ["UG"]}, version=7)
+    assert nl_parser.vocabulary_version == 7
+    assert parse_question("ug data science courses") == {"level": "UG", "department": "Data Science"}
+    # Built-in keywords take precedence over catalog phrases, even longer ones.
+    nl_parser.set_vocabulary({"departments": ["Computer Science", "Quantum Studies"], "delivery_modes": ["Online Live"]})
+    assert parse_question("computer science")["department"] == "CS"
+    assert parse_question("computer courses")["department"] == "CS"
+    assert parse_question("quantum studies online live") == {"delivery_mode": "online", "department": "Quantum Studies"}
+
+
+def test_memo_is_keyed_on_the_vocabulary():
+    old = nl_parser._vocab
+    assert "department" not in parse_question("data science courses")
+    nl_parser.set_vocabulary({"departments": ["Data Science"]})
+    # A parse finishing with the old vocabulary after the swap lands under the old key.
+    nl_parser._parse_cached("data science courses", old)
+    assert parse_question("data science courses")["department"] == "Data Science"
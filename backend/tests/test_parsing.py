@@ -0,0 +1,45 @@
+# backend/tests/test_parsing.py
+import csv
+import io
+import os, sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app import parsing
+
+HEADER = "course_id,course_name,department,level,delivery_mode,credits,duration_weeks,rating,tuition_fee_inr,year_offered\n"
+BODY = (
+    '1,"Data, Systems",CS,UG,online,3,8,4.1,15000,2025\n'
+    '2,"Multi\nline ""quoted"" name",Math,PG,hybrid,4,12,3.9,20000,2024\n'
+    "\n"
+    "3,Bad Credits,CS,UG,online,three,8,4.0,15000,2025\n"
+    "4,Short Row,CS\r\n"
+    "5,Last,Physics,UG,offline,2,6,4.5,9000,2023"
+)
+
+
+def test_split_blocks_cuts_only_between_records():
+    data = (HEADER + BODY).encode()
+    for size in (1, 7, 64, len(data)):
+        blocks = list(parsing.split_blocks(io.BytesIO(data), size))
+        assert b"".join(blocks) == data
+        for block in blocks[:-1]:
+            assert block.endswith(b"\n") and block.count(b'"') % 2 == 0
+
+
+def test_parse_blocks_match_dictreader():
+    header, rest = parsing.read_header(("\ufeff" + HEADER + BODY).encode())
+    assert header[0] == "course_id"
+    blocks = list(parsing.split_blocks(io.BytesIO(rest), 16))
+    parsed = [item for block in blocks for item in parsing.parse_block(header, block)]
+
+    expected = []
+    for row in csv.DictReader(io.StringIO(HEADER + BODY)):
+        try:
+            expected.append(parsing.parse_row(row))
+        except parsing.RowError as e:
+            expected.append(str(e))
+    assert parsed == expected
+    assert parsed[1]["course_name"] == 'Multi\nline "quoted" name'
+    assert parsed[2] == "invalid int for 'credits': 'three'"
+    assert parsed[3] == "missing value for 'level'"
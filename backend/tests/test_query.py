@@ -0,0 +1,34 @@
+# backend/tests/test_query.py
+import os, sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app import query
+
+
+def test_canonical_drops_defaults_and_types_values():
+    raw = {
+        "department": "CS", "level": None, "delivery_mode": "", "min_rating": 4, "max_fee": 50000.0,
+        "min_credits": 0, "q": "Data", "sort": None, "page": 3,
+    }
+    assert query.canonical(raw) == {"department": "CS", "q": "data", "min_rating": 4.0, "max_fee": 50000}
+    assert query.key(raw) == query.key({"max_fee": 50000, "q": "DATA", "min_rating": 4.0, "department": "CS"})
+    assert query.key({"department": "CS"}) != query.key({"department": "cs"})  # equality is case-sensitive
+
+
+def test_canonical_sort_only_with_query():
+    assert query.canonical({"sort": "relevance"}) == {}
+    assert query.canonical({"sort": "relevance", "q": "ml"}) == {"q": "ml", "sort": "relevance"}
+    assert query.canonical({"sort": "relevance", "q": "ml"}, include_sort=False) == {"q": "ml"}
+
+
+def test_stats_bounded_and_ordered():
+    stats = query.QueryStats(max_tracked=2)
+    for hit in (False, True, True):
+        stats.record("ask", "a", hit)
+    stats.record("ask", "b", False)
+    stats.record("courses", "c", False)  # over the limit
+    stats.record("courses", "d", True)
+    top = stats.top()
+    assert top[0] == {"namespace": "ask", "query": "a", "hits": 2, "misses": 1, "hit_ratio": 0.6667}
+    assert {(r["namespace"], r["query"]) for r in top} == {("ask", "a"), ("ask", "b"), ("courses", "other")}
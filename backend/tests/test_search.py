@@ -0,0 +1,67 @@
+# backend/tests/test_search.py
+import os, sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.search import SearchIndex
+
+INDEX = SearchIndex([
+    (1, "Data Structures"),
+    (2, "Database Systems"),
+    (3, "Machine Learning"),
+    (4, "Advanced Machine Learning"),
+    (5, "Linear Algebra"),
+])
+
+
+def test_exact_and_prefix_match():
+    assert set(INDEX.search("data")) == {1, 2}  # "data" exact, "database" prefix
+    assert INDEX.search("data")[1] > INDEX.search("data")[2]
+
+
+def test_typo_tolerance():
+    assert set(INDEX.search("machne learning")) == {3, 4}
+    assert set(INDEX.search("algebar")) == set()  # transposition = two edits
+    assert set(INDEX.search("algbra")) == {5}
+
+
+def test_all_terms_required():
+    assert set(INDEX.search("advanced learning")) == {4}
+    assert INDEX.search("quantum") == {}
+
+
+def test_fulltext_hits_survive_request_rollback(monkeypatch):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from app import crud, search
+    from app.database import Base
+    from app.models import Course
+    from app.settings import settings
+
+    # One pooled connection, so every session reuses it as consecutive requests would.
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        db.add_all([
+            Course(course_id=i, course_name=f"Statistics {i}", department="Math", level="UG",
+                   delivery_mode="online", credits=3, duration_weeks=8, rating=4.0,
+                   tuition_fee_inr=1000, year_offered=2025)
+            for i in range(8)
+        ])
+        db.commit()
+    monkeypatch.setattr(settings, "SEARCH_MODE", "fulltext")
+    monkeypatch.setattr(settings, "CATALOG_INDEX", 0)
+    search.reset()
+    try:
+        for page_size in (5, 6, 7):  # different (uncached) requests for the same q
+            with Session() as db:  # closing rolls the read transaction back
+                items, total = crud.list_courses(db, {"q": "statistics"}, 1, page_size)
+            assert total == 8 and len(items) == page_size
+        with Session() as db:
+            items, _ = crud.list_courses(db, {"q": "statistics", "sort": "relevance"}, 1, 10)
+            assert len(items) == 8
+    finally:
+        search.reset()
+        engine.dispose()
@@ -0,0 +1,59 @@
+# backend/tests/test_snapshot.py
+import io
+import os, sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app import snapshot
+
+ROWS = [
+    {"id": i + 1, "course_id": 10 ** 6 + i, "course_name": name, "department": dept, "level": "UG",
+     "delivery_mode": "online", "credits": 3, "duration_weeks": 8, "rating": 4.25,
+     "tuition_fee_inr": 15000 * i, "year_offered": 2025}
+    for i, (name, dept) in enumerate([("Data Systems", "CS"), ("Étude", "Français"), ("Data Systems", "CS")])
+]
+
+
+def test_round_trip_with_narrow_columns(tmp_path):
+    path = str(tmp_path / "c.cqs")
+    manifest = snapshot.write(path, ROWS, meta={"source": "db"})
+    types = {c: e["type"] for c, e in manifest["columns"].items()}
+    assert types["credits"] == "b" and types["year_offered"] == "h" and types["course_id"] == "i"
+    assert types["department"] == "B" and manifest["columns"]["course_name"]["strings"] == 2
+
+    assert snapshot.is_snapshot(path)
+    with snapshot.Snapshot(path) as snap:
+        assert snap.rows == 3 and snap.columns == list(snapshot.COLUMNS)
+        assert list(snap.iter_rows()) == ROWS
+        assert snap.strings("department") == ["CS", "Français"]
+        assert list(snap.column("department")) == [0, 1, 0]
+        assert list(snap.column("tuition_fee_inr")) == [0, 15000, 30000]
+
+
+def test_empty_and_invalid(tmp_path):
+    path = str(tmp_path / "empty.cqs")
+    snapshot.write(path, [])
+    with snapshot.Snapshot(path) as snap:
+        assert snap.rows == 0 and list(snap.iter_rows()) == []
+
+    csv_path = tmp_path / "courses.csv"
+    csv_path.write_text("course_id,course_name\n1,x\n")
+    assert not snapshot.is_snapshot(str(csv_path))
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.Snapshot(str(csv_path))
+
+
+def test_export_csv_skips_bad_rows(tmp_path):
+    data = (
+        "course_id,course_name,department,level,delivery_mode,credits,duration_weeks,rating,tuition_fee_inr,year_offered\n"
+        "1,Good,CS,UG,online,3,8,4.0,15000,2025\n"
+        "2,Bad,CS,UG,online,x,8,4.0,15000,2025\n"
+    ).encode()
+    path = str(tmp_path / "c.cqs")
+    manifest = snapshot.export_csv(io.BytesIO(data), path)
+    assert manifest["rows"] == 1 and manifest["failed"] == 1 and manifest["source"] == "csv"
+    with snapshot.Snapshot(path) as snap:
+        assert "id" not in snap.columns
+        assert next(snap.iter_rows())["course_name"] == "Good"